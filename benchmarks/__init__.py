@@ -0,0 +1,12 @@
+"""Benchmarks for jmespath.
+
+Benchmarks are run from the root of the repository::
+
+    python -m benchmarks run -o results.json
+    python -m benchmarks compare baseline.json results.json
+
+Every benchmark produces results in the same JSON format, described in
+``benchmarks.report``, so that any two result files can be compared to
+flag regressions.
+
+"""
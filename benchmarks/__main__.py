@@ -0,0 +1,275 @@
+"""Command line entry point for the benchmarks.
+
+Run ``python -m benchmarks --help`` from the root of the repository
+for the list of commands.
+
+"""
+import argparse
+import sys
+
+from benchmarks import compliance
+from benchmarks import fork
+from benchmarks import importtime
+from benchmarks import join
+from benchmarks import memory
+from benchmarks import parsing
+from benchmarks import report
+from benchmarks import scaling
+
+
+def _add_output_arguments(parser):
+    parser.add_argument('-o', '--output',
+                        help='Write the results as JSON to this file.')
+    parser.add_argument('--format', choices=['text', 'json'],
+                        default='text',
+                        help='The format of the results on stdout.')
+
+
+def _add_timing_arguments(parser):
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Minimum duration of each repetition, in '
+                             'seconds.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of repetitions of each benchmark.')
+
+
+def _output(args, results):
+    if args.output:
+        with open(args.output, 'w') as f:
+            report.dump(results, f)
+    if args.format == 'json':
+        report.dump(results, sys.stdout)
+    elif results:
+        report.write_text(report.format_results(results))
+
+
+def _run(args):
+    cases = compliance.collect(args.directory and [args.directory])
+    if args.filter:
+        cases = [case for case in cases if args.filter in case.name]
+    if not cases:
+        sys.stderr.write('No bench cases found.\n')
+        return 1
+    results = compliance.run(cases, min_time=args.min_time,
+                             repeat=args.repeat)
+    _output(args, results)
+    return 0
+
+
+def _scaling(args):
+    cases = scaling.CASES
+    if args.filter:
+        cases = [case for case in cases if args.filter in case.name]
+    if not cases:
+        sys.stderr.write('No scaling cases found.\n')
+        return 1
+    sizes = [size for size in scaling.SIZES if size <= args.max_size]
+    results, failures = scaling.run(cases, sizes=sizes, seed=args.seed,
+                                    min_time=args.min_time,
+                                    repeat=args.repeat)
+    _output(args, results)
+    for case in failures:
+        exponent = [r for r in results
+                    if r['name'] == 'scaling/%s' % case.name][0]['value']
+        sys.stderr.write('%s grows as n^%.2f, expected %s\n' % (
+            case.name, exponent, case.expected))
+    return 1 if failures else 0
+
+
+def _memory(args):
+    cases = memory.collect(args.directory and [args.directory],
+                           size=args.size, seed=args.seed)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case.name]
+    if not cases:
+        sys.stderr.write('No memory cases found.\n')
+        return 1
+    _output(args, memory.run(cases, repeat=args.repeat))
+    return 0
+
+
+def _parse(args):
+    names = sorted(parsing.GENERATORS)
+    if args.filter:
+        names = [name for name in names if args.filter in name]
+    if not names:
+        sys.stderr.write('No parse cases found.\n')
+        return 1
+    sizes = [size for size in parsing.SIZES if size <= args.max_size]
+    results, failures = parsing.run(names, sizes=sizes, seed=args.seed,
+                                    min_time=args.min_time,
+                                    repeat=args.repeat)
+    _output(args, results)
+    for name in failures:
+        sys.stderr.write('parsing %s grows faster than linearly\n' % name)
+    return 1 if failures else 0
+
+
+def _fork(args):
+    if not fork.supported():
+        sys.stderr.write('The fork benchmark needs os.fork and '
+                         '/proc/self/smaps_rollup.\n')
+        return 1
+    workloads = fork.WORKLOADS
+    if args.filter:
+        workloads = [w for w in workloads if args.filter in w]
+    _output(args, fork.run(size=args.size, workers=args.workers,
+                           seed=args.seed, workloads=workloads))
+    return 0
+
+
+def _join(args):
+    sizes = [size for size in join.SIZES if size <= args.max_size]
+    _output(args, join.run(sizes=sizes,
+                           nested_max_size=args.nested_max_size,
+                           seed=args.seed, min_time=args.min_time,
+                           repeat=args.repeat))
+    return 0
+
+
+def _importtime(args):
+    results, forbidden = importtime.run(repeat=args.repeat)
+    _output(args, results)
+    status = 0
+    if forbidden:
+        sys.stderr.write('import jmespath imports %s\n' % ', '.join(forbidden))
+        status = 1
+    # The fastest run is the least disturbed by the rest of the machine.
+    fastest = results[0]['min']
+    if args.budget is not None and fastest > args.budget:
+        sys.stderr.write('import jmespath took %dus, above the budget of '
+                         '%dus\n' % (fastest, args.budget))
+        status = 1
+    return status
+
+
+def _compare(args):
+    comparisons = report.compare(report.load(args.baseline),
+                                 report.load(args.current),
+                                 threshold=args.threshold)
+    report.write_text(report.format_comparisons(comparisons))
+    regressions = [c for c in comparisons if c[-1]]
+    if regressions:
+        sys.stderr.write('%d regression(s) above %.1f%%\n' % (
+            len(regressions), args.threshold * 100))
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run = commands.add_parser(
+        'run', help='Run the bench cases of the compliance tests.')
+    run.add_argument('-d', '--directory',
+                     help='Directory containing compliance test files.')
+    run.add_argument('-k', '--filter',
+                     help='Only run cases whose name contains this text.')
+    _add_timing_arguments(run)
+    _add_output_arguments(run)
+    run.set_defaults(func=_run)
+
+    scale = commands.add_parser(
+        'scaling', help='Check how expressions scale with document size.')
+    scale.add_argument('-k', '--filter',
+                       help='Only run cases whose name contains this text.')
+    scale.add_argument('--max-size', type=int, default=100000,
+                       help='Largest document size to generate.')
+    scale.add_argument('--seed', type=int, default=0,
+                       help='Seed of the document generators.')
+    scale.add_argument('--min-time', type=float, default=0.05,
+                       help='Minimum duration of each repetition, in '
+                            'seconds.')
+    scale.add_argument('--repeat', type=int, default=3,
+                       help='Number of repetitions at each size.')
+    _add_output_arguments(scale)
+    scale.set_defaults(func=_scaling)
+
+    mem = commands.add_parser(
+        'memory', help='Measure the memory used to compile and search.')
+    mem.add_argument('-d', '--directory',
+                     help='Directory containing compliance test files.')
+    mem.add_argument('-k', '--filter',
+                     help='Only run cases whose name contains this text.')
+    mem.add_argument('--size', type=int, default=1000,
+                     help='Size of the documents of the scaling cases.')
+    mem.add_argument('--seed', type=int, default=0,
+                     help='Seed of the document generators.')
+    mem.add_argument('--repeat', type=int, default=3,
+                     help='Number of measurements of each case.')
+    _add_output_arguments(mem)
+    mem.set_defaults(func=_memory)
+
+    parse = commands.add_parser(
+        'parse', help='Measure the parse throughput of large expressions.')
+    parse.add_argument('-k', '--filter',
+                       help='Only run cases whose name contains this text.')
+    parse.add_argument('--max-size', type=int, default=10000,
+                       help='Largest number of terms to generate.')
+    parse.add_argument('--seed', type=int, default=0,
+                       help='Seed of the expression generators.')
+    parse.add_argument('--min-time', type=float, default=0.05,
+                       help='Minimum duration of each repetition, in '
+                            'seconds.')
+    parse.add_argument('--repeat', type=int, default=3,
+                       help='Number of repetitions at each size.')
+    _add_output_arguments(parse)
+    parse.set_defaults(func=_parse)
+
+    forked = commands.add_parser(
+        'fork', help='Measure the memory pre-forked workers stop sharing.')
+    forked.add_argument('-k', '--filter',
+                        help='Only run workloads whose name contains this '
+                             'text.')
+    forked.add_argument('--size', type=int, default=20000,
+                        help='Number of expressions in the catalog.')
+    forked.add_argument('--workers', type=int, default=4,
+                        help='Number of workers to fork.')
+    forked.add_argument('--seed', type=int, default=0,
+                        help='Seed of the expression generators.')
+    _add_output_arguments(forked)
+    forked.set_defaults(func=_fork)
+
+    joins = commands.add_parser(
+        'join', help='Compare hash_join with a filter per element.')
+    joins.add_argument('--max-size', type=int, default=100000,
+                       help='Largest number of orders to generate.')
+    joins.add_argument('--nested-max-size', type=int, default=1000,
+                       help='Largest number of orders joined with a '
+                            'filter per order, which is quadratic.')
+    joins.add_argument('--seed', type=int, default=0,
+                       help='Seed of the document generator.')
+    joins.add_argument('--min-time', type=float, default=0.05,
+                       help='Minimum duration of each repetition, in '
+                            'seconds.')
+    joins.add_argument('--repeat', type=int, default=3,
+                       help='Number of repetitions at each size.')
+    _add_output_arguments(joins)
+    joins.set_defaults(func=_join)
+
+    imports = commands.add_parser(
+        'importtime', help='Measure the time taken by import jmespath.')
+    imports.add_argument('--repeat', type=int, default=10,
+                         help='Number of interpreters to start.')
+    imports.add_argument('--budget', type=int,
+                         help='Fail when the fastest import takes longer '
+                              'than this many microseconds.')
+    _add_output_arguments(imports)
+    imports.set_defaults(func=_importtime)
+
+    compare = commands.add_parser(
+        'compare', help='Compare two result files and flag regressions.')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.05,
+                         help='Relative change considered a regression.')
+    compare.set_defaults(func=_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Benchmarks driven by the ``bench`` cases of the compliance tests.
+
+Compliance test files may contain cases with a ``bench`` key instead of
+a ``result`` or an ``error``.  Its value tells what is measured:
+
+* ``parse``: compiling the expression, bypassing the compile cache,
+* ``interpret``: searching the ``given`` document with the expression
+  compiled ahead of time,
+* ``full``: compiling the expression and searching the document.
+
+"""
+import os
+from collections import OrderedDict
+import json
+
+from jmespath import parser
+from jmespath.visitor import Options
+
+from benchmarks import report
+from benchmarks.timing import measure
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPLIANCE_DIRS = [
+    os.path.join(ROOT_DIR, 'tests', 'compliance'),
+    os.path.join(ROOT_DIR, 'tests', 'legacy'),
+]
+OPTIONS = Options(dict_cls=OrderedDict)
+
+
+class BenchCase(object):
+    def __init__(self, filename, group_number, case_number, given, case):
+        self.filename = filename
+        self.group_number = group_number
+        self.case_number = case_number
+        self.given = given
+        self.expression = case['expression']
+        self.bench = case['bench']
+        self.comment = case.get('comment')
+
+    @property
+    def name(self):
+        return '%s,%s,%s %s' % (self.filename, self.group_number,
+                                self.case_number, self.bench)
+
+    def function(self):
+        """Return a function running one iteration of the benchmark."""
+        expression = self.expression
+        given = self.given
+        if self.bench == 'parse':
+            return lambda: parser.Parser()._do_parse(expression, OPTIONS)
+        elif self.bench == 'interpret':
+            parsed = parser.Parser()._do_parse(expression, OPTIONS)
+            return lambda: parsed.search(given, OPTIONS)
+        elif self.bench == 'full':
+            return lambda: parser.Parser()._do_parse(
+                expression, OPTIONS).search(given, OPTIONS)
+        raise ValueError("Unknown bench type '%s' in %s" % (
+            self.bench, self.name))
+
+
+def collect(directories=None):
+    """Collect the bench cases of every compliance test file."""
+    cases = []
+    for directory in directories or COMPLIANCE_DIRS:
+        for root, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if not filename.endswith('.json') or \
+                        filename.endswith('schema.json'):
+                    continue
+                full_path = os.path.join(root, filename)
+                relative = os.path.relpath(full_path, os.path.dirname(
+                    directory))
+                cases.extend(_load_cases(full_path, relative))
+    return cases
+
+
+def _load_cases(full_path, name):
+    with open(full_path) as f:
+        groups = json.load(f, object_pairs_hook=OrderedDict)
+    for group_number, group in enumerate(groups):
+        for case_number, case in enumerate(group['cases']):
+            if 'bench' in case:
+                yield BenchCase(name.replace(os.sep, '/'), group_number,
+                                case_number, group['given'], case)
+
+
+def run(cases, min_time=0.2, repeat=5, progress=None):
+    results = []
+    for case in cases:
+        samples = measure(case.function(), min_time=min_time, repeat=repeat)
+        entry = report.ops_per_sec(case.name, samples,
+                                   expression=case.expression)
+        results.append(entry)
+        if progress is not None:
+            progress(entry)
+    return results
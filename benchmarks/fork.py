@@ -0,0 +1,149 @@
+"""Memory shared by pre-forked workers.
+
+A master process compiles a catalog of generated expressions, freezes it
+or not, and forks workers.  Each worker runs a workload and reports how
+much of its memory became private, that is how many pages it stopped
+sharing with the master, from the ``Private_Dirty`` line of
+``/proc/self/smaps_rollup``::
+
+    python -m benchmarks fork --size 20000 --workers 4
+
+The workloads are:
+
+* ``collect``: a full garbage collection, as happens sooner or later in
+  any worker,
+* ``hot``: the evaluation of a tenth of the expressions of the catalog,
+  followed by a full garbage collection,
+* ``search``: the evaluation of every expression of the catalog,
+  followed by a full garbage collection.
+
+The deep size of the catalog in the master is reported as well.
+
+This only runs on Linux.
+
+"""
+import gc
+import json
+import os
+import random
+import traceback
+
+from jmespath.catalog import Catalog
+
+from benchmarks import parsing
+from benchmarks.memory import deep_sizeof
+from benchmarks import report
+
+
+WORKLOADS = ['collect', 'hot', 'search']
+_SMAPS = '/proc/self/smaps_rollup'
+_SHAPES = ['field_chain', 'multi_select', 'filter', 'or_chain',
+           'arithmetic_chain']
+
+#: The document the expressions of the catalog are evaluated against.
+DOCUMENT = dict(parsing.DOCUMENT,
+                items=[parsing.DOCUMENT for _ in range(3)])
+
+
+def supported():
+    return hasattr(os, 'fork') and os.path.exists(_SMAPS)
+
+
+def private_dirty():
+    """Return the bytes of memory written to by this process only."""
+    with open(_SMAPS) as f:
+        for line in f:
+            if line.startswith('Private_Dirty:'):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError('No Private_Dirty line in %s' % _SMAPS)
+
+
+def expressions(size, seed=0):
+    """Return ``size`` distinct generated expressions."""
+    rng = random.Random(seed)
+    generated = []
+    for i in range(size):
+        shape = rng.choice(_SHAPES)
+        generated.append('%s | [%d]' % (
+            parsing.GENERATORS[shape](rng.randrange(2, 8), seed + i), i))
+    return generated
+
+
+def _spawn(func, *args):
+    # Runs func in a child process, which sends back its JSON result.
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            os.write(write_fd, json.dumps(func(*args)).encode('utf-8'))
+            status = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def _collect(pid, read_fd):
+    with os.fdopen(read_fd, 'rb') as f:
+        data = f.read()
+    _, status = os.waitpid(pid, 0)
+    if status or not data:
+        raise RuntimeError('Benchmark process %d failed' % pid)
+    return json.loads(data.decode('utf-8'))
+
+
+def _worker(catalog, workload):
+    before = private_dirty()
+    if workload != 'collect':
+        evaluated = list(catalog)
+        if workload == 'hot':
+            evaluated = evaluated[:len(evaluated) // 10]
+        for expression in evaluated:
+            try:
+                catalog.search(expression, DOCUMENT)
+            except Exception:
+                # Some generated expressions do not apply to DOCUMENT,
+                # which is fine as long as they are evaluated.
+                pass
+    gc.collect()
+    return private_dirty() - before
+
+
+def _master(size, seed, frozen, workload, workers):
+    catalog = Catalog(expressions(size, seed))
+    if frozen:
+        catalog.freeze(gc_freeze=True)
+    else:
+        gc.collect()
+    size = deep_sizeof([catalog.get(expression) for expression in catalog])
+    children = [_spawn(_worker, catalog, workload) for _ in range(workers)]
+    return size, [_collect(pid, read_fd) for pid, read_fd in children]
+
+
+def run(size=20000, workers=4, seed=0, workloads=WORKLOADS):
+    """Measure the private memory of workers, with and without freezing.
+
+    The catalog is compiled in a child of this process, so that freezing
+    it leaves this process alone.
+
+    """
+    results = []
+    catalog_sizes = {}
+    for workload in workloads:
+        for frozen in (False, True):
+            mode = 'frozen' if frozen else 'plain'
+            catalog_size, samples = _collect(*_spawn(
+                _master, size, seed, frozen, workload, workers))
+            catalog_sizes[mode] = catalog_size
+            results.append(report.result(
+                'fork/%s/%s' % (workload, mode), 'private_bytes', samples,
+                'B', False, size=size, workers=workers))
+    for mode in sorted(catalog_sizes):
+        results.append(report.result(
+            'fork/catalog/%s' % mode, 'resident_bytes',
+            [catalog_sizes[mode]], 'B', False, size=size))
+    return results
@@ -0,0 +1,75 @@
+"""Import time benchmarks.
+
+``import jmespath`` is timed in fresh interpreters with ``python -X
+importtime``, which reports the time spent importing each module.  The
+run fails when the import takes longer than a budget, or when it pulls
+in one of the modules jmespath only needs lazily::
+
+    python -m benchmarks importtime --budget 20000
+
+"""
+import subprocess
+import sys
+
+from benchmarks import report
+
+
+# Modules that must not be imported by ``import jmespath``.
+FORBIDDEN_MODULES = ['inspect', 'json', 'pydoc', 'random', 're']
+
+
+def parse_importtime(output):
+    """Parse the ``-X importtime`` output of an interpreter.
+
+    Returns a dict of module name to ``(self, cumulative)`` times in
+    microseconds.
+
+    """
+    timings = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_time, cumulative = int(fields[0]), int(fields[1])
+        except ValueError:
+            # The header line.
+            continue
+        timings[fields[2].strip()] = (self_time, cumulative)
+    return timings
+
+
+def import_once(module='jmespath'):
+    """Import ``module`` in a fresh interpreter.
+
+    Returns the ``-X importtime`` timings and the names of the modules
+    loaded once the import is done.
+
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import sys, %s; print("\\n".join(sorted(sys.modules)))' % module],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    return parse_importtime(process.stderr), process.stdout.split()
+
+
+def run(repeat=10, module='jmespath'):
+    """Time the import of ``module``.
+
+    Returns the result entries and the forbidden modules it imported.
+
+    """
+    samples = []
+    modules = []
+    for _ in range(repeat):
+        timings, modules = import_once(module)
+        samples.append(float(timings[module][1]))
+    forbidden = [name for name in FORBIDDEN_MODULES if name in modules]
+    results = [
+        report.result('import/%s' % module, 'import_time', samples, 'us',
+                      False, min=min(samples)),
+        report.result('import/%s' % module, 'modules', [len(modules)], '',
+                      False, forbidden=forbidden),
+    ]
+    return results, forbidden
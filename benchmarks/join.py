@@ -0,0 +1,85 @@
+"""Joining two arrays by key.
+
+Correlating orders with their customers takes a filter over the
+customers for each order, which compares every pair of them::
+
+    map(&(let $o = @ in {left: $o,
+                         right: $.customers[?id == $o.customer_id] | [0]}),
+        orders)
+
+``hash_join`` evaluates the key of each element once instead, and
+matches them through a hash table::
+
+    hash_join(orders, customers, &customer_id, &id, 'left')
+
+Each size is a number of orders, placed by a tenth as many customers.
+Both idioms are timed at each size, up to ``nested_max_size`` orders for
+the quadratic one, after checking that they give the same result::
+
+    python -m benchmarks join --max-size 100000 --nested-max-size 1000
+
+"""
+import random
+
+from jmespath import parser
+
+from benchmarks import report
+from benchmarks.timing import measure
+
+
+SIZES = [100, 1000, 10000, 100000]
+
+IDIOMS = {
+    'nested_filter': (
+        'map(&(let $o = @ in {left: $o, '
+        'right: $.customers[?id == $o.customer_id] | [0]}), orders)'),
+    'hash_join': "hash_join(orders, customers, &customer_id, &id, 'left')",
+}
+
+
+def document(size, seed=0):
+    """Return ``size`` orders and a tenth as many customers.
+
+    A few orders refer to customers that don't exist.
+
+    """
+    rng = random.Random(seed)
+    customers = max(size // 10, 1)
+    return {
+        'customers': [{'id': i, 'name': 'c%d' % i, 'tier': rng.randrange(3)}
+                      for i in range(customers)],
+        'orders': [{'id': i,
+                    'customer_id': rng.randrange(customers + customers // 20),
+                    'total': rng.randrange(1000)}
+                   for i in range(size)],
+    }
+
+
+def run(sizes=SIZES, nested_max_size=1000, seed=0, min_time=0.05,
+        repeat=3):
+    """Time both idioms at each size.
+
+    Raises ``AssertionError`` if they disagree.
+
+    """
+    compiled = dict((name, parser.Parser().parse(expression))
+                    for name, expression in IDIOMS.items())
+    results = []
+    for size in sizes:
+        data = document(size, seed)
+        names = sorted(compiled)
+        if size > nested_max_size:
+            names.remove('nested_filter')
+        outputs = [compiled[name].search(data) for name in names]
+        if any(output != outputs[0] for output in outputs):
+            raise AssertionError('The join idioms disagree at size %d'
+                                 % size)
+        for name in names:
+            parsed = compiled[name]
+            samples = measure(lambda: parsed.search(data),
+                              min_time=min_time, repeat=repeat)
+            results.append(report.result(
+                'join/%s/%d' % (name, size), 'seconds',
+                [1.0 / s for s in samples], 's', False,
+                expression=IDIOMS[name], size=size))
+    return results
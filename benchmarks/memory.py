@@ -0,0 +1,161 @@
+"""Memory benchmarks.
+
+Every expression is measured under ``tracemalloc`` in three stages:
+
+* ``parse``: compiling the expression, bypassing the compile cache,
+* ``resident``: the size of the compiled ``ParsedResult``, which is
+  what the compile cache keeps alive for each expression,
+* ``search``: evaluating the expression against its document.
+
+The ``parse`` and ``search`` stages report the peak of the memory
+allocated while they run (``peak_bytes``) and the memory still
+allocated once they return (``net_bytes``).  The net memory of a search
+includes its result.
+
+Expressions come from the ``bench`` cases of the compliance tests and
+from the scaling cases, evaluated against a generated document::
+
+    python -m benchmarks memory --size 10000 -o memory.json
+
+"""
+import sys
+import tracemalloc
+import types
+
+from jmespath import parser
+
+from benchmarks import compliance
+from benchmarks import report
+from benchmarks import scaling
+
+
+# Shared by every object of the process rather than owned by an AST.
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType,
+                  types.BuiltinFunctionType, types.MethodType)
+
+
+class MemoryCase(object):
+    def __init__(self, name, expression, document):
+        self.name = name
+        self.expression = expression
+        self.document = document
+
+
+def collect(directories=None, size=1000, seed=0):
+    """Collect the compliance bench cases and the scaling cases."""
+    cases = []
+    for case in compliance.collect(directories):
+        name = case.name[:-len(case.bench)].rstrip()
+        cases.append(MemoryCase(name, case.expression, case.given))
+    documents = {}
+    for case in scaling.CASES:
+        if case.shape not in documents:
+            documents[case.shape] = scaling.GENERATORS[case.shape](size, seed)
+        cases.append(MemoryCase('scaling/%s/%d' % (case.name, size),
+                                case.expression, documents[case.shape]))
+    return cases
+
+
+def deep_sizeof(obj):
+    """Return the size in bytes of ``obj`` and of everything it owns."""
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIPPED_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        if hasattr(current, '__dict__'):
+            stack.append(current.__dict__)
+        for cls in type(current).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def trace(func):
+    """Call ``func`` under tracemalloc.
+
+    Returns its return value with the peak and the net number of bytes
+    allocated during the call.
+
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, peak - before, current - before
+
+
+def measure_case(case, repeat=3):
+    """Measure a case and return its result entries."""
+    def parse():
+        return parser.Parser()._do_parse(case.expression, compliance.OPTIONS)
+
+    def search():
+        return parsed.search(case.document, compliance.OPTIONS)
+
+    # Warm up the caches populated on first use, such as the method
+    # caches of the visitors, so they are not counted.
+    parsed = parse()
+    search()
+    parse_peak, parse_net, search_peak, search_net = [], [], [], []
+    for _ in range(repeat):
+        parsed, peak, net = trace(parse)
+        parse_peak.append(peak)
+        parse_net.append(net)
+        _, peak, net = trace(search)
+        search_peak.append(peak)
+        search_net.append(net)
+    extra = {'expression': case.expression}
+    return [
+        report.result(case.name + ' parse', 'peak_bytes', parse_peak, 'B',
+                      False, **extra),
+        report.result(case.name + ' parse', 'net_bytes', parse_net, 'B',
+                      False, **extra),
+        report.result(case.name + ' resident', 'resident_bytes',
+                      [deep_sizeof(parsed)], 'B', False, **extra),
+        report.result(case.name + ' search', 'peak_bytes', search_peak, 'B',
+                      False, **extra),
+        report.result(case.name + ' search', 'net_bytes', search_net, 'B',
+                      False, **extra),
+    ]
+
+
+def measure_compile_cache(cases):
+    """Measure the compile cache once every case expression is cached."""
+    saved = dict(parser.Parser._CACHE)
+    parser.Parser.purge()
+    try:
+        for case in cases:
+            parser.Parser().parse(case.expression)
+        entries = len(parser.Parser._CACHE)
+        size = deep_sizeof(parser.Parser._CACHE)
+    finally:
+        parser.Parser.purge()
+        parser.Parser._CACHE.update(saved)
+    return report.result('memory/compile_cache', 'resident_bytes', [size],
+                         'B', False, entries=entries)
+
+
+def run(cases, repeat=3, progress=None):
+    results = []
+    for case in cases:
+        entries = measure_case(case, repeat)
+        results.extend(entries)
+        if progress is not None:
+            progress(case, entries)
+    if cases:
+        results.append(measure_compile_cache(cases))
+    return results
@@ -0,0 +1,173 @@
+"""Parse throughput benchmarks with synthetic expressions.
+
+Compiled expressions are cached, but every cache miss is parsed on the
+request path.  Each case generates seeded expressions of growing sizes,
+parses them without the compile cache and reports the throughput in
+tokens per second, along with the fitted growth exponent of the parse
+time, which should stay linear::
+
+    python -m benchmarks parse --max-size 10000
+
+The size of an expression is its number of terms, such as fields,
+comparisons, key value pairs or pipeline stages.  Some cases are long
+chains of operators or deeply nested expressions, as generated by
+machines, and their evaluation against ``DOCUMENT`` is timed as well.
+
+"""
+import random
+
+from jmespath import lexer
+from jmespath import parser
+
+from benchmarks import report
+from benchmarks.scaling import fit_exponent, MAX_EXPONENT
+from benchmarks.timing import measure
+
+
+SIZES = [10, 100, 1000, 10000]
+
+
+def _field(rng):
+    return 'f%d' % rng.randrange(100)
+
+
+def _literal(rng):
+    return rng.choice(['`%d`' % rng.randrange(1000),
+                       "'s%d'" % rng.randrange(10), '`true`', '`null`'])
+
+
+def field_chain(size, seed=0):
+    rng = random.Random(seed)
+    return '.'.join(_field(rng) for _ in range(size))
+
+
+def multi_select(size, seed=0):
+    rng = random.Random(seed)
+    pairs = ['k%d: %s.%s[%d]' % (i, _field(rng), _field(rng),
+                                 rng.randrange(5))
+             for i in range(size)]
+    return '{%s}' % ', '.join(pairs)
+
+
+def filter_conditions(size, seed=0):
+    rng = random.Random(seed)
+    conditions = []
+    for i in range(size):
+        if i:
+            conditions.append(rng.choice(['&&', '||']))
+        conditions.append('%s %s %s' % (
+            _field(rng), rng.choice(['==', '!=', '<', '<=', '>', '>=']),
+            _literal(rng)))
+    return 'items[?%s].name' % ' '.join(conditions)
+
+
+_STAGES = [
+    'items[*].%(field)s',
+    '[?%(field)s > %(literal)s]',
+    'sort_by(@, &%(field)s)',
+    '{a: %(field)s, b: %(field)s[0], c: length(%(field)s)}',
+    '[%(field)s, %(field)s.%(field)s]',
+    '%(field)s[1:-1:2]',
+    'max_by(@, &%(field)s) || %(literal)s',
+]
+
+
+def or_chain(size, seed=0):
+    # Only the last field is in DOCUMENT, so every operand is evaluated.
+    rng = random.Random(seed)
+    fields = ['missing%d' % rng.randrange(100) for _ in range(size - 1)]
+    return ' || '.join(fields + [_field(rng)])
+
+
+def pipe_chain(size, seed=0):
+    return ' | '.join(['@'] * (size - 1) + [field_chain(1, seed)])
+
+
+def arithmetic_chain(size, seed=0):
+    rng = random.Random(seed)
+    return ' + '.join(_field(rng) for _ in range(size))
+
+
+def nested_parentheses(size, seed=0):
+    return '(' * size + field_chain(1, seed) + ')' * size
+
+
+def nested_or(size, seed=0):
+    rng = random.Random(seed)
+    return ''.join('(missing%d || ' % rng.randrange(100)
+                   for _ in range(size)) + _field(rng) + ')' * size
+
+
+def pipeline(size, seed=0):
+    rng = random.Random(seed)
+    return ' | '.join(rng.choice(_STAGES) % {'field': _field(rng),
+                                             'literal': _literal(rng)}
+                      for _ in range(size))
+
+
+GENERATORS = {
+    'field_chain': field_chain,
+    'multi_select': multi_select,
+    'filter': filter_conditions,
+    'pipeline': pipeline,
+    'or_chain': or_chain,
+    'pipe_chain': pipe_chain,
+    'arithmetic_chain': arithmetic_chain,
+    'nested_parentheses': nested_parentheses,
+    'nested_or': nested_or,
+}
+
+# The cases whose evaluation is timed, against this document.
+SEARCHED = frozenset(['or_chain', 'pipe_chain', 'arithmetic_chain',
+                      'nested_parentheses', 'nested_or'])
+DOCUMENT = dict(('f%d' % i, i) for i in range(100))
+
+
+def count_tokens(expression):
+    return len(list(lexer.Lexer().tokenize(expression)))
+
+
+def run_case(name, sizes=SIZES, seed=0, min_time=0.05, repeat=3):
+    """Time parsing the expressions of ``name`` at each size.
+
+    Returns the result entries and whether the parse time grows
+    linearly with the size of the expression.
+
+    """
+    results = []
+    timings = []
+    for size in sizes:
+        expression = GENERATORS[name](size, seed)
+        tokens = count_tokens(expression)
+        samples = measure(lambda: parser.Parser()._do_parse(expression),
+                          min_time=min_time, repeat=repeat)
+        timings.append(1.0 / max(samples))
+        results.append(report.result(
+            'parse/%s/%d' % (name, size), 'tokens_per_sec',
+            [s * tokens for s in samples], 'tok/s', True,
+            size=size, tokens=tokens, characters=len(expression)))
+        if name in SEARCHED:
+            parsed = parser.Parser()._do_parse(expression)
+            results.append(report.ops_per_sec(
+                'search/%s/%d' % (name, size),
+                measure(lambda: parsed.search(DOCUMENT),
+                        min_time=min_time, repeat=repeat),
+                size=size))
+    fitted = list(zip(sizes, timings))[-3:]
+    exponent = fit_exponent([f[0] for f in fitted], [f[1] for f in fitted])
+    passed = exponent <= MAX_EXPONENT['linear']
+    results.append(report.result(
+        'parse/%s' % name, 'growth_exponent', [exponent], '', False,
+        expected='linear', passed=passed))
+    return results, passed
+
+
+def run(names=None, sizes=SIZES, seed=0, min_time=0.05, repeat=3):
+    results = []
+    failures = []
+    for name in names or sorted(GENERATORS):
+        case_results, passed = run_case(name, sizes, seed, min_time, repeat)
+        results.extend(case_results)
+        if not passed:
+            failures.append(name)
+    return results, failures
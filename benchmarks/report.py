@@ -0,0 +1,128 @@
+"""Benchmark results, their JSON format and their comparison.
+
+A result file looks like this::
+
+    {
+        "version": 1,
+        "metadata": {"python": "3.11.7", "jmespath": "1.1.3", ...},
+        "results": [
+            {
+                "name": "compliance/benchmarks.json,0,3 parse",
+                "metric": "ops_per_sec",
+                "unit": "ops/s",
+                "value": 123456.7,
+                "stdev": 1234.5,
+                "samples": [...],
+                "higher_is_better": true
+            }
+        ]
+    }
+
+Results are identified by their name and metric.  The relative change
+of a result between two files is a regression when it goes in the
+wrong direction by more than a threshold.
+
+"""
+import json
+import platform
+import sys
+import time
+
+import jmespath
+
+from benchmarks.timing import mean, stdev
+
+
+FORMAT_VERSION = 1
+
+
+def result(name, metric, samples, unit, higher_is_better, **extra):
+    """Create a result entry from a list of samples."""
+    entry = {
+        'name': name,
+        'metric': metric,
+        'unit': unit,
+        'value': mean(samples),
+        'stdev': stdev(samples),
+        'samples': list(samples),
+        'higher_is_better': higher_is_better,
+    }
+    entry.update(extra)
+    return entry
+
+
+def ops_per_sec(name, samples, **extra):
+    return result(name, 'ops_per_sec', samples, 'ops/s', True, **extra)
+
+
+def metadata():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'jmespath': jmespath.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def dump(results, stream):
+    json.dump({'version': FORMAT_VERSION, 'metadata': metadata(),
+               'results': results}, stream, indent=2)
+    stream.write('\n')
+
+
+def load(filename):
+    with open(filename) as f:
+        loaded = json.load(f)
+    if loaded.get('version') != FORMAT_VERSION:
+        raise ValueError("Unsupported benchmark results version in %s: %s"
+                         % (filename, loaded.get('version')))
+    return loaded['results']
+
+
+def format_results(results):
+    lines = []
+    width = max([len(r['name']) for r in results] + [4])
+    for r in results:
+        relative = 100.0 * r['stdev'] / abs(r['value']) if r['value'] else 0.0
+        lines.append('%-*s  %-16s %14.6g %-6s +- %5.1f%%' % (
+            width, r['name'], r['metric'], r['value'], r['unit'], relative))
+    return '\n'.join(lines)
+
+
+def compare(baseline, current, threshold=0.05):
+    """Compare two lists of results.
+
+    Returns a list of ``(name, metric, old, new, change, regressed)``
+    tuples for the results found in both lists, where ``change`` is the
+    relative change from the baseline, positive when it improved.
+
+    """
+    old_results = dict(((r['name'], r['metric']), r) for r in baseline)
+    comparisons = []
+    for new in current:
+        old = old_results.get((new['name'], new['metric']))
+        if old is None or not old['value']:
+            continue
+        change = (new['value'] - old['value']) / old['value']
+        if not new['higher_is_better']:
+            change = -change
+        comparisons.append((new['name'], new['metric'], old['value'],
+                            new['value'], change, change < -threshold))
+    return comparisons
+
+
+def format_comparisons(comparisons):
+    lines = []
+    width = max([len(c[0]) for c in comparisons] + [4])
+    for name, metric, old, new, change, regressed in comparisons:
+        lines.append('%-*s  %-12s %14.1f -> %14.1f  %+6.1f%%%s' % (
+            width, name, metric, old, new, change * 100,
+            '  REGRESSION' if regressed else ''))
+    return '\n'.join(lines)
+
+
+def write_text(text, stream=None):
+    stream = stream or sys.stdout
+    stream.write(text)
+    stream.write('\n')
@@ -0,0 +1,160 @@
+"""Scaling benchmarks with synthetic documents.
+
+Each case times an expression against documents of growing sizes,
+produced by seeded generators, and fits the growth curve
+``time = c * size ** exponent`` with a least squares fit in log-log
+space.  The fitted exponent is checked against the complexity class
+expected for the case, so a change that turns a linear operation into
+a superlinear one fails the run::
+
+    python -m benchmarks scaling --max-size 100000
+
+Documents come in three shapes:
+
+* ``long``: an array of ``size`` records,
+* ``wide``: an object with ``size`` keys,
+* ``deep``: arrays nested three levels deep, with ``size`` leaves.
+
+"""
+import math
+import random
+
+from jmespath import parser
+
+from benchmarks import report
+from benchmarks.timing import measure
+
+
+SIZES = [100, 1000, 10000, 100000, 1000000]
+
+# The largest fitted exponent accepted for each complexity class.
+# Constant overheads flatten the curve at small sizes, and n log n
+# grows only slightly faster than n over a few decades.
+MAX_EXPONENT = {
+    'constant': 0.3,
+    'linear': 1.25,
+    'linearithmic': 1.35,
+    'quadratic': 2.3,
+}
+
+
+def long_document(size, seed=0):
+    rng = random.Random(seed)
+    groups = max(size // 10, 1)
+    return [
+        {
+            'id': i,
+            'group': 'g%d' % rng.randrange(groups),
+            'value': rng.random(),
+            'tags': ['t%d' % rng.randrange(5) for _ in range(3)],
+        }
+        for i in range(size)
+    ]
+
+
+def wide_document(size, seed=0):
+    rng = random.Random(seed)
+    return dict(('k%d' % i, {'value': rng.random()}) for i in range(size))
+
+
+def deep_document(size, seed=0):
+    rng = random.Random(seed)
+    branching = max(int(round(size ** (1.0 / 3))), 1)
+    return [[[rng.random() for _ in range(branching)]
+             for _ in range(branching)]
+            for _ in range(branching)]
+
+
+GENERATORS = {
+    'long': long_document,
+    'wide': wide_document,
+    'deep': deep_document,
+}
+
+
+class ScalingCase(object):
+    def __init__(self, name, shape, expression, expected, max_size=None):
+        self.name = name
+        self.shape = shape
+        self.expression = expression
+        self.expected = expected
+        self.max_size = max_size
+
+
+CASES = [
+    ScalingCase('projection', 'long', '[*].value', 'linear'),
+    ScalingCase('filter_projection', 'long', '[?value > `0.5`].id',
+                'linear'),
+    ScalingCase('value_projection', 'wide', '*.value', 'linear'),
+    ScalingCase('flatten', 'deep', '[][]', 'linear'),
+    ScalingCase('multi_select_dict', 'long', '[*].{id: id, v: value}',
+                'linear'),
+    ScalingCase('nested_projection', 'long', '[*].tags[*]', 'linear'),
+    ScalingCase('length', 'long', 'length(@)', 'constant'),
+    ScalingCase('map', 'long', 'map(&value, @)', 'linear'),
+    ScalingCase('max_by', 'long', 'max_by(@, &value)', 'linear'),
+    ScalingCase('sum', 'long', 'sum([*].value)', 'linear'),
+    ScalingCase('sort', 'long', 'sort([*].value)', 'linearithmic'),
+    ScalingCase('sort_by', 'long', 'sort_by(@, &value)', 'linearithmic'),
+    ScalingCase('group_by', 'long', 'group_by(@, &group)', 'linear'),
+    ScalingCase('sum_by', 'long', 'sum_by(@, &group, &value)', 'linear'),
+]
+
+
+def fit_exponent(sizes, timings):
+    """Fit ``timings = c * sizes ** exponent`` and return the exponent."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(t) for t in timings]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    return numerator / denominator
+
+
+def run_case(case, sizes=SIZES, seed=0, min_time=0.05, repeat=3):
+    """Time ``case`` at each size.
+
+    Returns the result entries and whether the fitted exponent is
+    within the bound of the expected complexity class.
+
+    """
+    if case.max_size is not None:
+        sizes = [size for size in sizes if size <= case.max_size]
+    parsed = parser.Parser().parse(case.expression)
+    results = []
+    timings = []
+    for size in sizes:
+        document = GENERATORS[case.shape](size, seed)
+        samples = measure(lambda: parsed.search(document),
+                          min_time=min_time, repeat=repeat)
+        seconds = [1.0 / s for s in samples]
+        timings.append(min(seconds))
+        results.append(report.result(
+            'scaling/%s/%d' % (case.name, size), 'seconds', seconds, 's',
+            False, expression=case.expression, size=size))
+    # The smallest sizes mostly measure constant overheads, so only
+    # the largest ones are used to fit the curve when we can.
+    fitted = list(zip(sizes, timings))
+    if len(fitted) > 3:
+        fitted = fitted[-3:]
+    exponent = fit_exponent([f[0] for f in fitted], [f[1] for f in fitted])
+    passed = exponent <= MAX_EXPONENT[case.expected]
+    results.append(report.result(
+        'scaling/%s' % case.name, 'growth_exponent', [exponent], '', False,
+        expression=case.expression, expected=case.expected, passed=passed))
+    return results, passed
+
+
+def run(cases=CASES, sizes=SIZES, seed=0, min_time=0.05, repeat=3,
+        progress=None):
+    results = []
+    failures = []
+    for case in cases:
+        case_results, passed = run_case(case, sizes, seed, min_time, repeat)
+        results.extend(case_results)
+        if not passed:
+            failures.append(case)
+        if progress is not None:
+            progress(case, case_results[-1])
+    return results, failures
@@ -0,0 +1,38 @@
+"""Calibrated timing of benchmark functions."""
+import math
+import timeit
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """Time ``func`` and return the ops/sec of each repetition.
+
+    The number of calls per repetition is calibrated so that each
+    repetition lasts at least ``min_time`` seconds.
+
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        if elapsed <= 0:
+            number *= 10
+        else:
+            # Aim a bit past min_time so we rarely need another round.
+            number = max(number + 1,
+                         int(math.ceil(number * min_time * 1.2 / elapsed)))
+    samples = [elapsed] + timer.repeat(repeat=repeat - 1, number=number)
+    return [number / sample for sample in samples]
+
+
+def mean(samples):
+    return sum(samples) / len(samples)
+
+
+def stdev(samples):
+    if len(samples) < 2:
+        return 0.0
+    average = mean(samples)
+    variance = sum((s - average) ** 2 for s in samples) / (len(samples) - 1)
+    return math.sqrt(variance)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import os
 import sys
 import json
 import argparse
@@ -11,28 +12,67 @@ from jmespath import exceptions
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('expression')
+    parser.add_argument('expression', nargs='?')
     parser.add_argument('-f', '--filename',
                         help=('The filename containing the input data.  '
                               'If a filename is not given then data is '
                               'read from stdin.'))
     parser.add_argument('--ast', action='store_true',
                         help=('Pretty print the AST, do not search the data.'))
+    parser.add_argument('--serve', action='store_true',
+                        help=('Serve searches on a Unix socket until '
+                              'interrupted.'))
+    parser.add_argument('--socket',
+                        help=('The Unix socket of the server.  Searches are '
+                              'forwarded to the server listening on it, and '
+                              'run in process if none is.  Defaults to '
+                              '$JP_SOCKET.'))
+    parser.add_argument('--bench', type=int, metavar='N',
+                        help=('Compile and search the data N times and '
+                              'report latencies instead of the result.'))
+    parser.add_argument('--precompile', metavar='CATALOG',
+                        help=('Compile the expressions of CATALOG, one per '
+                              'line, into the compiled cache file given by '
+                              '--output.'))
+    parser.add_argument('-o', '--output',
+                        help=('The compiled cache file written by '
+                              '--precompile.'))
+    parser.add_argument('--backend', choices=sorted(BENCH_BACKENDS),
+                        default='tree',
+                        help=('The evaluation backend benchmarked by '
+                              '--bench.  "daemon" forwards the searches '
+                              'to the server on --socket.'))
     args = parser.parse_args()
+    if args.serve:
+        return serve(args.socket)
+    if args.precompile:
+        if not args.output:
+            parser.error('--precompile requires --output')
+        return precompile(args.precompile, args.output)
+    if args.expression is None:
+        parser.error('the following arguments are required: expression')
     expression = args.expression
     if args.ast:
         # Only print the AST
         expression = jmespath.compile(args.expression)
-        sys.stdout.write(pformat(expression.parsed))
+        sys.stdout.write(pformat(expression.parsed.as_dict()))
         sys.stdout.write('\n')
         return 0
     if args.filename:
         with open(args.filename, 'r') as f:
-            data = json.load(f)
+            data = f.read()
     else:
         data = sys.stdin.read()
-        data = json.loads(data)
+    if not args.bench and (args.socket or os.environ.get('JP_SOCKET')):
+        status = forward(args.socket, expression, data)
+        if status is not None:
+            return status
+    text = data
+    data = json.loads(data)
     try:
+        if args.bench:
+            return bench(expression, text, args.bench, args.backend,
+                         args.socket)
         sys.stdout.write(json.dumps(
             jmespath.search(expression, data), indent=4, ensure_ascii=False))
         sys.stdout.write('\n')
@@ -53,5 +93,143 @@ def main():
         return 1
 
 
+def serve(path):
+    from jmespath import daemon
+    server = daemon.Server(path)
+    sys.stderr.write("Serving on %s\n" % server.path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def precompile(catalog, output):
+    # Blank lines and lines starting with '#' are skipped.  Expressions
+    # that do not compile are reported, and the others are saved.
+    from jmespath import diskcache
+    from jmespath.daemon import error_kind
+    parsed_results = []
+    status = 0
+    with open(catalog, 'r') as f:
+        for number, line in enumerate(f, 1):
+            expression = line.strip()
+            if not expression or expression.startswith('#'):
+                continue
+            try:
+                parsed_results.append(jmespath.compile(expression))
+            except exceptions.JMESPathError as e:
+                sys.stderr.write("%s:%d: %s: %s\n" % (
+                    catalog, number, error_kind(e), e))
+                status = 1
+    diskcache.save(parsed_results, output)
+    sys.stderr.write("Saved %d expressions to %s\n" % (
+        len(parsed_results), output))
+    return status
+
+
+def forward(path, expression, data):
+    # Returns None when no server is running or the exchange with it
+    # fails, so that the search runs in process instead.
+    from jmespath import daemon
+    try:
+        client = daemon.connect(path)
+        if client is None:
+            return None
+        with client:
+            response = client.request(expression, data)
+    except (OSError, ValueError, daemon.ProtocolError):
+        return None
+    if response['ok']:
+        sys.stdout.write(response['output'])
+        sys.stdout.write('\n')
+        return 0
+    sys.stderr.write("%s: %s\n" % (response['error'], response['message']))
+    return 1
+
+
+def _tree_searcher(parsed, text, path):
+    from jmespath.visitor import TreeInterpreter
+    data = json.loads(text)
+    return lambda: TreeInterpreter().evaluate(parsed.parsed, data)
+
+
+def _limited_searcher(parsed, text, path):
+    from jmespath.visitor import LimitedTreeInterpreter
+    data = json.loads(text)
+    return lambda: LimitedTreeInterpreter().evaluate(parsed.parsed, data)
+
+
+def _daemon_searcher(parsed, text, path):
+    from jmespath import daemon
+    client = daemon.connect(path)
+    if client is None:
+        raise RuntimeError("No server is listening on %s" % (
+            path or daemon.default_socket_path()))
+    document = text.encode('utf-8')
+    return lambda: client.request(parsed.expression, document)
+
+
+BENCH_BACKENDS = {
+    'tree': _tree_searcher,
+    'limited': _limited_searcher,
+    'daemon': _daemon_searcher,
+}
+
+
+def _percentile(ordered, percent):
+    # Nearest-rank percentile of a sorted list.
+    index = max(0, int(-(-percent * len(ordered) // 100)) - 1)
+    return ordered[index]
+
+
+def _format_latencies(latencies):
+    ordered = sorted(latencies)
+    return '  '.join('p%d %10.1fus' % (p, _percentile(ordered, p) * 1e6)
+                     for p in (50, 95, 99))
+
+
+def bench(expression, text, count, backend, path=None):
+    import time
+    import tracemalloc
+    from jmespath import parser
+    parse_times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        parsed = parser.Parser()._do_parse(expression)
+        parse_times.append(time.perf_counter() - start)
+    try:
+        search = BENCH_BACKENDS[backend](parsed, text, path)
+    except RuntimeError as e:
+        sys.stderr.write("error: %s\n" % e)
+        return 1
+    start = time.perf_counter()
+    search()
+    first = time.perf_counter() - start
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        search()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        search()
+        net, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    sys.stdout.write(
+        "expression:       %s\n"
+        "backend:          %s, %d iterations\n"
+        "parse:            %s\n"
+        "first evaluation: %10.1fus\n"
+        "warm evaluation:  %s\n"
+        "allocations:      peak %d bytes, net %d bytes\n" % (
+            expression, backend, count, _format_latencies(parse_times),
+            first * 1e6, _format_latencies(latencies), peak, net))
+    return 0
+
+
 if __name__ == '__main__':
     sys.exit(main())
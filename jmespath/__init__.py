@@ -4,9 +4,14 @@ from jmespath.visitor import Options
 __version__ = '1.1.3'
 
 
-def compile(expression, options=None):
-    return parser.Parser().parse(expression, options=options)
+def compile(expression, options=None, variables=None):
+    parsed = parser.Parser().parse(expression, options=options)
+    if variables is not None:
+        # The names of the variables that will be bound when searching.
+        parsed.check_variables(variables)
+    return parsed
 
 
-def search(expression, data, options=None):
-    return compile(expression, options).search(data, options=options)
+def search(expression, data, options=None, variables=None):
+    return compile(expression, options).search(data, options=options,
+                                               variables=variables)
@@ -1,118 +1,521 @@
-# AST nodes have this structure:
-# {"type": <node type>", children: [], "value": ""}
+# AST nodes are ``Node`` instances with this structure:
+# Node(tag=<node tag>, children=[], value=<optional value>)
+#
+# The tag is the index of the node type in NODE_TYPES, and each type
+# has a constant below, such as FIELD.  Nodes used to be plain dicts,
+# so they still read like {"type": <node type>, "children": [],
+# "value": ""}: node['type'], node.get('value') and comparisons with
+# dicts keep working, but are slower than attribute access.
+#
+# Variables bound by a let expression are resolved by the parser: their
+# variable_ref node has two children, the number of let expressions
+# between the reference and the binding one, and the position of the
+# binding in it.  Other variables, bound from outside of the expression,
+# have no children.
+#
+# The parser returns trees that went through share(): their children are
+# tuples, and structurally identical subtrees are the same objects, even
+# across expressions.  Such trees must not be modified.
+
+import sys
+
+
+NODE_TYPES = (
+    'and_expression',
+    'arithmetic',
+    'arithmetic_unary',
+    'assign',
+    'comparator',
+    'current',
+    'expref',
+    'field',
+    'filter_projection',
+    'flatten',
+    'function_expression',
+    'identity',
+    'index',
+    'index_expression',
+    'key_val_pair',
+    'let_expression',
+    'literal',
+    'multi_select_dict',
+    'multi_select_list',
+    'not_expression',
+    'or_expression',
+    'pipe',
+    'projection',
+    'root',
+    'slice',
+    'subexpression',
+    'ternary_operator',
+    'value_projection',
+    'variable_ref',
+)
+TAGS = dict((name, tag) for tag, name in enumerate(NODE_TYPES))
+
+AND_EXPRESSION = TAGS['and_expression']
+ARITHMETIC = TAGS['arithmetic']
+ARITHMETIC_UNARY = TAGS['arithmetic_unary']
+ASSIGN = TAGS['assign']
+COMPARATOR = TAGS['comparator']
+CURRENT = TAGS['current']
+EXPREF = TAGS['expref']
+FIELD = TAGS['field']
+FILTER_PROJECTION = TAGS['filter_projection']
+FLATTEN = TAGS['flatten']
+FUNCTION_EXPRESSION = TAGS['function_expression']
+IDENTITY = TAGS['identity']
+INDEX = TAGS['index']
+INDEX_EXPRESSION = TAGS['index_expression']
+KEY_VAL_PAIR = TAGS['key_val_pair']
+LET_EXPRESSION = TAGS['let_expression']
+LITERAL = TAGS['literal']
+MULTI_SELECT_DICT = TAGS['multi_select_dict']
+MULTI_SELECT_LIST = TAGS['multi_select_list']
+NOT_EXPRESSION = TAGS['not_expression']
+OR_EXPRESSION = TAGS['or_expression']
+PIPE = TAGS['pipe']
+PROJECTION = TAGS['projection']
+ROOT = TAGS['root']
+SLICE = TAGS['slice']
+SUBEXPRESSION = TAGS['subexpression']
+TERNARY_OPERATOR = TAGS['ternary_operator']
+VALUE_PROJECTION = TAGS['value_projection']
+VARIABLE_REF = TAGS['variable_ref']
+
+# The value of nodes that have none, such as projections.
+_NO_VALUE = object()
+
+
+def _equal_values(mine, theirs):
+    # Frozen nodes keep their children in tuples, which are equal to the
+    # lists of children of other nodes.
+    if isinstance(mine, tuple) and isinstance(theirs, list) or \
+            isinstance(mine, list) and isinstance(theirs, tuple):
+        return list(mine) == list(theirs)
+    return mine == theirs
+
+
+class Record(object):
+    """Base class of objects that read like the dicts they replace.
+
+    Subclasses list the dict keys they expose in ``_KEYS``.  Keys whose
+    attribute is not set are missing from the dict view.
+
+    """
+    __slots__ = ()
+    _KEYS = ()
+
+    def __getitem__(self, key):
+        if key in self._KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def keys(self):
+        return [key for key in self._KEYS if hasattr(self, key)]
+
+    def values(self):
+        return [getattr(self, key) for key in self.keys()]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def as_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return (sorted(self.keys()) == sorted(other.keys()) and
+                    all(_equal_values(self[key], other[key])
+                        for key in self.keys()))
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    # Mutable, like the dicts they replace.
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+class Node(Record):
+    __slots__ = ('tag', 'children', 'value', '__weakref__')
+    _KEYS = ('type', 'children', 'value')
+
+    def __init__(self, tag, children, value=_NO_VALUE):
+        self.tag = tag
+        self.children = children
+        if value is not _NO_VALUE:
+            self.value = value
+
+    @property
+    def type(self):
+        return NODE_TYPES[self.tag]
+
+    def as_dict(self):
+        """Return the subtree as the nested dicts nodes used to be."""
+        result = {'type': self.type,
+                  'children': [child.as_dict() if isinstance(child, Node)
+                               else child for child in self.children]}
+        if hasattr(self, 'value'):
+            result['value'] = self.value
+        return result
+
+
+def freeze(node):
+    """Compact the tree of ``node`` in place, and return ``node``.
+
+    The children of every node are stored in tuples rather than lists,
+    which takes one allocation instead of two and no spare capacity,
+    and string values are interned.  Frozen trees must not be modified.
+
+    """
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if type(getattr(current, 'value', None)) is str:
+            current.value = sys.intern(current.value)
+        children = tuple(current.children)
+        current.children = children
+        stack.extend(child for child in children if isinstance(child, Node))
+    return node
+
+
+# The canonical subtrees, by structure.  Entries go away with the last
+# expression using them.
+_SHARED = None
+# Subtrees with children seen once recently, by structure.  Most of them
+# are never seen again, and an entry in _SHARED takes more memory than
+# the node it saves, so they are only shared once seen a second time
+# while still in here.  Leaves repeat a lot and are shared right away.
+_CANDIDATES = {}
+#: How many subtrees with children are kept waiting to be seen again.
+MAX_CANDIDATES = 4096
+# The types of the values that can be shared.  Lists and dicts, which
+# come from JSON literals, are mutable: a subtree holding one is never
+# shared, nor are its ancestors.
+_IMMUTABLE_TYPES = frozenset([str, int, float, bool, type(None)])
+#: The height of the highest trees that are evaluated by recursion.
+#  Higher subtrees are evaluated on an explicit stack, one level at a
+#  time, and the subtrees they are made of recursively again once they
+#  are low enough.  See ``is_deep``.
+RECURSIVE_HEIGHT = 100
+# The subtrees returned by share() or unshare() that are higher than
+# RECURSIVE_HEIGHT, by id.
+_DEEP = None
+
+
+def share(node):
+    """Return the canonical version of the tree of ``node``.
+
+    Field names and other string values are interned, the children of
+    every node are stored in tuples, and subtrees are replaced by
+    structurally identical subtrees seen before, when they are still
+    alive: leaves always, and other subtrees when they were seen
+    recently enough.  Trees built from the same catalog of expressions
+    then take memory for their distinct subtrees rather than for each
+    occurrence of the common ones.
+
+    The nodes of ``node`` are modified in place, and the returned tree
+    must not be modified.  Trees of any depth are walked without
+    recursing, and the subtrees higher than ``RECURSIVE_HEIGHT`` are
+    recorded for ``is_deep``.
+
+    """
+    global _SHARED
+    if _SHARED is None:
+        import weakref
+        _SHARED = weakref.WeakValueDictionary()
+    return _share(node, _SHARED, _deep_registry())
+
+
+def unshare(node):
+    """Return a copy of the tree of ``node`` that shares no subtree.
+
+    Each occurrence of a subtree in the copy is a node of its own, so
+    nodes can be told apart by identity, even where ``share`` made them
+    the same.  The subtrees of the copy higher than ``RECURSIVE_HEIGHT``
+    are recorded for ``is_deep``.
+
+    """
+    deep = _deep_registry()
+    # The tree is walked in postorder, with a frame per node whose
+    # children are being copied: the node, the index of its next child,
+    # the copied children and the height of its highest child.
+    stack = [[node, 0, [], 0]]
+    while True:
+        frame = stack[-1]
+        current, index, children = frame[0], frame[1], frame[2]
+        current_children = current.children
+        while index < len(current_children):
+            child = current_children[index]
+            index += 1
+            if type(child) is Node:
+                break
+            children.append(child)
+        else:
+            child = None
+        if child is not None:
+            frame[1] = index
+            stack.append([child, 0, [], 0])
+            continue
+        stack.pop()
+        copy = Node(current.tag, tuple(children))
+        try:
+            copy.value = current.value
+        except AttributeError:
+            pass
+        height = frame[3] + 1
+        if height > RECURSIVE_HEIGHT:
+            deep[id(copy)] = copy
+        if not stack:
+            return copy
+        parent = stack[-1]
+        parent[2].append(copy)
+        if height > parent[3]:
+            parent[3] = height
+
+
+def _deep_registry():
+    global _DEEP
+    if _DEEP is None:
+        import weakref
+        _DEEP = weakref.WeakValueDictionary()
+    return _DEEP
+
+
+def is_deep(node):
+    """Return whether ``node`` is higher than ``RECURSIVE_HEIGHT``.
+
+    Only the trees returned by ``share``, such as those of parsed
+    expressions, and by ``unshare`` are known to be deep.
+
+    """
+    deep = _DEEP
+    return deep is not None and deep.get(id(node)) is node
+
+
+def _share(root, shared, deep):
+    # The tree is walked in postorder, with a frame per node whose
+    # children are being shared: the node, the index of its next child,
+    # its key, its new children, whether it is immutable and the height
+    # of its highest child.  The key of a node is its tag, the identity
+    # of its canonical children or the type and value of its other
+    # children, and the type and value of its own value.  Types are
+    # part of the key because 1, 1.0 and True are equal.  Slice bounds
+    # are the only children that aren't nodes, and they are never
+    # floats.
+    stack = [[root, 0, [root.tag], [], True, 0]]
+    while True:
+        frame = stack[-1]
+        node, index, key, children = frame[0], frame[1], frame[2], frame[3]
+        node_children = node.children
+        while index < len(node_children):
+            child = node_children[index]
+            index += 1
+            if type(child) is Node:
+                break
+            value_type = type(child)
+            frame[4] = frame[4] and value_type in _IMMUTABLE_TYPES
+            key.append(value_type)
+            key.append(child)
+            children.append(child)
+        else:
+            child = None
+        if child is not None:
+            frame[1] = index
+            stack.append([child, 0, [child.tag], [], True, 0])
+            continue
+        stack.pop()
+        height = frame[5] + 1
+        node, immutable = _share_node(node, key, children, frame[4],
+                                      shared)
+        if height > RECURSIVE_HEIGHT:
+            deep[id(node)] = node
+        if not stack:
+            return node
+        parent = stack[-1]
+        parent[2].append(id(node))
+        parent[3].append(node)
+        parent[4] = parent[4] and immutable
+        if height > parent[5]:
+            parent[5] = height
+
+
+def _share_node(node, key, children, immutable, shared,
+                intern=sys.intern):
+    # Returns the canonical node and whether it is immutable, once its
+    # children are shared.
+    node.children = tuple(children)
+    try:
+        value = node.value
+    except AttributeError:
+        pass
+    else:
+        value_type = type(value)
+        if value_type is str:
+            value = node.value = intern(value)
+        immutable = immutable and value_type in _IMMUTABLE_TYPES
+        key.append(value_type)
+        # -0.0 equals 0.0, but is a different literal.
+        key.append(repr(value) if value_type is float else value)
+    if not immutable:
+        return node, False
+    key = tuple(key)
+    existing = shared.get(key)
+    if existing is not None:
+        return existing, True
+    if children:
+        candidates = _CANDIDATES
+        existing = candidates.pop(key, None)
+        if existing is None:
+            # Candidates keep their subtrees alive, which keeps the
+            # identities in their keys valid.  The oldest are dropped.
+            candidates[key] = node
+            if len(candidates) > MAX_CANDIDATES:
+                candidates.pop(next(iter(candidates)), None)
+            return node, True
+        node = existing
+    shared[key] = node
+    return node, True
 
 
 def arithmetic_unary(operator, expression):
-    return {'type': 'arithmetic_unary', 'children': [expression], 'value': operator}
+    return Node(ARITHMETIC_UNARY, [expression], operator)
 
 
 def arithmetic(operator, left, right):
-    return {'type': 'arithmetic', 'children': [left, right], 'value': operator}
+    return Node(ARITHMETIC, [left, right], operator)
 
 
 def assign(name, expr):
-    return {'type': 'assign', 'children': [expr], 'value': name}
+    return Node(ASSIGN, [expr], name)
 
 
 def comparator(name, first, second):
-    return {'type': 'comparator', 'children': [first, second], 'value': name}
+    return Node(COMPARATOR, [first, second], name)
 
 
 def current_node():
-    return {'type': 'current', 'children': []}
+    return Node(CURRENT, [])
 
 
 def root_node():
-    return {'type': 'root', 'children': []}
+    return Node(ROOT, [])
 
 
 def expref(expression):
-    return {'type': 'expref', 'children': [expression]}
+    return Node(EXPREF, [expression])
 
 
 def function_expression(name, args):
-    return {'type': 'function_expression', 'children': args, 'value': name}
+    return Node(FUNCTION_EXPRESSION, args, name)
 
 
 def field(name):
-    return {"type": "field", "children": [], "value": name}
+    return Node(FIELD, [], name)
 
 
 def filter_projection(left, right, comparator):
-    return {'type': 'filter_projection', 'children': [left, right, comparator]}
+    return Node(FILTER_PROJECTION, [left, right, comparator])
 
 
 def flatten(node):
-    return {'type': 'flatten', 'children': [node]}
+    return Node(FLATTEN, [node])
 
 
 def identity():
-    return {"type": "identity", 'children': []}
+    return Node(IDENTITY, [])
 
 
 def index(index):
-    return {"type": "index", "value": index, "children": []}
+    return Node(INDEX, [], index)
 
 
 def index_expression(children):
-    return {"type": "index_expression", 'children': children}
+    return Node(INDEX_EXPRESSION, children)
 
 
 def key_val_pair(key_name, node):
-    return {"type": "key_val_pair", 'children': [node], "value": key_name}
+    return Node(KEY_VAL_PAIR, [node], key_name)
 
 
 def let_expression(bindings, expr):
-    return {'type': 'let_expression', 'children': [*bindings, expr]}
+    return Node(LET_EXPRESSION, [*bindings, expr])
 
 
 def literal(literal_value):
-    return {'type': 'literal', 'value': literal_value, 'children': []}
+    return Node(LITERAL, [], literal_value)
 
 
 def multi_select_dict(nodes):
-    return {"type": "multi_select_dict", "children": nodes}
+    return Node(MULTI_SELECT_DICT, nodes)
 
 
 def multi_select_list(nodes):
-    return {"type": "multi_select_list", "children": nodes}
+    return Node(MULTI_SELECT_LIST, nodes)
 
 
 def or_expression(left, right):
-    return {"type": "or_expression", "children": [left, right]}
+    return Node(OR_EXPRESSION, [left, right])
 
 
 def and_expression(left, right):
-    return {"type": "and_expression", "children": [left, right]}
+    return Node(AND_EXPRESSION, [left, right])
 
 
 def not_expression(expr):
-    return {"type": "not_expression", "children": [expr]}
+    return Node(NOT_EXPRESSION, [expr])
 
 
 def pipe(left, right):
-    return {'type': 'pipe', 'children': [left, right]}
+    return Node(PIPE, [left, right])
 
 
 def projection(left, right):
-    return {'type': 'projection', 'children': [left, right]}
+    return Node(PROJECTION, [left, right])
 
 
 def subexpression(children):
-    return {"type": "subexpression", 'children': children}
+    return Node(SUBEXPRESSION, children)
 
 
 def slice(start, end, step):
-    return {"type": "slice", "children": [start, end, step]}
+    return Node(SLICE, [start, end, step])
 
 
 def value_projection(left, right):
-    return {'type': 'value_projection', 'children': [left, right]}
+    return Node(VALUE_PROJECTION, [left, right])
 
 
-def variable_ref(name):
-    return {"type": "variable_ref", "children": [], "value": name}
+def variable_ref(name, depth=None, slot=None):
+    if depth is None:
+        return Node(VARIABLE_REF, [], name)
+    return Node(VARIABLE_REF, [depth, slot], name)
 
 
 def ternary_operator(condition, left, right):
-    return {"type": "ternary_operator", "children": [condition, left, right]}
\ No newline at end of file
+    return Node(TERNARY_OPERATOR, [condition, left, right])
@@ -0,0 +1,229 @@
+"""Memoization of search results.
+
+A ``ResultCache`` sits in front of ``ParsedResult.search`` and returns
+the previously computed result when the same expression is evaluated
+against the same document again.  Documents are identified by a
+fingerprint:
+
+* Documents handed to ``ResultCache.register`` are promised to be
+  immutable and are fingerprinted by identity, which costs nothing.
+* Documents decoded through ``ResultCache.loads`` are fingerprinted by
+  a hash of the JSON text they were decoded from, so two byte-identical
+  payloads share their cached results.
+* Any other document is fingerprinted by hashing its canonical JSON
+  serialization, if it is made of plain JSON values only: dicts with
+  string keys, lists, strings, numbers, booleans and None.  Tuples,
+  other keys and other types would serialize like different plain
+  documents, so the results of such documents are never cached.  This
+  is not free: the whole document is checked and serialized with
+  sorted keys on every search, which can cost more than the search
+  itself.  Prefer one of the two options above on hot paths, or pass
+  ``hash_unregistered=False`` so that the results of unregistered
+  documents are never cached.
+
+Results are also keyed by the options that change them: the
+``dict_cls``, the ``custom_functions``, legacy literals and the
+evaluation limits, so that a result computed within some limits is
+never returned to a search with lower ones.
+
+Usage::
+
+    cache = ResultCache(max_size=1024, ttl=60)
+    options = jmespath.Options(result_cache=cache)
+    data = cache.loads(payload)
+    jmespath.search('foo.bar', data, options=options)
+
+"""
+import copy
+import hashlib
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache(object):
+    def __init__(self, max_size=1024, ttl=None, copy_results=True,
+                 max_documents=None, hash_unregistered=True,
+                 clock=time.monotonic):
+        #: The maximum number of results held by the cache.  The least
+        #  recently used results are evicted first.
+        self.max_size = max_size
+        #: The number of seconds a result stays valid, or None if
+        #  results never expire.
+        self.ttl = ttl
+        #: Whether lists and dicts are copied on their way into and
+        #  out of the cache.  Disable this only if callers never
+        #  mutate search results.
+        self.copy_results = copy_results
+        if max_documents is None:
+            max_documents = max_size
+        self.max_documents = max_documents
+        #: Whether documents that are neither registered nor decoded by
+        #  ``loads`` are fingerprinted by serializing them.  If not,
+        #  their results are not cached.
+        self.hash_unregistered = hash_unregistered
+        self._clock = clock
+        self._results = OrderedDict()
+        self._documents = OrderedDict()
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+
+    def register(self, document):
+        """Register an immutable document.
+
+        The document is fingerprinted by identity.  The caller promises
+        not to mutate it while it is registered.
+
+        """
+        with self._lock:
+            self._remember(document, ('id', next(self._tokens)))
+        return document
+
+    def loads(self, text):
+        """Decode a JSON document and fingerprint it by content."""
+        if isinstance(text, str):
+            raw = text.encode('utf-8')
+        else:
+            raw = text
+        document = json.loads(text)
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        with self._lock:
+            self._remember(document, ('content', digest))
+        return document
+
+    def fingerprint(self, document):
+        """Return the fingerprint of ``document``, or None.
+
+        None is returned for documents that cannot be serialized to
+        JSON, and for unregistered documents if ``hash_unregistered``
+        is false.  Their results are never cached.
+
+        """
+        return self._fingerprint(document, self.hash_unregistered)
+
+    def _fingerprint(self, document, by_content):
+        with self._lock:
+            entry = self._documents.get(id(document))
+            if entry is not None and entry[0] is document:
+                self._documents.move_to_end(id(document))
+                return entry[1]
+        if not by_content or not _is_plain_json(document):
+            return None
+        try:
+            serialized = json.dumps(document, sort_keys=True,
+                                    separators=(',', ':'))
+        except ValueError:
+            return None
+        return ('content', hashlib.blake2b(
+            serialized.encode('utf-8'), digest_size=16).digest())
+
+    def search(self, parsed, value, options=None, variables=None):
+        fingerprint = self.fingerprint(value)
+        if fingerprint is not None and variables is not None:
+            # Results depend on the values bound to the variables too.
+            variables_fingerprint = self._fingerprint(variables, True)
+            if variables_fingerprint is None:
+                fingerprint = None
+            else:
+                fingerprint = (fingerprint, variables_fingerprint)
+        if fingerprint is None:
+            with self._lock:
+                self._misses += 1
+            return parsed._search(value, options, variables)
+        key = (parsed.expression, fingerprint, _options_key(options))
+        now = self._clock()
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None:
+                result, expires = entry
+                if expires is not None and expires <= now:
+                    del self._results[key]
+                    self._expired += 1
+                else:
+                    self._results.move_to_end(key)
+                    self._hits += 1
+                    return self._copy(result)
+            self._misses += 1
+        result = parsed._search(value, options, variables)
+        expires = None if self.ttl is None else now + self.ttl
+        with self._lock:
+            self._results[key] = (self._copy(result), expires)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+                self._evictions += 1
+        return result
+
+    def clear(self):
+        """Drop every cached result and registered document."""
+        with self._lock:
+            self._results.clear()
+            self._documents.clear()
+
+    @property
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expired': self._expired,
+                'size': len(self._results),
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+            }
+
+    def _remember(self, document, fingerprint):
+        # We hold a reference to the document so that its id() can't
+        # be reused by another object while the fingerprint is known.
+        self._documents[id(document)] = (document, fingerprint)
+        self._documents.move_to_end(id(document))
+        while len(self._documents) > self.max_documents:
+            self._documents.popitem(last=False)
+
+    def _copy(self, result):
+        if self.copy_results and isinstance(result, (list, dict)):
+            return copy.deepcopy(result)
+        return result
+
+
+_JSON_SCALARS = frozenset([str, int, float, bool, type(None)])
+
+
+def _is_plain_json(document):
+    # Whether json.dumps() serializes ``document`` to a text that no
+    # other document serializes to.  It writes tuples like lists and
+    # turns int, float, bool and None keys into strings.
+    stack = [document]
+    while stack:
+        value = stack.pop()
+        value_type = type(value)
+        if value_type is dict:
+            for key in value:
+                if type(key) is not str:
+                    return False
+            stack.extend(value.values())
+        elif value_type is list:
+            stack.extend(value)
+        elif value_type not in _JSON_SCALARS:
+            return False
+    return True
+
+
+def _options_key(options):
+    # The options that change the result of a search.  Functions are
+    # keyed by identity, and the key holds a reference to them so that
+    # their id() can't be reused.  A search that exceeds its limits
+    # raises rather than returning a result, so they are part of the
+    # key too.
+    if options is None:
+        return (None, None, False, None, None, None)
+    return (options.dict_cls, options.custom_functions,
+            options.enable_legacy_literals, options.max_steps,
+            options.timeout, options.max_result_size)
@@ -0,0 +1,101 @@
+"""Catalogs of expressions compiled before forking.
+
+Pre-fork servers compile their expressions in the master process, so
+that worker processes inherit them.  The memory pages holding the ASTs
+are shared with the workers until one of them writes to a page, and
+CPython writes to objects merely by using them: the cyclic garbage
+collector updates the header of every object it tracks whenever it
+runs, and reference counts change whenever an object is used.
+
+A ``Catalog`` compiles a known set of expressions.  Calling ``freeze()``
+right before forking compacts their ASTs, with children in tuples and
+interned strings.  ``freeze(gc_freeze=True)`` also moves every object
+allocated so far out of reach of the garbage collector with
+``gc.freeze()``, so that collections in the workers no longer copy
+these pages::
+
+    catalog = Catalog(expressions)
+    catalog.freeze(gc_freeze=True)
+    # ... fork the workers, which then run:
+    catalog.search('foo.bar', data)
+
+``gc.freeze()`` acts on the whole process, not only on the catalog:
+the objects of the application allocated so far are never collected
+afterwards, even once unreachable, which is why it has to be asked for.
+
+The reference counts of the nodes an expression visits are still
+updated when it is evaluated, so only the pages of the expressions a
+worker never evaluates stay shared.  ``python -m benchmarks fork``
+measures the memory each worker ends up not sharing.
+
+A catalog can also be given as ``Options(compiled_cache=catalog)``, to
+be used by ``jmespath.compile()`` and ``jmespath.search()``.
+
+"""
+import gc
+
+from jmespath import ast
+from jmespath.diskcache import options_key
+from jmespath.parser import Parser
+
+
+class Catalog(object):
+    def __init__(self, expressions=(), options=None):
+        #: The options expressions are compiled and searched with.
+        self.options = options
+        #: Whether every expression is frozen.
+        self.frozen = True
+        self._compiled = {}
+        for expression in expressions:
+            self.add(expression)
+
+    def add(self, expression):
+        """Compile ``expression`` if needed, and return its ParsedResult."""
+        parsed = self._compiled.get(expression)
+        if parsed is None:
+            parsed = Parser()._do_parse(expression, self.options)
+            self._compiled[expression] = parsed
+            self.frozen = False
+        return parsed
+
+    def get(self, expression, options=None):
+        """Return the ParsedResult of ``expression``, or None.
+
+        None is returned when the expression is not in the catalog, or
+        when ``options`` would parse it differently.
+
+        """
+        if options_key(options) != options_key(self.options):
+            return None
+        return self._compiled.get(expression)
+
+    def search(self, expression, data, options=None, variables=None):
+        if options is None:
+            options = self.options
+        return self.add(expression).search(data, options, variables)
+
+    def freeze(self, gc_freeze=False):
+        """Compact the ASTs, and optionally hide them from the collector.
+
+        Call this in the master process, right before forking.  With
+        ``gc_freeze``, garbage is collected first and every object of
+        the process allocated so far, not only the ASTs, is moved to
+        the permanent generation of the garbage collector, where it is
+        never collected unless ``gc.unfreeze()`` is called.
+
+        """
+        for parsed in self._compiled.values():
+            ast.freeze(parsed.parsed)
+        self.frozen = True
+        if gc_freeze:
+            gc.collect()
+            gc.freeze()
+
+    def __contains__(self, expression):
+        return expression in self._compiled
+
+    def __iter__(self):
+        return iter(self._compiled)
+
+    def __len__(self):
+        return len(self._compiled)
@@ -1,4 +1,4 @@
-import inspect
+import types
 
 iteritems = dict.items
 
@@ -15,5 +15,14 @@ def with_repr_method(cls):
     return cls
 
 def get_methods(cls):
-    for name, method in inspect.getmembers(cls, predicate=inspect.isfunction):
-        yield name, method
+    # Equivalent to inspect.getmembers(cls, inspect.isfunction), without
+    # importing inspect or triggering descriptors through getattr().
+    methods = {}
+    for klass in reversed(cls.__mro__):
+        for name, value in klass.__dict__.items():
+            if isinstance(value, types.FunctionType):
+                methods[name] = value
+            else:
+                methods.pop(name, None)
+    for name in sorted(methods):
+        yield name, methods[name]
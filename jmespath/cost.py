@@ -0,0 +1,421 @@
+"""Static cost estimation for parsed expressions.
+
+The estimator walks the AST of an expression, without evaluating it,
+and produces:
+
+* an asymptotic complexity class in terms of ``n``, the size of the
+  input document, such as ``O(n)`` or ``O(n^2)``,
+* a numeric estimate of the number of AST node evaluations, using
+  optional cardinality hints for the collections found in documents.
+
+Cardinality hints map field names to the expected number of elements
+of the collection found under that name.  Collections without a hint
+are assumed to have ``default_cardinality`` elements::
+
+    estimate = estimate_cost(jmespath.compile('orders[*].items[*].sku'),
+                             cardinality_hints={'orders': 1000,
+                                                'items': 5})
+    estimate.complexity   # 'O(n)'
+    estimate.cost         # about 1000 * 5 evaluations
+
+Iterating over a part of the current element, as in ``a[*].b[*]``,
+stays linear in the size of the document, because every element of
+``b`` is visited once overall.  Iterating over values that don't come
+from the current element, such as ``$`` or a variable, is multiplied
+by the number of elements being projected.
+
+Expressions can be rejected at compile time by setting ``max_cost``
+or ``max_complexity`` in ``Options``.
+
+"""
+import math
+
+from jmespath import exceptions
+from jmespath.visitor import IterativeVisitor
+
+
+_CONSTANT = (0, 0)
+_LINEAR = (1, 0)
+_LOG = (0, 1)
+
+# The cost of a built-in function, in terms of the size of its
+# largest array argument and of its expression reference, if any.  The
+# complexity class of that size is the highest among its arguments.
+FUNCTION_COSTS = {
+    'abs': 'constant',
+    'ceil': 'constant',
+    'ends_with': 'constant',
+    'find_first': 'constant',
+    'find_last': 'constant',
+    'floor': 'constant',
+    'length': 'constant',
+    'lower': 'constant',
+    'pad_left': 'constant',
+    'pad_right': 'constant',
+    'replace': 'constant',
+    'split': 'constant',
+    'starts_with': 'constant',
+    'to_number': 'constant',
+    'trim': 'constant',
+    'trim_left': 'constant',
+    'trim_right': 'constant',
+    'type': 'constant',
+    'upper': 'constant',
+    'sort': 'linearithmic',
+    'avg_by': 'expref_linear',
+    'count_by': 'expref_linear',
+    'group_by': 'expref_linear',
+    'hash_join': 'expref_linear',
+    'map': 'expref_linear',
+    'max_by': 'expref_linear',
+    'min_by': 'expref_linear',
+    'sort_by': 'expref_linearithmic',
+    'sum_by': 'expref_linear',
+}
+
+# Functions that return an array as large as their array argument.
+_ARRAY_FUNCTIONS = frozenset([
+    'map', 'reverse', 'sort', 'sort_by', 'to_array', 'values', 'keys',
+    'items', 'zip', 'group_by', 'from_items', 'merge', 'hash_join',
+    'count_by', 'sum_by', 'avg_by',
+])
+
+
+def _add(*classes):
+    return max(classes)
+
+
+def _mul(first, second):
+    return (first[0] + second[0], first[1] + second[1])
+
+
+def format_complexity(complexity):
+    """Format a ``(power, log_power)`` pair as ``O(...)`` notation."""
+    power, log_power = complexity
+    parts = []
+    if power == 1:
+        parts.append('n')
+    elif power > 1:
+        parts.append('n^%d' % power)
+    if log_power == 1:
+        parts.append('log n')
+    elif log_power > 1:
+        parts.append('log^%d n' % log_power)
+    return 'O(%s)' % (' '.join(parts) or '1')
+
+
+_COMPLEXITY_PATTERN = (
+    r'^O\((?:(?P<one>1)|(?P<n>n(?:\^(?P<power>\d+))?)?\s*'
+    r'(?P<log>log(?:\^(?P<log_power>\d+))? n)?)\)$')
+
+
+def parse_complexity(text):
+    """Parse ``O(...)`` notation into a ``(power, log_power)`` pair."""
+    # re is imported here so that importing jmespath does not pay for it.
+    import re
+    match = re.match(_COMPLEXITY_PATTERN, text.strip())
+    if match is None or not any(match.group('one', 'n', 'log')):
+        raise ValueError("Invalid complexity class: %s" % text)
+    if match.group('one'):
+        return _CONSTANT
+    power = int(match.group('power') or 1) if match.group('n') else 0
+    log_power = int(match.group('log_power') or 1) \
+        if match.group('log') else 0
+    return (power, log_power)
+
+
+class _Estimate(object):
+    """The estimated cost and output size of an AST node."""
+    def __init__(self, cost=1.0, complexity=_CONSTANT,
+                 size=1.0, size_class=_CONSTANT,
+                 item_size=1.0, item_class=_CONSTANT, expref=None):
+        # Number of node evaluations, and its complexity class.
+        self.cost = cost
+        self.complexity = complexity
+        # Number of elements of the value if it is a collection.
+        self.size = size
+        self.size_class = size_class
+        # Number of elements of each element of the value.
+        self.item_size = item_size
+        self.item_class = item_class
+        # For expression references, the estimate of the expression.
+        self.expref = expref
+
+
+class CostEstimate(object):
+    def __init__(self, cost, complexity):
+        #: The estimated number of AST node evaluations.
+        self.cost = cost
+        #: The ``(power, log_power)`` pair of the complexity class.
+        self.degree = complexity
+        #: The complexity class, such as ``'O(n log n)'``.
+        self.complexity = format_complexity(complexity)
+
+    def __repr__(self):
+        return 'CostEstimate(cost=%r, complexity=%r)' % (
+            self.cost, self.complexity)
+
+
+class CostEstimator(IterativeVisitor):
+    # The visit methods of nodes with children are generators, see
+    # IterativeVisitor.
+    def __init__(self, cardinality_hints=None, default_cardinality=100):
+        super(CostEstimator, self).__init__()
+        self._hints = cardinality_hints or {}
+        self._default = float(default_cardinality)
+        # Size class of the values found relative to the current
+        # node.  At the top level this is the whole document.  While
+        # projecting, this is a part of the current element, and all
+        # those parts add up to the size of the document.
+        self._relative_class = _LINEAR
+        self._current = _Estimate(size=self._default, size_class=_LINEAR)
+        self._variables = {}
+
+    def estimate(self, node):
+        result = self.visit(node)
+        return CostEstimate(result.cost, result.complexity)
+
+    def default_visit(self, node):
+        # Operators evaluate each of their children once.
+        cost = 1.0
+        complexity = _CONSTANT
+        size = item_size = 1.0
+        size_class = item_class = _CONSTANT
+        for child in node.children:
+            estimate = yield child
+            cost += estimate.cost
+            complexity = _add(complexity, estimate.complexity)
+            if estimate.size > size:
+                size = estimate.size
+                size_class = estimate.size_class
+                item_size = estimate.item_size
+                item_class = estimate.item_class
+        return _Estimate(cost, complexity, size, size_class,
+                         item_size, item_class)
+
+    def visit_field(self, node):
+        return _Estimate(
+            size=float(self._hints.get(node.value, self._default)),
+            size_class=self._relative_class)
+
+    def visit_current(self, node):
+        current = self._current
+        return _Estimate(size=current.size, size_class=current.size_class,
+                         item_size=current.item_size,
+                         item_class=current.item_class)
+
+    visit_identity = visit_current
+
+    def visit_root(self, node):
+        return _Estimate(size=float(self._hints.get('$', self._default)),
+                         size_class=_LINEAR)
+
+    def visit_variable_ref(self, node):
+        bound = self._variables.get(node.value)
+        size = bound.size if bound is not None else self._default
+        # Variables hold values computed outside of the current
+        # element, so iterating over them is never amortized.
+        return _Estimate(size=size, size_class=_LINEAR)
+
+    def visit_literal(self, node):
+        value = node.value
+        size = len(value) if isinstance(value, (list, dict)) else 1
+        return _Estimate(size=float(size))
+
+    def visit_index(self, node):
+        current = self._current
+        return _Estimate(size=current.item_size,
+                         size_class=current.item_class)
+
+    def visit_slice(self, node):
+        current = self._current
+        return _Estimate(cost=current.size, complexity=current.size_class,
+                         size=current.size, size_class=current.size_class,
+                         item_size=current.item_size,
+                         item_class=current.item_class)
+
+    def visit_subexpression(self, node):
+        saved = (self._current, self._relative_class)
+        cost = 0.0
+        complexity = _CONSTANT
+        try:
+            for child in node.children:
+                estimate = yield child
+                cost += estimate.cost
+                complexity = _add(complexity, estimate.complexity)
+                # Values found under ``$`` or under a variable are
+                # not parts of the current element.
+                self._current = estimate
+                self._relative_class = _add(self._relative_class,
+                                            estimate.size_class)
+        finally:
+            self._current, self._relative_class = saved
+        return _Estimate(cost, complexity, estimate.size,
+                         estimate.size_class, estimate.item_size,
+                         estimate.item_class)
+
+    visit_index_expression = visit_subexpression
+    visit_pipe = visit_subexpression
+
+    def visit_projection(self, node):
+        left = yield node.children[0]
+        element_cost, element_class, right = \
+            yield from self._visit_per_element(left, node.children[1:])
+        return _Estimate(
+            left.cost + left.size * element_cost,
+            _add(left.complexity, _mul(left.size_class, element_class)),
+            left.size, left.size_class, right.size, right.size_class)
+
+    visit_value_projection = visit_projection
+    visit_filter_projection = visit_projection
+
+    def visit_flatten(self, node):
+        child = yield node.children[0]
+        size = child.size * child.item_size
+        size_class = _mul(child.size_class, child.item_class)
+        return _Estimate(child.cost + size,
+                         _add(child.complexity, size_class),
+                         size, size_class)
+
+    def visit_multi_select_list(self, node):
+        estimate = yield from self.default_visit(node)
+        estimate.item_size = estimate.size
+        estimate.item_class = estimate.size_class
+        estimate.size = float(len(node.children))
+        estimate.size_class = _CONSTANT
+        return estimate
+
+    visit_multi_select_dict = visit_multi_select_list
+
+    def visit_comparator(self, node):
+        estimate = yield from self.default_visit(node)
+        estimate.size = estimate.item_size = 1.0
+        estimate.size_class = estimate.item_class = _CONSTANT
+        return estimate
+
+    visit_arithmetic = visit_comparator
+    visit_arithmetic_unary = visit_comparator
+    visit_not_expression = visit_comparator
+
+    def visit_let_expression(self, node):
+        *bindings, body = node.children
+        saved = self._variables
+        cost = 0.0
+        complexity = _CONSTANT
+        bound = {}
+        for assign in bindings:
+            estimate = yield assign.children[0]
+            cost += estimate.cost
+            complexity = _add(complexity, estimate.complexity)
+            bound[assign.value] = estimate
+        # Bind into a copy, since the enclosing scope may be saved by
+        # _visit_per_element.
+        self._variables = dict(saved)
+        self._variables.update(bound)
+        try:
+            estimate = yield body
+        finally:
+            self._variables = saved
+        estimate.cost += cost
+        estimate.complexity = _add(estimate.complexity, complexity)
+        return estimate
+
+    def visit_expref(self, node):
+        element = _Estimate(size=self._current.item_size,
+                            size_class=self._current.item_class)
+        cost, complexity, _ = yield from self._visit_per_element(
+            element, node.children)
+        return _Estimate(expref=_Estimate(cost, complexity))
+
+    def visit_function_expression(self, node):
+        cost = 1.0
+        complexity = _CONSTANT
+        array = _Estimate(size=1.0)
+        n_class = _CONSTANT
+        expref = None
+        for child in node.children:
+            estimate = yield child
+            cost += estimate.cost
+            complexity = _add(complexity, estimate.complexity)
+            if estimate.expref is not None:
+                expref = estimate.expref
+                continue
+            # The estimated sizes depend on the hints, but the class is
+            # the highest of every argument, whatever their order.
+            n_class = _add(n_class, estimate.size_class)
+            if estimate.size > array.size:
+                array = estimate
+        kind = FUNCTION_COSTS.get(node.value, 'linear')
+        n = array.size
+        if expref is None:
+            expref = _Estimate(cost=1.0)
+        if kind == 'linear':
+            cost += n
+            complexity = _add(complexity, n_class)
+        elif kind == 'linearithmic':
+            cost += n * math.log2(max(n, 2))
+            complexity = _add(complexity, _mul(n_class, _LOG))
+        elif kind == 'expref_linear':
+            cost += n * expref.cost
+            complexity = _add(complexity,
+                              _mul(n_class, expref.complexity))
+        elif kind == 'expref_linearithmic':
+            cost += n * expref.cost + n * math.log2(max(n, 2))
+            complexity = _add(complexity,
+                              _mul(n_class, expref.complexity),
+                              _mul(n_class, _LOG))
+        elif kind == 'expref_quadratic':
+            cost += n * n * expref.cost
+            complexity = _add(
+                complexity,
+                _mul(_mul(n_class, n_class), expref.complexity))
+        if node.value in _ARRAY_FUNCTIONS:
+            return _Estimate(cost, complexity, n, n_class,
+                             array.item_size, array.item_class)
+        return _Estimate(cost, complexity)
+
+    def _visit_per_element(self, collection, children):
+        # Estimate the cost of evaluating ``children`` once for an
+        # element of ``collection``.
+        saved = (self._current, self._relative_class, self._variables)
+        self._current = _Estimate(size=collection.item_size,
+                                  size_class=collection.item_class)
+        self._relative_class = _CONSTANT
+        cost = 0.0
+        complexity = _CONSTANT
+        estimate = _Estimate()
+        try:
+            for child in children:
+                estimate = yield child
+                cost += estimate.cost
+                complexity = _add(complexity, estimate.complexity)
+        finally:
+            self._current, self._relative_class, self._variables = saved
+        return cost, complexity, estimate
+
+
+def estimate_cost(parsed, cardinality_hints=None, default_cardinality=100):
+    """Estimate the cost of a ``ParsedResult`` or of an AST."""
+    node = getattr(parsed, 'parsed', parsed)
+    estimator = CostEstimator(cardinality_hints, default_cardinality)
+    return estimator.estimate(node)
+
+
+def check_budget(parsed, options):
+    """Raise ``CostBudgetExceededError`` if ``parsed`` is too costly.
+
+    ``parsed`` is a ``ParsedResult``, which caches its estimate.
+
+    """
+    estimate = parsed.cost(options.cardinality_hints)
+    if options.max_complexity is not None:
+        budget = options.max_complexity
+        if isinstance(budget, str):
+            budget = parse_complexity(budget)
+        if estimate.degree > budget:
+            raise exceptions.CostBudgetExceededError(
+                parsed.expression, estimate, format_complexity(budget))
+    if options.max_cost is not None and estimate.cost > options.max_cost:
+        raise exceptions.CostBudgetExceededError(
+            parsed.expression, estimate, options.max_cost)
+    return estimate
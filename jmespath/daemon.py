@@ -0,0 +1,284 @@
+"""A long running search server and its client.
+
+Starting an interpreter, importing jmespath and compiling an expression
+dominates the cost of running ``jp`` on a small document.  A ``Server``
+pays this once: it listens on a Unix socket and keeps the expressions
+it has compiled in an LRU cache.  ``jp --serve`` starts one, and ``jp
+--socket`` forwards searches to it.
+
+Messages are frames of a 4 byte big endian length followed by that many
+bytes.  A request is two frames, a JSON header and the JSON document to
+search::
+
+    {"expression": "foo.bar"}
+    {"foo": {"bar": 1}}
+
+The socket is only accessible to the user that started the server.
+Without ``XDG_RUNTIME_DIR`` it lives in a directory of the temporary
+directory that only that user may enter.
+
+The response is a single JSON frame.  It either contains the result
+formatted the way ``jp`` prints it, or the kind of error that occurred
+and its message::
+
+    {"ok": true, "output": "1"}
+    {"ok": false, "error": "syntax-error", "message": "..."}
+
+A connection can carry any number of requests.
+
+"""
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+from jmespath import exceptions
+from jmespath import parser
+
+
+_HEADER = struct.Struct('>I')
+
+#: The largest frame accepted, in bytes.
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+# The error kinds reported by jp, most specific first.
+ERROR_KINDS = [
+    (exceptions.ArityError, 'invalid-arity'),
+    (exceptions.JMESPathTypeError, 'invalid-type'),
+    (exceptions.JMESPathValueError, 'invalid-value'),
+    (exceptions.UnknownFunctionError, 'unknown-function'),
+    (exceptions.ParseError, 'syntax-error'),
+]
+
+
+def error_kind(error):
+    """Return the kind of a jmespath error, as reported by jp."""
+    for cls, kind in ERROR_KINDS:
+        if isinstance(error, cls):
+            return kind
+    return 'error'
+
+
+def format_result(result):
+    return json.dumps(result, indent=4, ensure_ascii=False)
+
+
+def default_socket_path():
+    """Return the socket used when none is given.
+
+    The temporary directory is shared by every user, so the socket is
+    put in a private directory of it, which is created if needed.
+    ``OSError`` is raised if that directory belongs to someone else or
+    others may access it.
+
+    """
+    path = os.environ.get('JP_SOCKET')
+    if path:
+        return path
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if directory:
+        return os.path.join(directory, 'jp-%d.sock' % os.getuid())
+    directory = os.path.join(tempfile.gettempdir(), 'jp-%d' % os.getuid())
+    _private_directory(directory)
+    return os.path.join(directory, 'jp.sock')
+
+
+def _private_directory(path):
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise OSError("%s is not a directory owned by the current user"
+                      % path)
+    if info.st_mode & 0o077:
+        raise OSError("%s is accessible to other users" % path)
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_frame(sock):
+    """Read a frame, or return None if the connection was closed."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    size = _HEADER.unpack(header)[0]
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError("Frame of %s bytes exceeds the maximum of %s"
+                            % (size, MAX_FRAME_SIZE))
+    frame = _recv_exactly(sock, size)
+    if frame is None:
+        raise ProtocolError("Connection closed in the middle of a frame")
+    return frame
+
+
+def write_frame(sock, payload):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                header = read_frame(self.request)
+                if header is None:
+                    return
+                document = read_frame(self.request)
+                if document is None:
+                    raise ProtocolError("Missing document frame")
+            except (ProtocolError, OSError):
+                return
+            response = self.server.handle_request_frames(header, document)
+            write_frame(self.request, json.dumps(response).encode('utf-8'))
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=None, cache_size=1024, options=None):
+        self.path = path or default_socket_path()
+        #: The maximum number of compiled expressions kept.  The least
+        #  recently used ones are evicted first.
+        self.cache_size = cache_size
+        self.options = options
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0, 'errors': 0}
+        _remove_stale_socket(self.path)
+        socketserver.UnixStreamServer.__init__(self, self.path,
+                                               _RequestHandler)
+
+    def compile(self, expression):
+        with self._lock:
+            parsed = self._compiled.get(expression)
+            if parsed is not None:
+                self._compiled.move_to_end(expression)
+                self.stats['hits'] += 1
+                return parsed
+            self.stats['misses'] += 1
+        parsed = parser.Parser()._do_parse(expression, self.options)
+        with self._lock:
+            self._compiled[expression] = parsed
+            while len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+        return parsed
+
+    def handle_request_frames(self, header, document):
+        with self._lock:
+            self.stats['requests'] += 1
+        try:
+            expression = json.loads(header.decode('utf-8'))['expression']
+            data = json.loads(document.decode('utf-8'))
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error('invalid-request', e)
+        try:
+            output = format_result(
+                self.compile(expression).search(data, self.options))
+        except exceptions.JMESPathError as e:
+            return self._error(error_kind(e), e)
+        except Exception as e:
+            # A bug or a RecursionError must not leave the client
+            # waiting for a response that never comes.
+            return self._error('error', e)
+        return {'ok': True, 'output': output}
+
+    def _error(self, kind, error):
+        with self._lock:
+            self.stats['errors'] += 1
+        return {'ok': False, 'error': kind, 'message': str(error)}
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        os.chmod(self.path, 0o600)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def _remove_stale_socket(path):
+    # A socket left behind by a server that did not shut down cleanly
+    # would make bind() fail.  Only remove it if it is a socket of the
+    # current user and nobody listens on it.
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise OSError("%s is not a socket owned by the current user" % path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError("A server is already listening on %s" % path)
+    finally:
+        sock.close()
+
+
+class Client(object):
+    def __init__(self, path=None, timeout=None):
+        self.path = path or default_socket_path()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(self.path)
+        except OSError:
+            self._sock.close()
+            raise
+
+    def request(self, expression, document):
+        """Search ``document``, the bytes of a JSON document.
+
+        Returns the response dict of the server.
+
+        """
+        if not isinstance(document, bytes):
+            document = document.encode('utf-8')
+        write_frame(self._sock, json.dumps(
+            {'expression': expression}).encode('utf-8'))
+        write_frame(self._sock, document)
+        response = read_frame(self._sock)
+        if response is None:
+            raise ProtocolError("Connection closed by the server")
+        return json.loads(response.decode('utf-8'))
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def connect(path=None, timeout=None):
+    """Connect to a server, or return None if none is running."""
+    try:
+        return Client(path, timeout)
+    except OSError:
+        return None
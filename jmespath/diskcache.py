@@ -0,0 +1,435 @@
+"""Compiled expressions saved to disk.
+
+Services that search with a known catalog of expressions compile all
+of them whenever they start.  A ``CompiledCache`` file holds the ASTs of
+such a catalog, so that they are decoded instead of parsed again::
+
+    diskcache.precompile(catalog, 'cache.bin')
+
+    options = jmespath.Options(
+        compiled_cache=diskcache.CompiledCache('cache.bin'))
+    jmespath.compile('foo.bar', options)
+
+``jp.py --precompile catalog.txt -o cache.bin`` does the same from the
+command line.
+
+The file is memory mapped when it is opened, and only its index is
+read: an expression is decoded the first time it is looked up, or when
+``CompiledCache.load_all()`` decodes all of them at startup.  The
+file records the version of the parser and the options that affect
+parsing, and a cache built by another parser or with other options is
+ignored rather than trusted.  The parser version is a digest of the
+node types and of the code that compiles expressions, see
+``parser_version()``, so that editing the parser invalidates caches
+even when the library version stays the same.
+
+The format is not pickle, so loading a file never runs code.  All
+integers are little endian::
+
+    header   magic "JPCC", format version (u16), parser version and
+             options key (u16 length + utf-8 each), entry count (u32)
+    index    per entry: expression (u32 length + utf-8),
+             offset from the start of the file and size (u64 each)
+    entries  the AST of each expression, in preorder
+
+A node is its tag (u8), whether it has a value (u8), its number of
+children (u32), its value if it has one, and its children.  Children
+that are not nodes, such as the bounds of slices, are encoded as nodes
+with the tag 0xFF, a value and no children.  A value is a type byte
+followed by its payload: ``n``, ``t`` and ``f`` for null, true and
+false, ``i`` for a 64 bit integer, ``d`` for a double, ``s`` for a
+string (u32 length + utf-8) and ``j`` for anything else, as JSON.
+
+"""
+import hashlib
+import mmap
+import os
+import struct
+
+import jmespath
+from jmespath import ast
+from jmespath import lexer
+from jmespath import parser
+from jmespath import scope
+from jmespath.parser import Parser, ParsedResult
+
+
+MAGIC = b'JPCC'
+#: The version of the file format.  Files in another format are ignored.
+FORMAT_VERSION = 3
+
+_HEADER = struct.Struct('<4sH')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_INDEX_ENTRY = struct.Struct('<QQ')
+_NODE = struct.Struct('<BBI')
+_INT = struct.Struct('<q')
+_DOUBLE = struct.Struct('<d')
+_NOT_A_NODE = 0xFF
+_STRING = ord('s')
+_INT_RANGE = (-2 ** 63, 2 ** 63)
+# The modules whose code decides the AST an expression compiles to.
+_PARSING_MODULES = (ast, lexer, parser, scope)
+_PARSER_VERSION = None
+
+
+class CacheFormatError(ValueError):
+    """The file is not a compiled expression cache, or is corrupted."""
+
+
+def options_key(options=None):
+    """Return the part of ``options`` that changes parsed expressions."""
+    if options is None:
+        return 'enable_legacy_literals=0,auto_parameterize=0'
+    return 'enable_legacy_literals=%d,auto_parameterize=%d' % (
+        bool(options.enable_legacy_literals),
+        bool(options.auto_parameterize))
+
+
+def parser_version():
+    """Return a digest of the code that compiles expressions.
+
+    It covers the node types and the source of the lexer, the parser
+    and the modules they build ASTs with.  If a source file can't be
+    read, the library version is used instead.
+
+    """
+    global _PARSER_VERSION
+    if _PARSER_VERSION is None:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(','.join(ast.NODE_TYPES).encode('utf-8'))
+        try:
+            for module in _PARSING_MODULES:
+                with open(module.__file__, 'rb') as f:
+                    digest.update(f.read())
+        except (OSError, TypeError):
+            digest.update(jmespath.__version__.encode('utf-8'))
+        _PARSER_VERSION = digest.hexdigest()
+    return _PARSER_VERSION
+
+
+def _encode_value(value, out):
+    if value is None:
+        out.append(b'n')
+    elif value is True:
+        out.append(b't')
+    elif value is False:
+        out.append(b'f')
+    elif type(value) is int and _INT_RANGE[0] <= value < _INT_RANGE[1]:
+        out.append(b'i' + _INT.pack(value))
+    elif type(value) is float:
+        out.append(b'd' + _DOUBLE.pack(value))
+    elif type(value) is str:
+        _encode_string(b's', value, out)
+    else:
+        import json
+        _encode_string(b'j', json.dumps(value), out)
+
+
+def _encode_string(kind, value, out):
+    data = value.encode('utf-8')
+    out.append(kind + _U32.pack(len(data)))
+    out.append(data)
+
+
+def encode(node):
+    """Return the bytes of an AST."""
+    out = []
+    # Iterative, so that deeply nested expressions can be saved too.
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, ast.Node):
+            out.append(_NODE.pack(_NOT_A_NODE, True, 0))
+            _encode_value(item, out)
+            continue
+        has_value = 'value' in item
+        out.append(_NODE.pack(item.tag, has_value, len(item.children)))
+        if has_value:
+            _encode_value(item.value, out)
+        stack.extend(reversed(item.children))
+    return b''.join(out)
+
+
+def _decode_value(buf, offset):
+    kind = buf[offset:offset + 1]
+    offset += 1
+    if kind == b'n':
+        return None, offset
+    elif kind == b't':
+        return True, offset
+    elif kind == b'f':
+        return False, offset
+    elif kind == b'i':
+        return _INT.unpack_from(buf, offset)[0], offset + _INT.size
+    elif kind == b'd':
+        return _DOUBLE.unpack_from(buf, offset)[0], offset + _DOUBLE.size
+    elif kind in (b's', b'j'):
+        size = _U32.unpack_from(buf, offset)[0]
+        offset += _U32.size
+        text = buf[offset:offset + size].decode('utf-8')
+        if kind == b'j':
+            import json
+            text = json.loads(text)
+        return text, offset + size
+    raise CacheFormatError("Unknown value type %r at offset %d" % (
+        kind, offset - 1))
+
+
+def decode(buf, offset=0, size=None):
+    """Decode the AST encoded at ``offset`` of the bytes ``buf``.
+
+    Raises ``CacheFormatError`` if these bytes are not a valid AST, or
+    if ``size`` is given and the AST does not take ``size`` bytes.
+
+    """
+    try:
+        root, end = _decode_tree(buf, offset)
+    except CacheFormatError:
+        raise
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        raise CacheFormatError("Corrupted AST at offset %d: %s"
+                               % (offset, e))
+    if end > len(buf):
+        raise CacheFormatError("Truncated AST at offset %d" % offset)
+    if size is not None and end - offset != size:
+        raise CacheFormatError("AST at offset %d takes %d bytes rather "
+                               "than %d" % (offset, end - offset, size))
+    return root
+
+
+def _decode_tree(buf, offset):
+    # Returns the root and the offset of the end of the tree.
+    Node = ast.Node
+    node_types = len(ast.NODE_TYPES)
+    unpack_node = _NODE.unpack_from
+    unpack_u32 = _U32.unpack_from
+    root = None
+    # The children lists being filled, and how many children each one
+    # is still missing.
+    stack = []
+    while True:
+        tag, has_value, count = unpack_node(buf, offset)
+        if tag == _NOT_A_NODE:
+            if not (has_value and stack) or count:
+                raise CacheFormatError("Invalid value at offset %d"
+                                       % offset)
+        elif tag >= node_types:
+            raise CacheFormatError("Unknown node tag %d at offset %d"
+                                   % (tag, offset))
+        offset += 6
+        if has_value:
+            # Strings are the most common values, and decoded inline.
+            if buf[offset] == _STRING:
+                size = unpack_u32(buf, offset + 1)[0]
+                offset += 5
+                value = buf[offset:offset + size].decode('utf-8')
+                offset += size
+            else:
+                value, offset = _decode_value(buf, offset)
+            if tag == _NOT_A_NODE:
+                item = value
+            else:
+                item = Node(tag, [], value)
+        else:
+            item = Node(tag, [])
+        if stack:
+            top = stack[-1]
+            top[0].append(item)
+            top[1] -= 1
+        else:
+            root = item
+        if count:
+            stack.append([item.children, count])
+        else:
+            while stack and not stack[-1][1]:
+                stack.pop()
+            if not stack:
+                return root, offset
+
+
+def dump(parsed_results, f, options=None):
+    """Write ``ParsedResult`` objects to the binary file ``f``."""
+    header = [_HEADER.pack(MAGIC, FORMAT_VERSION)]
+    for text in (parser_version(), options_key(options)):
+        data = text.encode('utf-8')
+        header.append(_U16.pack(len(data)) + data)
+    expressions = []
+    entries = []
+    index_size = 0
+    seen = set()
+    for parsed in parsed_results:
+        if parsed.expression in seen:
+            continue
+        seen.add(parsed.expression)
+        expression = parsed.expression.encode('utf-8')
+        expressions.append(expression)
+        entries.append(encode(parsed.parsed))
+        index_size += _U32.size + len(expression) + _INDEX_ENTRY.size
+    header.append(_U32.pack(len(expressions)))
+    offset = sum(len(part) for part in header) + index_size
+    index = []
+    for expression, entry in zip(expressions, entries):
+        index.append(_U32.pack(len(expression)) + expression +
+                     _INDEX_ENTRY.pack(offset, len(entry)))
+        offset += len(entry)
+    f.write(b''.join(header + index + entries))
+
+
+def save(parsed_results, path, options=None):
+    """Write ``ParsedResult`` objects to ``path``, atomically."""
+    tmp_path = '%s.tmp%d' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            dump(parsed_results, f, options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def precompile(expressions, path, options=None):
+    """Compile ``expressions`` and save them to ``path``.
+
+    Returns the ``ParsedResult`` objects that were saved.
+
+    """
+    parser = Parser()
+    parsed_results = [parser._do_parse(expression, options)
+                      for expression in expressions]
+    save(parsed_results, path, options)
+    return parsed_results
+
+
+class CompiledCache(object):
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                self._buffer = mmap.mmap(f.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+            else:
+                self._buffer = b''
+        #: The parser version and options key the file was built with.
+        self.parser_version = None
+        self.options_key = None
+        #: Whether the file was built by another parser or in another
+        #  format.  Nothing is looked up in stale caches.
+        self.stale = False
+        self._index = {}
+        self._decoded = {}
+        self.stats = {'hits': 0, 'misses': 0, 'decoded': 0}
+        try:
+            self._read_index()
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            self.close()
+            raise CacheFormatError("Truncated or corrupted cache file "
+                                   "%s: %s" % (path, e))
+
+    def _read_index(self):
+        buf = self._buffer
+        magic, version = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            self.close()
+            raise CacheFormatError("%s is not a compiled expression cache"
+                                   % self.path)
+        if version != FORMAT_VERSION:
+            self.stale = True
+            return
+        offset = _HEADER.size
+        strings = []
+        for _ in range(2):
+            size = _U16.unpack_from(buf, offset)[0]
+            offset += _U16.size
+            strings.append(bytes(buf[offset:offset + size]).decode('utf-8'))
+            offset += size
+        self.parser_version, self.options_key = strings
+        if self.parser_version != parser_version():
+            self.stale = True
+            return
+        count = _U32.unpack_from(buf, offset)[0]
+        offset += _U32.size
+        index = self._index
+        for _ in range(count):
+            size = _U32.unpack_from(buf, offset)[0]
+            offset += _U32.size
+            expression = bytes(buf[offset:offset + size]).decode('utf-8')
+            offset += size
+            index[expression] = _INDEX_ENTRY.unpack_from(buf, offset)
+            offset += _INDEX_ENTRY.size
+
+    def get(self, expression, options=None):
+        """Return the ``ParsedResult`` of ``expression``, or None.
+
+        None is returned when the expression is not in the file, or
+        when the file was built with options that parse it differently.
+
+        """
+        if self.stale or options_key(options) != self.options_key:
+            self.stats['misses'] += 1
+            return None
+        parsed = self._decoded.get(expression)
+        if parsed is None:
+            entry = self._index.get(expression)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            parsed = self._decode(expression, entry)
+            if parsed is None:
+                return None
+        self.stats['hits'] += 1
+        return parsed
+
+    def load_all(self):
+        """Decode every expression now rather than on first use.
+
+        The cyclic garbage collector is paused meanwhile.  ASTs hold no
+        reference cycles, and the collections triggered by allocating
+        their nodes would otherwise take most of the time.
+
+        """
+        import gc
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for expression, entry in self._index.items():
+                if expression not in self._decoded:
+                    self._decode(expression, entry)
+        finally:
+            if enabled:
+                gc.enable()
+        return len(self._decoded)
+
+    def _decode(self, expression, entry):
+        # Returns None, counting a miss, if the entry is corrupted.
+        offset, size = entry
+        try:
+            # Decoding is faster from bytes than from the memory map.
+            tree = decode(self._buffer[offset:offset + size], 0, size)
+        except CacheFormatError:
+            self.stats['misses'] += 1
+            return None
+        parsed = ParsedResult(expression, ast.share(tree))
+        self._decoded[expression] = parsed
+        self.stats['decoded'] += 1
+        return parsed
+
+    def __contains__(self, expression):
+        return expression in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = b''
+        self._index = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
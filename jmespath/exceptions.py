@@ -121,7 +121,7 @@ class JMESPathValueError(JMESPathError):
 
     def __str__(self):
         return ('In function %s(), invalid value: "%s", '
-                'expected: %s"%s"' % (
+                'expected: "%s"' % (
                     self.function_name, self.current_value,
                     self.expected_types))
 
@@ -139,3 +139,31 @@ class UndefinedVariable(JMESPathError):
     def __init__(self, varname):
         self.varname = varname
         super().__init__(f"Reference to undefined variable: {self.varname}")
+
+
+class CostBudgetExceededError(JMESPathError):
+    def __init__(self, expression, estimate, budget):
+        self.expression = expression
+        self.estimate = estimate
+        self.budget = budget
+        super().__init__(
+            "Expression %s has complexity %s and an estimated cost of %s, "
+            "which exceeds the budget of %s" % (
+                expression, estimate.complexity, estimate.cost, budget))
+
+
+class EvaluationLimitExceededError(JMESPathError):
+    def __init__(self, limit, value, stats):
+        #: The name of the ``Options`` limit that was exceeded.
+        self.limit = limit
+        self.value = value
+        #: Steps, elapsed time and elements built when evaluation stopped.
+        self.stats = stats
+        super().__init__(
+            "Evaluation exceeded %s=%s after %s steps, %.3fs and %s "
+            "elements" % (limit, value, stats['steps'], stats['elapsed'],
+                          stats['elements']))
+
+
+class JSONPatchError(JMESPathError):
+    pass
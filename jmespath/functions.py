@@ -1,8 +1,4 @@
 import math
-import json
-import inspect
-from pydoc import resolve
-
 from collections import OrderedDict
 
 from jmespath import exceptions
@@ -48,9 +44,17 @@ def signature(*arguments):
     return _record_signature
 
 
+class _LazyFunctionTable(object):
+    # Builds the FUNCTION_TABLE of a class the first time it is looked
+    # up, then replaces itself with it, so importing jmespath does not
+    # scan the methods of every Functions class.
+    def __get__(self, instance, owner):
+        return owner._populate_function_table()
+
+
 class FunctionRegistry(type):
     def __init__(cls, name, bases, attrs):
-        cls._populate_function_table()
+        cls.FUNCTION_TABLE = _LazyFunctionTable()
         super(FunctionRegistry, cls).__init__(name, bases, attrs)
 
     def _populate_function_table(cls):
@@ -68,6 +72,7 @@ class FunctionRegistry(type):
                     'signature': signature,
                 }
         cls.FUNCTION_TABLE = function_table
+        return function_table
 
 
 class Functions(metaclass=FunctionRegistry):
@@ -223,6 +228,7 @@ class Functions(metaclass=FunctionRegistry):
         if isinstance(arg, STRING_TYPE):
             return arg
         else:
+            import json
             return json.dumps(arg, separators=(',', ':'),
                               default=str)
 
@@ -546,15 +552,112 @@ class Functions(metaclass=FunctionRegistry):
     @signature({'types': ['array']}, {'types': ['expref']})
     def _func_group_by(self, array, expref):
         keyfunc = self._create_key_func(expref, ['null', 'string'], 'group_by')
-        if array:
-            result = OrderedDict()
-            keys = list(dict.fromkeys([keyfunc(item) for item in array if keyfunc(item) != None]))
-            for key in keys:
-                items = [ item for item in array if keyfunc(item) == key ]
-                result.update({key: items})
-            return result
-        else:
+        if not array:
             return None
+        # A single pass, which evaluates the key of each element once.
+        # Elements with a null key are dropped.
+        result = OrderedDict()
+        for item in array:
+            key = keyfunc(item)
+            if key is not None:
+                group = result.get(key)
+                if group is None:
+                    result[key] = [item]
+                else:
+                    group.append(item)
+        return result
+
+    @signature({'types': ['array']}, {'types': ['expref']})
+    def _func_count_by(self, array, expref):
+        # Like length() of each group of group_by(), without building
+        # the groups.
+        keyfunc = self._create_key_func(expref, ['null', 'string'],
+                                        'count_by')
+        if not array:
+            return None
+        result = OrderedDict()
+        for item in array:
+            key = keyfunc(item)
+            if key is not None:
+                result[key] = result.get(key, 0) + 1
+        return result
+
+    @signature({'types': ['array']}, {'types': ['expref']},
+               {'types': ['expref']})
+    def _func_sum_by(self, array, key_expref, value_expref):
+        # Like sum() of the values of each group of group_by().
+        sums, _ = self._aggregate_by(array, key_expref, value_expref,
+                                     'sum_by')
+        return sums
+
+    @signature({'types': ['array']}, {'types': ['expref']},
+               {'types': ['expref']})
+    def _func_avg_by(self, array, key_expref, value_expref):
+        # Like avg() of the values of each group of group_by().
+        sums, counts = self._aggregate_by(array, key_expref, value_expref,
+                                          'avg_by')
+        if sums is None:
+            return None
+        for key, count in counts.items():
+            sums[key] = sums[key] / float(count)
+        return sums
+
+    def _aggregate_by(self, array, key_expref, value_expref, function_name):
+        # Returns the sum and the number of the values of each key, in
+        # a single pass over ``array``, or None for an empty array.
+        keyfunc = self._create_key_func(key_expref, ['null', 'string'],
+                                        function_name)
+        valuefunc = self._create_key_func(value_expref, ['number'],
+                                          function_name)
+        if not array:
+            return None, None
+        sums = OrderedDict()
+        counts = {}
+        for item in array:
+            key = keyfunc(item)
+            if key is not None:
+                sums[key] = sums.get(key, 0) + valuefunc(item)
+                counts[key] = counts.get(key, 0) + 1
+        return sums, counts
+
+    @signature({'types': ['array']}, {'types': ['array']},
+               {'types': ['expref']}, {'types': ['expref']},
+               {'type': 'string', 'optional': True})
+    def _func_hash_join(self, left, right, left_expref, right_expref,
+                        mode='inner'):
+        # Pairs the elements of left and right whose keys are equal, as
+        # {left: ..., right: ...} objects in the order of left, then of
+        # right.  With the 'left' mode, elements of left matching nothing
+        # are kept, paired with null.  Null keys match nothing.
+        if mode not in ('inner', 'left'):
+            raise exceptions.JMESPathValueError(
+                'hash_join', mode, 'inner or left')
+        allowed_types = ['null', 'number', 'string']
+        left_key = self._create_key_func(left_expref, allowed_types,
+                                         'hash_join')
+        right_key = self._create_key_func(right_expref, allowed_types,
+                                          'hash_join')
+        # The pairs are objects of the dict class of the options, like
+        # those of multi-select hashes.
+        dict_cls = left_expref.interpreter.dict_cls
+        # Each key is evaluated once, rather than once per pair of
+        # elements as with a filter over right for each element of left.
+        table = {}
+        for item in right:
+            key = right_key(item)
+            if key is not None:
+                table.setdefault(key, []).append(item)
+        result = []
+        for item in left:
+            key = left_key(item)
+            matches = table.get(key) if key is not None else None
+            if matches:
+                for match in matches:
+                    result.append(dict_cls([('left', item),
+                                            ('right', match)]))
+            elif mode == 'left':
+                result.append(dict_cls([('left', item), ('right', None)]))
+        return result
 
     def _create_key_func(self, expref, allowed_types, function_name):
         def keyfunc(x):
@@ -1,15 +1,119 @@
-import string
 import warnings
-from json import loads
 
+from jmespath.ast import Record
 from jmespath.visitor import Options
 from jmespath.exceptions import LexerError, EmptyExpressionError
 
 
+# Tokens carry the index of their type in TOKEN_TYPES, so that the
+# parser can dispatch on them with lists instead of dicts and strings.
+TOKEN_TYPES = (
+    'eof',
+    'unquoted_identifier',
+    'quoted_identifier',
+    'literal',
+    'number',
+    'variable',
+    'root',
+    'current',
+    'dot',
+    'star',
+    'flatten',
+    'filter',
+    'lbracket',
+    'rbracket',
+    'lbrace',
+    'rbrace',
+    'lparen',
+    'rparen',
+    'comma',
+    'colon',
+    'question',
+    'pipe',
+    'or',
+    'and',
+    'not',
+    'expref',
+    'assign',
+    'eq',
+    'ne',
+    'lt',
+    'lte',
+    'gt',
+    'gte',
+    'plus',
+    'minus',
+    'multiply',
+    'divide',
+    'div',
+    'modulo',
+)
+KINDS = dict((name, kind) for kind, name in enumerate(TOKEN_TYPES))
+
+EOF = KINDS['eof']
+UNQUOTED_IDENTIFIER = KINDS['unquoted_identifier']
+QUOTED_IDENTIFIER = KINDS['quoted_identifier']
+LITERAL = KINDS['literal']
+NUMBER = KINDS['number']
+VARIABLE = KINDS['variable']
+ROOT = KINDS['root']
+CURRENT = KINDS['current']
+DOT = KINDS['dot']
+STAR = KINDS['star']
+FLATTEN = KINDS['flatten']
+FILTER = KINDS['filter']
+LBRACKET = KINDS['lbracket']
+RBRACKET = KINDS['rbracket']
+LBRACE = KINDS['lbrace']
+RBRACE = KINDS['rbrace']
+LPAREN = KINDS['lparen']
+RPAREN = KINDS['rparen']
+COMMA = KINDS['comma']
+COLON = KINDS['colon']
+QUESTION = KINDS['question']
+PIPE = KINDS['pipe']
+OR = KINDS['or']
+AND = KINDS['and']
+NOT = KINDS['not']
+EXPREF = KINDS['expref']
+ASSIGN = KINDS['assign']
+EQ = KINDS['eq']
+NE = KINDS['ne']
+LT = KINDS['lt']
+LTE = KINDS['lte']
+GT = KINDS['gt']
+GTE = KINDS['gte']
+PLUS = KINDS['plus']
+MINUS = KINDS['minus']
+MULTIPLY = KINDS['multiply']
+DIVIDE = KINDS['divide']
+DIV = KINDS['div']
+MODULO = KINDS['modulo']
+
+
+class Token(Record):
+    # Tokens used to be dicts with these four keys.
+    __slots__ = ('kind', 'value', 'start', 'end')
+    _KEYS = ('type', 'value', 'start', 'end')
+
+    def __init__(self, kind, value, start, end):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+
+    @property
+    def type(self):
+        return TOKEN_TYPES[self.kind]
+
+
 class Lexer(object):
-    START_IDENTIFIER = set(string.ascii_letters + '_')
-    VALID_IDENTIFIER = set(string.ascii_letters + string.digits + '_')
-    VALID_NUMBER = set(string.digits)
+    # Spelled out rather than taken from the string module, which
+    # imports re.
+    START_IDENTIFIER = set('abcdefghijklmnopqrstuvwxyz'
+                           'ABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+    VALID_NUMBER = set('0123456789')
+    VALID_IDENTIFIER = START_IDENTIFIER | VALID_NUMBER
     WHITESPACE = set(" \t\n\r")
     SIMPLE_TOKENS = {
         '.': 'dot',
@@ -29,185 +133,145 @@ class Lexer(object):
         u'\u00d7': 'multiply',
         u'\u00f7': 'divide',
     }
+    # Tokens of one or two characters: the single character is the
+    # first type, both characters together the second one.
+    PAIRED_TOKENS = {
+        '|': ('pipe', 'or'),
+        '&': ('expref', 'and'),
+        '<': ('lt', 'lte'),
+        '>': ('gt', 'gte'),
+        '!': ('not', 'ne'),
+        '=': ('assign', 'eq'),
+    }
+    DELIMITERS = {'`': '`', '"': '"', "'": "'"}
+    _SIMPLE_KINDS = dict((char, KINDS[name])
+                         for char, name in SIMPLE_TOKENS.items())
+    _PAIRED_KINDS = dict((char, (KINDS[single], KINDS[double]))
+                         for char, (single, double) in PAIRED_TOKENS.items())
+
+    # The whole expression is scanned by a single regex with one named
+    # group per kind of token.  It is compiled on first use so that
+    # importing jmespath does not import re.
+    _SCANNER = None
+    _SCANNER_PATTERN = (
+        r'(?P<identifier>[A-Za-z_][A-Za-z0-9_]*)'
+        r'|(?P<number>-?[0-9]+)'
+        r'|(?P<bracket>\[[\]?]?)'
+        r'|(?P<paired>\|\||&&|<=|>=|!=|==|[|&<>!=])'
+        r'|(?P<literal>`(?:\\[\s\S]|[^\\`])*`)'
+        r'|(?P<quoted_identifier>"(?:\\[\s\S]|[^\\"])*")'
+        r'|(?P<raw_string>\'(?:\\[\s\S]|[^\\\'])*\')'
+        r'|(?P<slash>//?)'
+        r'|(?P<minus>-)'
+        r'|(?P<variable>\$[A-Za-z_][A-Za-z0-9_]*)'
+        r'|(?P<root>\$)'
+    )
 
     def __init__(self):
         self._enable_legacy_literals = False
 
+    @classmethod
+    def _scanner(cls):
+        if cls._SCANNER is None:
+            import re
+            from json import loads
+            cls._loads = staticmethod(loads)
+            cls._SCANNER = re.compile(cls._SCANNER_PATTERN).match
+        return cls._SCANNER
+
     def tokenize(self, expression, options=None):
         if (options is not None):
             self._enable_legacy_literals= \
                 options.enable_legacy_literals
-
-        self._initialize_for_expression(expression)
-        while self._current is not None:
-            if self._current in self.SIMPLE_TOKENS:
-                yield {'type': self.SIMPLE_TOKENS[self._current],
-                       'value': self._current,
-                       'start': self._position, 'end': self._position + 1}
-                self._next()
-            elif self._current in self.START_IDENTIFIER:
-                start = self._position
-                buff = self._current
-                while self._next() in self.VALID_IDENTIFIER:
-                    buff += self._current
-                yield {'type': 'unquoted_identifier', 'value': buff,
-                       'start': start, 'end': start + len(buff)}
-            elif self._current in self.WHITESPACE:
-                self._next()
-            elif self._current == '[':
-                start = self._position
-                next_char = self._next()
-                if next_char == ']':
-                    self._next()
-                    yield {'type': 'flatten', 'value': '[]',
-                           'start': start, 'end': start + 2}
-                elif next_char == '?':
-                    self._next()
-                    yield {'type': 'filter', 'value': '[?',
-                           'start': start, 'end': start + 2}
-                else:
-                    yield {'type': 'lbracket', 'value': '[',
-                           'start': start, 'end': start + 1}
-            elif self._current == "'":
-                yield self._consume_raw_string_literal()
-            elif self._current == '|':
-                yield self._match_or_else('|', 'or', 'pipe')
-            elif self._current == '&':
-                yield self._match_or_else('&', 'and', 'expref')
-            elif self._current == '`':
-                yield self._consume_literal()
-            elif self._current in self.VALID_NUMBER:
-                start = self._position
-                buff = self._consume_number()
-                yield {'type': 'number', 'value': int(buff),
-                       'start': start, 'end': start + len(buff)}
-            elif self._current == '-':
-                if not self._peek_is_next_digit():
-                    self._next()
-                    yield {'type': 'minus', 'value': '-',
-                       'start': self._position - 1, 'end': self._position}
-                else:
-                    # Negative number.
-                    start = self._position
-                    buff = self._consume_number()
-                    if len(buff) > 1:
-                        yield {'type': 'number', 'value': int(buff),
-                            'start': start, 'end': start + len(buff)}
-                    else:
-                        raise LexerError(lexer_position=start,
-                                        lexer_value=buff,
-                                        message="Unknown token '%s'" % buff)
-            elif self._current == '/':
-                self._next()
-                if self._current == '/':
-                    self._next()
-                    yield {'type': 'div', 'value': '//',
-                        'start': self._position - 1, 'end': self._position}
-                else:
-                    yield {'type': 'divide', 'value': '/',
-                        'start': self._position, 'end': self._position + 1}
-            elif self._current == '"':
-                yield self._consume_quoted_identifier()
-            elif self._current == '<':
-                yield self._match_or_else('=', 'lte', 'lt')
-            elif self._current == '>':
-                yield self._match_or_else('=', 'gte', 'gt')
-            elif self._current == '!':
-                yield self._match_or_else('=', 'ne', 'not')
-            elif self._current == '=':
-                yield self._match_or_else('=', 'eq', 'assign')
-            elif self._current == '$':
-                if self._peek_may_be_valid_unquoted_identifier():
-                    yield self._consume_variable()
-                else:
-                    yield {'type': 'root',
-                           'value': self._current,
-                           'start': self._position, 'end': self._position + 1}
-                    self._next()
+        if not expression:
+            raise EmptyExpressionError()
+        self._expression = expression
+        self._length = length = len(expression)
+        scan = self._scanner()
+        simple_kinds = self._SIMPLE_KINDS
+        whitespace = self.WHITESPACE
+        position = 0
+        while position < length:
+            current = expression[position]
+            if current in simple_kinds:
+                # Single character tokens are the most common ones and
+                # need no regex.
+                yield Token(simple_kinds[current], current,
+                            position, position + 1)
+                position += 1
+                continue
+            elif current in whitespace:
+                position += 1
+                continue
+            match = scan(expression, position)
+            if match is None:
+                self._raise_unknown_token(position)
+            kind = match.lastgroup
+            value = match.group()
+            start = position
+            position = match.end()
+            if kind == 'identifier':
+                yield Token(UNQUOTED_IDENTIFIER, value, start, position)
+            elif kind == 'number':
+                yield Token(NUMBER, int(value), start, position)
+            elif kind == 'bracket':
+                yield Token(self._BRACKET_KINDS[value], value,
+                            start, position)
+            elif kind == 'paired':
+                yield self._paired_token(value, start)
+            elif kind == 'literal':
+                yield self._literal(value, start, position)
+            elif kind == 'quoted_identifier':
+                yield self._quoted_identifier(value, start, position)
+            elif kind == 'raw_string':
+                yield self._raw_string_literal(value, start, position)
+            elif kind == 'slash':
+                yield self._slash(value, position)
+            elif kind == 'minus':
+                # The position reported after a trailing minus sign is
+                # one character early.
+                after = self._last_position(position)
+                yield Token(MINUS, '-', after - 1, after)
+            elif kind == 'variable':
+                yield Token(VARIABLE, value, start, position)
             else:
-                raise LexerError(lexer_position=self._position,
-                                 lexer_value=self._current,
-                                 message="Unknown token %s" % self._current)
-        yield {'type': 'eof', 'value': '',
-               'start': self._length, 'end': self._length}
-
-    def _consume_number(self):
-        start = self._position
-        buff = self._current
-        while self._next() in self.VALID_NUMBER:
-            buff += self._current
-        return buff
+                yield Token(ROOT, value, start, position)
+        yield Token(EOF, '', length, length)
 
-    def _consume_variable(self):
-        start = self._position
-        buff = self._current
-        self._next()
-        if self._current not in self.START_IDENTIFIER:
-            raise LexerError(
-                lexer_position=start,
-                lexer_value=self._current,
-                message='Invalid variable starting character %s' % self._current)
-        buff += self._current
-        while self._next() in self.VALID_IDENTIFIER:
-            buff += self._current
-        return {'type': 'variable', 'value': buff,
-                'start': start, 'end': start + len(buff)}
+    _BRACKET_KINDS = {'[': LBRACKET, '[]': FLATTEN, '[?': FILTER}
 
-    def _peek_may_be_valid_unquoted_identifier(self):
-        if (self._position == self._length - 1):
-            return False
-        else:
-            next = self._chars[self._position + 1]
-            return next in self.START_IDENTIFIER
+    # The positions of some tokens below mirror those of the
+    # character by character scanner this one replaced, which never
+    # moved past the last character of the expression.
 
-    def _peek_is_next_digit(self):
-        if (self._position == self._length - 1):
-            return False
-        else:
-            next = self._chars[self._position + 1]
-            return next in self.VALID_NUMBER
+    def _last_position(self, position):
+        return min(position, self._length - 1)
 
-    def _initialize_for_expression(self, expression):
-        if not expression:
-            raise EmptyExpressionError()
-        self._position = 0
-        self._expression = expression
-        self._chars = list(self._expression)
-        self._current = self._chars[self._position]
-        self._length = len(self._expression)
+    def _paired_token(self, value, start):
+        single, double = self._PAIRED_KINDS[value[0]]
+        if len(value) == 2:
+            return Token(double, value, start, start + 1)
+        return Token(single, value, start, start)
 
-    def _next(self):
-        if self._position == self._length - 1:
-            self._current = None
-        else:
-            self._position += 1
-            self._current = self._chars[self._position]
-        return self._current
+    def _slash(self, value, position):
+        after = self._last_position(position)
+        if value == '//':
+            return Token(DIV, '//', after - 1, after)
+        return Token(DIVIDE, '/', after, after + 1)
 
-    def _consume_until(self, delimiter):
-        # Consume until the delimiter is reached,
-        # allowing for the delimiter to be escaped with "\".
-        start = self._position
-        buff = ''
-        self._next()
-        while self._current != delimiter:
-            if self._current == '\\':
-                buff += '\\'
-                self._next()
-            if self._current is None:
-                # We're at the EOF.
-                raise LexerError(lexer_position=start,
-                                 lexer_value=self._expression[start:],
-                                 message="Unclosed %s delimiter" % delimiter)
-            buff += self._current
-            self._next()
-        # Skip the closing delimiter.
-        self._next()
-        return buff
+    def _raise_unknown_token(self, position):
+        current = self._expression[position]
+        if current in self.DELIMITERS:
+            raise LexerError(lexer_position=position,
+                             lexer_value=self._expression[position:],
+                             message="Unclosed %s delimiter" % current)
+        raise LexerError(lexer_position=position,
+                         lexer_value=current,
+                         message="Unknown token %s" % current)
 
-    def _consume_literal(self):
-        start = self._position
-        token = self._consume_until('`')
+    def _literal(self, value, start, position):
+        loads = self._loads
+        token = value[1:-1]
         lexeme = token.replace('\\`', '`')
         parsed_json = None
         try:
@@ -220,7 +284,6 @@ class Lexer(object):
 
             if not self._enable_legacy_literals:
                 raise error
-                return
 
             try:
                 # Invalid JSON values should be converted to quoted
@@ -231,40 +294,23 @@ class Lexer(object):
             except ValueError:
                 raise error
 
-        token_len = self._position - start
-        return {'type': 'literal', 'value': parsed_json,
-                'start': start, 'end': token_len}
+        return Token(LITERAL, parsed_json, start,
+                     self._last_position(position) - start)
 
-    def _consume_quoted_identifier(self):
-        start = self._position
-        lexeme = '"' + self._consume_until('"') + '"'
+    def _quoted_identifier(self, lexeme, start, position):
+        loads = self._loads
         try:
-            token_len = self._position - start
-            return {'type': 'quoted_identifier', 'value': loads(lexeme),
-                    'start': start, 'end': token_len}
+            return Token(QUOTED_IDENTIFIER, loads(lexeme), start,
+                         self._last_position(position) - start)
         except ValueError as e:
             error_message = str(e).split(':')[0]
             raise LexerError(lexer_position=start,
                              lexer_value=lexeme,
                              message=error_message)
 
-    def _consume_raw_string_literal(self):
-        start = self._position
-        lexeme = self._consume_until("'") \
+    def _raw_string_literal(self, value, start, position):
+        lexeme = value[1:-1] \
             .replace("\\'", "'")  \
             .replace("\\\\", "\\")
-
-        token_len = self._position - start
-        return {'type': 'literal', 'value': lexeme,
-                'start': start, 'end': token_len}
-
-    def _match_or_else(self, expected, match_type, else_type):
-        start = self._position
-        current = self._current
-        next_char = self._next()
-        if next_char == expected:
-            self._next()
-            return {'type': match_type, 'value': current + next_char,
-                    'start': start, 'end': start + 1}
-        return {'type': else_type, 'value': current,
-                'start': start, 'end': start}
+        return Token(LITERAL, lexeme, start,
+                     self._last_position(position) - start)
@@ -0,0 +1,429 @@
+"""Incremental re-evaluation of expressions under JSON Patch updates.
+
+A ``MaterializedExpression`` holds a compiled expression, the document
+it is evaluated against and the last result.  Documents are updated
+with RFC 6902 JSON Patch operations, and the result is brought up to
+date doing as little work as possible:
+
+* The paths an expression reads are computed statically.  Patches that
+  don't touch any of them leave the result untouched.
+* If the expression is a projection or a filter projection over a
+  fixed path (``foo.bar[*].baz``, ``items[?price > `10`].name``), the
+  result of every element is remembered and only the elements touched
+  by a patch are evaluated again.
+* Anything else is evaluated again from scratch.
+
+Usage::
+
+    view = MaterializedExpression('orders[?total > `100`].id', document)
+    view.apply_patch([
+        {'op': 'replace', 'path': '/orders/42/total', 'value': 250},
+    ])
+    view.result
+
+"""
+import copy
+
+from jmespath import exceptions
+from jmespath import parser
+from jmespath.visitor import IterativeVisitor, TreeInterpreter
+
+
+# Matches any key or index when comparing paths.
+_ANY = object()
+# First component of a path relative to the document root rather
+# than to the current node.
+_ROOT = object()
+
+
+def _join(prefix, path):
+    if path and path[0] is _ROOT:
+        return path
+    return prefix + path
+
+
+def _is_rooted(path):
+    return bool(path) and path[0] is _ROOT
+
+
+class ReadPathsVisitor(IterativeVisitor):
+    """Compute the document paths an expression depends on.
+
+    Each path is a tuple of keys and indices.  An expression depends on
+    the whole value found at each of its paths, and on the containers
+    leading to it.  Paths are relative to the current node unless they
+    start with the document root.  The visit methods of nodes with
+    children are generators, see ``IterativeVisitor``.
+
+    """
+    def visit_field(self, node):
+        return [(node.value,)]
+
+    def visit_current(self, node):
+        return [()]
+
+    visit_identity = visit_current
+    visit_index = visit_current
+    visit_slice = visit_current
+
+    def visit_root(self, node):
+        return [(_ROOT,)]
+
+    def visit_literal(self, node):
+        return []
+
+    def visit_variable_ref(self, node):
+        # Whatever a variable holds was computed by its assign
+        # expression, whose paths are already accounted for.
+        return []
+
+    def visit_expref(self, node):
+        # Expression references are evaluated against values that
+        # functions take from their other arguments, so only the paths
+        # relative to the root add anything.
+        paths = yield node.children[0]
+        return [path for path in paths if _is_rooted(path)]
+
+    def visit_subexpression(self, node):
+        prefix = ()
+        paths = []
+        for child in node.children:
+            if prefix is None:
+                # The value is derived from paths we already have.
+                child_paths = yield child
+                paths.extend(path for path in child_paths
+                             if _is_rooted(path))
+                continue
+            static = static_path(child)
+            if static is not None:
+                prefix = _join(prefix, static)
+            else:
+                child_paths = yield child
+                paths.extend(_join(prefix, path) for path in child_paths)
+                prefix = None
+        if prefix is not None:
+            paths.append(prefix)
+        return paths
+
+    visit_index_expression = visit_subexpression
+    visit_pipe = visit_subexpression
+
+    def visit_projection(self, node):
+        left = node.children[0]
+        element_paths = []
+        for child in node.children[1:]:
+            element_paths.extend((yield child))
+        prefix = static_path(left)
+        if prefix is None:
+            return (yield left) + [
+                path for path in element_paths if _is_rooted(path)]
+        if not element_paths:
+            element_paths = [()]
+        return [_join(prefix + (_ANY,), path) for path in element_paths]
+
+    visit_value_projection = visit_projection
+    visit_filter_projection = visit_projection
+
+    def default_visit(self, node):
+        paths = []
+        for child in node.children:
+            paths.extend((yield child))
+        return paths
+
+
+def static_path(node):
+    """Return the path selected by ``node``, or None.
+
+    Only chains of fields and non negative indices select a single,
+    statically known path.
+
+    """
+    node_type = node.type
+    if node_type == 'field':
+        return (node.value,)
+    elif node_type in ('current', 'identity'):
+        return ()
+    elif node_type == 'root':
+        return (_ROOT,)
+    elif node_type == 'index':
+        if node.value < 0:
+            return None
+        return (node.value,)
+    elif node_type in ('subexpression', 'index_expression'):
+        path = ()
+        for child in node.children:
+            child_path = static_path(child)
+            if child_path is None:
+                return None
+            path = _join(path, child_path)
+        return path
+    return None
+
+
+def read_paths(node):
+    """Return the document paths an AST depends on."""
+    return [path[1:] if _is_rooted(path) else path
+            for path in ReadPathsVisitor().visit(node)]
+
+
+def _intersects(read, touched):
+    for expected, actual in zip(read, touched):
+        if expected is _ANY or actual is _ANY:
+            continue
+        if isinstance(expected, int) and not isinstance(expected, bool):
+            expected = str(expected)
+        if expected != actual:
+            return False
+    return True
+
+
+def parse_pointer(pointer):
+    """Parse an RFC 6901 JSON pointer into a tuple of tokens."""
+    if pointer == '':
+        return ()
+    if not pointer.startswith('/'):
+        raise exceptions.JSONPatchError(
+            "Invalid JSON pointer: '%s'" % pointer)
+    return tuple(token.replace('~1', '/').replace('~0', '~')
+                 for token in pointer[1:].split('/'))
+
+
+def _list_index(container, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise exceptions.JSONPatchError("Invalid array index: '%s'" % token)
+    index = int(token)
+    limit = len(container) + 1 if allow_end else len(container)
+    if index >= limit:
+        raise exceptions.JSONPatchError("Array index out of range: %s" % index)
+    return index
+
+
+def _resolve(document, path):
+    current = document
+    for token in path:
+        if isinstance(current, list):
+            current = current[_list_index(current, token)]
+        elif isinstance(current, dict):
+            if token not in current:
+                raise exceptions.JSONPatchError("Path not found: '%s'" % token)
+            current = current[token]
+        else:
+            raise exceptions.JSONPatchError("Path not found: '%s'" % token)
+    return current
+
+
+def _add(document, path, value):
+    if not path:
+        return value
+    parent = _resolve(document, path[:-1])
+    if isinstance(parent, list):
+        parent.insert(_list_index(parent, path[-1], allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[path[-1]] = value
+    else:
+        raise exceptions.JSONPatchError("Cannot add to a scalar value")
+    return document
+
+
+def _remove(document, path):
+    if not path:
+        raise exceptions.JSONPatchError("Cannot remove the document root")
+    parent = _resolve(document, path[:-1])
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, path[-1]))
+    elif isinstance(parent, dict) and path[-1] in parent:
+        return parent.pop(path[-1])
+    raise exceptions.JSONPatchError("Path not found: '%s'" % path[-1])
+
+
+def apply_operation(document, operation):
+    """Apply a single JSON Patch operation.
+
+    Returns the patched document, along with the list of primitive
+    ``(op, path)`` changes that were made, in order.  The document
+    is modified in place unless its root is replaced.
+
+    """
+    try:
+        op = operation['op']
+        path = parse_pointer(operation['path'])
+    except KeyError as e:
+        raise exceptions.JSONPatchError("Missing member: %s" % e)
+    if op == 'add':
+        return _add(document, path, operation['value']), [('add', path)]
+    elif op == 'remove':
+        _remove(document, path)
+        return document, [('remove', path)]
+    elif op == 'replace':
+        if not path:
+            return operation['value'], [('replace', path)]
+        parent = _resolve(document, path[:-1])
+        if isinstance(parent, list):
+            parent[_list_index(parent, path[-1])] = operation['value']
+        elif isinstance(parent, dict) and path[-1] in parent:
+            parent[path[-1]] = operation['value']
+        else:
+            raise exceptions.JSONPatchError("Path not found: '%s'" % path[-1])
+        return document, [('replace', path)]
+    elif op == 'move':
+        source = parse_pointer(operation['from'])
+        if path[:len(source)] == source and path != source:
+            raise exceptions.JSONPatchError(
+                "Cannot move a value into one of its children")
+        value = _resolve(document, source)
+        if not source:
+            return value, [('replace', path)]
+        _remove(document, source)
+        document = _add(document, path, value)
+        return document, [('remove', source), ('add', path)]
+    elif op == 'copy':
+        value = copy.deepcopy(
+            _resolve(document, parse_pointer(operation['from'])))
+        return _add(document, path, value), [('add', path)]
+    elif op == 'test':
+        if _resolve(document, path) != operation['value']:
+            raise exceptions.JSONPatchError(
+                "Test failed for path: '%s'" % operation['path'])
+        return document, []
+    raise exceptions.JSONPatchError("Unknown operation: '%s'" % op)
+
+
+class _ProjectionState(object):
+    """Remembers the result of each element of a projection."""
+    def __init__(self, node, base_path):
+        self.base_path = base_path
+        self._is_filter = node.type == 'filter_projection'
+        self._right = node.children[1]
+        if self._is_filter:
+            self._condition = node.children[2]
+        self._elements = []
+
+    def evaluate(self, interpreter, base):
+        self._elements = [self._evaluate_element(interpreter, element)
+                          for element in base]
+
+    def update(self, interpreter, document, op, path):
+        """Update the elements affected by a change at ``path``.
+
+        Returns the number of elements evaluated again, or None if
+        the change can't be applied incrementally.
+
+        """
+        depth = len(self.base_path)
+        if len(path) <= depth or path[:depth] != self.base_path:
+            return None
+        base = _resolve(document, self.base_path)
+        if not isinstance(base, list):
+            return None
+        token = path[depth]
+        if len(path) == depth + 1 and op == 'add':
+            index = len(base) - 1 if token == '-' else int(token)
+            self._elements.insert(
+                index, self._evaluate_element(interpreter, base[index]))
+        elif len(path) == depth + 1 and op == 'remove':
+            del self._elements[int(token)]
+            return 0
+        else:
+            index = int(token)
+            self._elements[index] = self._evaluate_element(
+                interpreter, base[index])
+        return 1
+
+    def result(self):
+        return [value for value in self._elements if value is not None]
+
+    def _evaluate_element(self, interpreter, element):
+        if self._is_filter:
+            matched = interpreter.evaluate(self._condition, element)
+            if interpreter._is_false(matched):
+                return None
+        return interpreter.evaluate(self._right, element)
+
+
+class MaterializedExpression(object):
+    def __init__(self, expression, document, options=None):
+        if isinstance(expression, parser.ParsedResult):
+            self.parsed = expression
+        else:
+            self.parsed = parser.Parser().parse(expression, options)
+        self.document = document
+        self.options = options
+        self.result = None
+        #: Counters describing how patches were handled.
+        self.stats = {'full': 0, 'partial': 0, 'skipped': 0, 'elements': 0}
+        self._read_paths = read_paths(self.parsed.parsed)
+        self._projection = self._plan_projection(self.parsed.parsed)
+        self._evaluate()
+
+    def apply_patch(self, operations):
+        """Apply a list of JSON Patch operations and update the result.
+
+        Operations are applied in order.  If one of them fails, the
+        operations before it stay applied, the result is evaluated
+        again and the error is raised.
+
+        """
+        interpreter = TreeInterpreter(self.options)
+        full = False
+        touched = 0
+        try:
+            for operation in operations:
+                self.document, changes = apply_operation(
+                    self.document, operation)
+                for op, path in changes:
+                    if full or not self._is_affected_by(path):
+                        continue
+                    count = None
+                    if self._projection is not None:
+                        count = self._projection.update(
+                            interpreter, self.document, op, path)
+                    if count is None:
+                        full = True
+                    else:
+                        touched += 1
+                        self.stats['elements'] += count
+        except Exception:
+            self._evaluate()
+            raise
+        if full:
+            self._evaluate()
+        elif touched:
+            self.stats['partial'] += 1
+            self.result = self._projection.result()
+        else:
+            self.stats['skipped'] += 1
+        return self.result
+
+    def _is_affected_by(self, path):
+        return any(_intersects(read, path) for read in self._read_paths)
+
+    def _plan_projection(self, node):
+        if node.type not in ('projection', 'filter_projection'):
+            return None
+        base_path = static_path(node.children[0])
+        if base_path is None or _is_rooted(base_path):
+            return None
+        for path in base_path:
+            if not isinstance(path, str):
+                return None
+        for child in node.children[1:]:
+            if any(_is_rooted(path)
+                   for path in ReadPathsVisitor().visit(child)):
+                return None
+        return _ProjectionState(node, base_path)
+
+    def _evaluate(self):
+        self.stats['full'] += 1
+        if self._projection is not None:
+            try:
+                base = _resolve(self.document, self._projection.base_path)
+            except exceptions.JSONPatchError:
+                base = None
+            if isinstance(base, list):
+                interpreter = TreeInterpreter(self.options)
+                self._projection.evaluate(interpreter, base)
+                self.result = self._projection.result()
+                return
+        self.result = self.parsed.search(self.document, self.options)
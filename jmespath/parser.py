@@ -12,9 +12,14 @@ general idea behind a Pratt parser:
 
 A few notes on the implementation.
 
-* All the nud/led tokens are on the Parser class itself, and are dispatched
-  using getattr().  This keeps all the parsing logic contained to a single
-  class.
+* All the nud/led tokens are on the Parser class itself.  This keeps all the
+  parsing logic contained to a single class.  Tokens carry an integer kind,
+  and the nud/led methods and binding powers are looked up by kind in lists
+  built once per class, rather than with getattr() on every token.
+* The nud/led methods that parse an operand are generators, which yield the
+  binding power of the operand and are sent its node.  They are run on an
+  explicit stack rather than by recursion, so deeply nested expressions do
+  not hit the recursion limit.
 * We use two passes through the data.  One to create a list of token,
   then one pass through the tokens to create the AST.  While the lexer actually
   yields tokens, we convert it to a list so we can easily implement two tokens
@@ -25,14 +30,47 @@ A few notes on the implementation.
   consuming from the token iterator one token at a time.
 
 """
-import random
-
+from types import GeneratorType
 
 from jmespath import lexer
 from jmespath.compat import with_repr_method
 from jmespath import ast
 from jmespath import exceptions
+from jmespath import scope
+from jmespath import unparser
 from jmespath import visitor
+from jmespath.lexer import (
+    TOKEN_TYPES, EOF, UNQUOTED_IDENTIFIER, QUOTED_IDENTIFIER, NUMBER,
+    VARIABLE, STAR, FLATTEN, FILTER, LBRACKET, RBRACKET, LBRACE, RBRACE,
+    LPAREN, RPAREN, COMMA, COLON, DOT, ASSIGN, LITERAL, EQ, NE, LT, LTE,
+    GT, GTE, CURRENT, ROOT, Token,
+)
+
+
+# Tokens that may follow a '[' in an index expression.
+_INDEX_START = frozenset([NUMBER, COLON])
+# Tokens that may start the expression after a '.', other than '[' and '{'.
+_DOT_EXPRESSION_START = frozenset([QUOTED_IDENTIFIER, UNQUOTED_IDENTIFIER,
+                                   STAR])
+# The tokens of the keys of a multi-select hash.
+_IDENTIFIERS = (QUOTED_IDENTIFIER, UNQUOTED_IDENTIFIER)
+# The tokens next to the literals that are compiled as parameters.
+_COMPARATORS = frozenset([EQ, NE, LT, LTE, GT, GTE])
+# The left associative arithmetic operators, whose chains are a single
+# node.  Chains of multiplications are parsed by _token_led_star().
+_ARITHMETIC_CHAINS = frozenset(['plus', 'minus', 'divide', 'div', 'modulo'])
+# The tokens whose nud is a node, when they do not start a let expression.
+_OPERANDS = frozenset([UNQUOTED_IDENTIFIER, QUOTED_IDENTIFIER, LITERAL,
+                       VARIABLE, CURRENT, ROOT])
+
+
+def _options_key(options):
+    # The options that change what an expression compiles to.  They are
+    # part of the key of compiled expressions in _CACHE.
+    if options is None:
+        return (False, False)
+    return (bool(options.enable_legacy_literals),
+            bool(options.auto_parameterize))
 
 
 class Parser(object):
@@ -82,9 +120,18 @@ class Parser(object):
     # a projection.
     _PROJECTION_STOP = 10
     # The _MAX_SIZE most recent expressions are cached in
-    # _CACHE dict.
+    # _CACHE dict, by expression and the options that change what it
+    # compiles to.
     _CACHE = {}
     _MAX_SIZE = 128
+    # The expressions parsed into _CACHE, by canonical form: the
+    # ParsedResult whose AST their spellings share, and these spellings.
+    _CANONICAL = {}
+    # The ASTs shared by auto parameterized expressions, by their tokens
+    # with parameters instead of the literals compared, and how often
+    # they were looked up.
+    _TEMPLATES = {}
+    _TEMPLATE_STATS = {'hits': 0, 'misses': 0}
 
     def __init__(self, lookahead=2):
         self.tokenizer = None
@@ -93,18 +140,36 @@ class Parser(object):
         self._index = 0
 
     def parse(self, expression, options=None):
-        cached = self._CACHE.get(expression)
-        if cached is not None:
-            return cached
-        parsed_result = self._do_parse(expression, options)
-        self._CACHE[expression] = parsed_result
-        if len(self._CACHE) > self._MAX_SIZE:
-            self._free_cache_entries()
+        key = (expression, _options_key(options))
+        parsed_result = self._CACHE.get(key)
+        if parsed_result is None:
+            if options is not None and options.auto_parameterize:
+                # Compiled caches hold plain ASTs, never templates.
+                parsed_result = self._do_parse(
+                    expression, options, self._parse_parameterized)
+            else:
+                if options is not None and \
+                        options.compiled_cache is not None:
+                    parsed_result = options.compiled_cache.get(expression,
+                                                               options)
+                if parsed_result is None:
+                    parsed_result = self._do_parse(expression, options)
+            if not isinstance(parsed_result, ParameterizedResult):
+                parsed_result = self._canonicalize(parsed_result)
+            self._CACHE[key] = parsed_result
+            if len(self._CACHE) > self._MAX_SIZE:
+                self._free_cache_entries()
+        if options is not None and (options.max_cost is not None or
+                                    options.max_complexity is not None):
+            from jmespath import cost
+            cost.check_budget(parsed_result, options)
         return parsed_result
 
-    def _do_parse(self, expression, options=None):
+    def _do_parse(self, expression, options=None, parse=None):
+        if parse is None:
+            parse = self._parse
         try:
-            return self._parse(expression, options)
+            return parse(expression, options)
         except exceptions.LexerError as e:
             e.expression = expression
             raise
@@ -117,88 +182,199 @@ class Parser(object):
 
     def _parse(self, expression, options=None):
         self.tokenizer = lexer.Lexer().tokenize(expression, options)
-        self._tokens = list(self.tokenizer)
+        return self._parse_tokens(expression, list(self.tokenizer))
+
+    def _parse_parameterized(self, expression, options):
+        # The literals compared are replaced by variables named #0, #1,
+        # and so on, which no expression can refer to, and bound to
+        # their values when searching.
+        tokens = list(lexer.Lexer().tokenize(expression, options))
+        parameters = {}
+        key = []
+        last = len(tokens) - 1
+        for i, token in enumerate(tokens):
+            kind = token.kind
+            if kind != LITERAL:
+                key.append(kind)
+                key.append(token.value)
+            elif (i > 0 and tokens[i - 1].kind in _COMPARATORS or
+                    i < last and tokens[i + 1].kind in _COMPARATORS):
+                name = '#%d' % len(parameters)
+                parameters[name] = token.value
+                tokens[i] = Token(VARIABLE, '$' + name, token.start,
+                                  token.end)
+                key.append(VARIABLE)
+                key.append(name)
+            else:
+                # Literal values may be lists or dicts.
+                key.append(kind)
+                key.append(unparser.literal(token.value))
+        if not parameters:
+            return self._parse_tokens(expression, tokens)
+        key = tuple(key)
+        template = self._TEMPLATES.get(key)
+        if template is None:
+            self._TEMPLATE_STATS['misses'] += 1
+            template = self._parse_tokens(expression, tokens)
+            self._TEMPLATES[key] = template
+            if len(self._TEMPLATES) > self._MAX_SIZE:
+                self._free_cache_entries(self._TEMPLATES)
+        else:
+            self._TEMPLATE_STATS['hits'] += 1
+        return ParameterizedResult(expression, template, parameters)
+
+    def _parse_tokens(self, expression, tokens):
+        self._tokens = tokens
         self._index = 0
-        parsed = self._expression(binding_power=0)
-        if not self._current_token() == 'eof':
+        # The slots of the variables bound by each enclosing let
+        # expression, innermost last.
+        self._scopes = []
+        parsed = self._parse_expression(0)
+        if not self._current_kind() == EOF:
             t = self._lookahead_token(0)
-            raise exceptions.ParseError(t['start'], t['value'], t['type'],
-                                        "Unexpected token: %s" % t['value'])
-        return ParsedResult(expression, parsed)
+            raise exceptions.ParseError(t.start, t.value, t.type,
+                                        "Unexpected token: %s" % t.value)
+        return ParsedResult(expression, ast.share(parsed))
+
+    @classmethod
+    def _build_dispatch_tables(cls):
+        # The nud and led functions and the binding power of each token
+        # kind.  The functions are unbound, so they are called with the
+        # parser as their first argument.
+        cls._NUD = [getattr(cls, '_token_nud_%s' % token_type,
+                            cls._error_nud_token)
+                    for token_type in TOKEN_TYPES]
+        cls._LED = [getattr(cls, '_token_led_%s' % token_type, None)
+                    for token_type in TOKEN_TYPES]
+        cls._BINDING_POWERS = [cls.BINDING_POWER.get(token_type, 0)
+                               for token_type in TOKEN_TYPES]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._build_dispatch_tables()
+
+    def _parse_expression(self, binding_power):
+        # Runs the generators of _expression() on an explicit stack.  A
+        # generator parsing an operand yields its binding power and is
+        # sent the node parsed, so the nesting of an expression is only
+        # limited by memory.  Operands made of a single token are parsed
+        # right away.
+        tokens = self._tokens
+        binding_powers = self._BINDING_POWERS
+        nud = self._NUD
+        stack = []
+        generator = self._expression(binding_power)
+        node = None
+        while True:
+            try:
+                binding_power = generator.send(node)
+            except StopIteration as e:
+                if not stack:
+                    return e.value
+                node = e.value
+                generator = stack.pop()
+                continue
+            token = tokens[self._index]
+            if token.kind in _OPERANDS:
+                following = tokens[self._index + 1].kind
+                if binding_powers[following] <= binding_power and \
+                        following != VARIABLE:
+                    self._index += 1
+                    node = nud[token.kind](self, token)
+                    continue
+            stack.append(generator)
+            generator = self._expression(binding_power)
+            node = None
 
     def _expression(self, binding_power=0):
-        left_token = self._lookahead_token(0)
-        self._advance()
-        nud_function = getattr(
-            self, '_token_nud_%s' % left_token['type'],
-            self._error_nud_token)
-        left = nud_function(left_token)
-        current_token = self._current_token()
-        while binding_power < self.BINDING_POWER[current_token]:
-            led = getattr(self, '_token_led_%s' % current_token, None)
+        left_token = self._tokens[self._index]
+        self._index += 1
+        left = self._NUD[left_token.kind](self, left_token)
+        if type(left) is GeneratorType:
+            left = yield from left
+        return (yield from self._parse_leds(left, binding_power))
+
+    def _parse_leds(self, left, binding_power):
+        tokens = self._tokens
+        binding_powers = self._BINDING_POWERS
+        kind = tokens[self._index].kind
+        while binding_power < binding_powers[kind]:
+            led = self._LED[kind]
             if led is None:
-                error_token = self._lookahead_token(0)
-                self._error_led_token(error_token)
-            else:
-                self._advance()
-                left = led(left)
-                current_token = self._current_token()
+                self._error_led_token(tokens[self._index])
+            self._index += 1
+            left = led(self, left)
+            if type(left) is GeneratorType:
+                left = yield from left
+            kind = tokens[self._index].kind
         return left
 
     def _token_nud_literal(self, token):
-        return ast.literal(token['value'])
+        return ast.literal(token.value)
 
     def _token_nud_variable(self, token):
-        return ast.variable_ref(token['value'][1:])
+        name = token.value[1:]
+        scopes = self._scopes
+        for depth in range(len(scopes)):
+            slot = scopes[-1 - depth].get(name)
+            if slot is not None:
+                return ast.variable_ref(name, depth, slot)
+        return ast.variable_ref(name)
 
     def _token_nud_unquoted_identifier(self, token):
-        if token['value'] == 'let' and \
-                self._current_token() == 'variable':
+        if token.value == 'let' and \
+                self._current_kind() == VARIABLE:
             return self._parse_let_expression()
         else:
-            return ast.field(token['value'])
+            return ast.field(token.value)
 
     def _parse_let_expression(self):
         bindings = []
         while True:
             var_token = self._lookahead_token(0)
             # Strip off the '$'.
-            varname = var_token['value'][1:]
+            varname = var_token.value[1:]
             self._advance()
-            self._match('assign')
-            assign_expr = self._expression()
+            self._match(ASSIGN)
+            assign_expr = yield 0
             bindings.append(ast.assign(varname, assign_expr))
             if self._is_in_keyword(self._lookahead_token(0)):
                 self._advance()
                 break
             else:
-                self._match('comma')
-        expr = self._expression()
+                self._match(COMMA)
+        # The bindings are only visible in the body.  A name bound twice
+        # refers to its last binding.
+        self._scopes.append(dict((assign.value, slot)
+                                 for slot, assign in enumerate(bindings)))
+        expr = yield 0
+        self._scopes.pop()
         return ast.let_expression(bindings, expr)
 
     def _is_in_keyword(self, token):
         return (
-            token['type'] == 'unquoted_identifier' and
-            token['value'] == 'in'
+            token.kind == UNQUOTED_IDENTIFIER and
+            token.value == 'in'
         )
 
     def _token_nud_quoted_identifier(self, token):
-        field = ast.field(token['value'])
+        field = ast.field(token.value)
         # You can't have a quoted identifier as a function
         # name.
-        if self._current_token() == 'lparen':
+        if self._current_kind() == LPAREN:
             t = self._lookahead_token(0)
             raise exceptions.ParseError(
-                0, t['value'], t['type'],
+                0, t.value, t.type,
                 'Quoted identifier not allowed for function names.')
         return field
 
     def _token_nud_star(self, token):
         left = ast.identity()
-        if self._current_token() == 'rbracket':
+        if self._current_kind() == RBRACKET:
             right = ast.identity()
         else:
-            right = self._parse_projection_rhs(self.BINDING_POWER['star'])
+            right = yield from self._parse_projection_rhs(
+                self.BINDING_POWER['star'])
         return ast.value_projection(left, right)
 
     def _token_nud_filter(self, token):
@@ -208,8 +384,18 @@ class Parser(object):
         return self._parse_multi_select_hash()
 
     def _token_nud_lparen(self, token):
-        expression = self._expression()
-        self._match('rparen')
+        # Parentheses add no node to the AST, so a run of them, as in
+        # generated expressions, is parsed by a single generator.
+        tokens = self._tokens
+        opened = 0
+        while tokens[self._index].kind == LPAREN:
+            self._index += 1
+            opened += 1
+        expression = yield 0
+        self._match(RPAREN)
+        for _ in range(opened):
+            expression = yield from self._parse_leds(expression, 0)
+            self._match(RPAREN)
         return expression
 
     def _token_nud_minus(self, token):
@@ -220,28 +406,27 @@ class Parser(object):
 
     def _token_nud_flatten(self, token):
         left = ast.flatten(ast.identity())
-        right = self._parse_projection_rhs(
+        right = yield from self._parse_projection_rhs(
             self.BINDING_POWER['flatten'])
         return ast.projection(left, right)
 
     def _token_nud_not(self, token):
-        expr = self._expression(self.BINDING_POWER['not'])
+        expr = yield self.BINDING_POWER['not']
         return ast.not_expression(expr)
 
     def _token_nud_lbracket(self, token):
-        if self._current_token() in ['number', 'colon']:
+        if self._current_kind() in _INDEX_START:
             right = self._parse_index_expression()
             # We could optimize this and remove the identity() node.
             # We don't really need an index_expression node, we can
             # just use emit an index node here if we're not dealing
             # with a slice.
             return self._project_if_slice(ast.identity(), right)
-        elif self._current_token() == 'star' and \
-                self._lookahead(1) == 'rbracket':
+        elif self._current_kind() == STAR and \
+                self._lookahead(1) == RBRACKET:
             self._advance()
             self._advance()
-            right = self._parse_projection_rhs(self.BINDING_POWER['star'])
-            return ast.projection(ast.identity(), right)
+            return self._parse_projection(ast.identity())
         else:
             return self._parse_multi_select_list()
 
@@ -250,14 +435,14 @@ class Parser(object):
         # [<current>
         #  ^
         #  | current token
-        if (self._lookahead(0) == 'colon' or
-                self._lookahead(1) == 'colon'):
+        if (self._lookahead(0) == COLON or
+                self._lookahead(1) == COLON):
             return self._parse_slice_expression()
         else:
             # Parse the syntax [number]
-            node = ast.index(self._lookahead_token(0)['value'])
+            node = ast.index(self._lookahead_token(0).value)
             self._advance()
-            self._match('rbracket')
+            self._match(RBRACKET)
             return node
 
     def _parse_slice_expression(self):
@@ -266,22 +451,22 @@ class Parser(object):
         # The last colon is optional as well.
         parts = [None, None, None]
         index = 0
-        current_token = self._current_token()
-        while not current_token == 'rbracket' and index < 3:
-            if current_token == 'colon':
+        current_token = self._current_kind()
+        while not current_token == RBRACKET and index < 3:
+            if current_token == COLON:
                 index += 1
                 if index == 3:
                     self._raise_parse_error_for_token(
                         self._lookahead_token(0), 'syntax error')
                 self._advance()
-            elif current_token == 'number':
-                parts[index] = self._lookahead_token(0)['value']
+            elif current_token == NUMBER:
+                parts[index] = self._lookahead_token(0).value
                 self._advance()
             else:
                 self._raise_parse_error_for_token(
                     self._lookahead_token(0), 'syntax error')
-            current_token = self._current_token()
-        self._match('rbracket')
+            current_token = self._current_kind()
+        self._match(RBRACKET)
         return ast.slice(*parts)
 
     def _token_nud_current(self, token):
@@ -291,64 +476,76 @@ class Parser(object):
         return ast.root_node()
 
     def _token_nud_expref(self, token):
-        expression = self._expression(self.BINDING_POWER['expref'])
+        expression = yield self.BINDING_POWER['expref']
         return ast.expref(expression)
 
     def _token_led_dot(self, left):
-        if not self._current_token() == 'star':
-            right = self._parse_dot_rhs(self.BINDING_POWER['dot'])
-            if left['type'] == 'subexpression':
-                left['children'].append(right)
+        if not self._current_kind() == STAR:
+            right = yield from self._parse_dot_rhs(self.BINDING_POWER['dot'])
+            if left.tag == ast.SUBEXPRESSION:
+                left.children.append(right)
                 return left
             else:
                 return ast.subexpression([left, right])
         else:
             # We're creating a projection.
             self._advance()
-            right = self._parse_projection_rhs(
+            right = yield from self._parse_projection_rhs(
                 self.BINDING_POWER['dot'])
             return ast.value_projection(left, right)
 
     def _token_led_pipe(self, left):
-        right = self._expression(self.BINDING_POWER['pipe'])
-        return ast.pipe(left, right)
+        right = yield self.BINDING_POWER['pipe']
+        return self._chain(ast.PIPE, ast.pipe, left, right)
 
     def _token_led_or(self, left):
-        right = self._expression(self.BINDING_POWER['or'])
-        return ast.or_expression(left, right)
+        right = yield self.BINDING_POWER['or']
+        return self._chain(ast.OR_EXPRESSION, ast.or_expression, left, right)
 
     def _token_led_and(self, left):
-        right = self._expression(self.BINDING_POWER['and'])
-        return ast.and_expression(left, right)
+        right = yield self.BINDING_POWER['and']
+        return self._chain(ast.AND_EXPRESSION, ast.and_expression, left, right)
+
+    def _chain(self, tag, node_type, left, right):
+        # Pipes, ors and ands are associative, so a chain of them is a
+        # single node with one child per operand, rather than a node
+        # nested in another for every operator.  The evaluation of long
+        # generated chains then neither recurses nor hits the recursion
+        # limit.
+        if left.tag == tag:
+            left.children.append(right)
+            return left
+        return node_type(left, right)
 
     def _token_led_lparen(self, left):
-        if left['type'] != 'field':
+        if left.tag != ast.FIELD:
             #  0 - first func arg or closing paren.
             # -1 - '(' token
             # -2 - invalid function "name".
             prev_t = self._lookahead_token(-2)
             raise exceptions.ParseError(
-                prev_t['start'], prev_t['value'], prev_t['type'],
-                "Invalid function name '%s'" % prev_t['value'])
-        name = left['value']
+                prev_t.start, prev_t.value, prev_t.type,
+                "Invalid function name '%s'" % prev_t.value)
+        name = left.value
         args = []
-        while not self._current_token() == 'rparen':
-            expression = self._expression()
-            if self._current_token() == 'comma':
-                self._match('comma')
+        while not self._current_kind() == RPAREN:
+            expression = yield 0
+            if self._current_kind() == COMMA:
+                self._match(COMMA)
             args.append(expression)
-        self._match('rparen')
+        self._match(RPAREN)
         function_node = ast.function_expression(name, args)
         return function_node
 
     def _token_led_filter(self, left):
         # Filters are projections.
-        condition = self._expression(0)
-        self._match('rbracket')
-        if self._current_token() == 'flatten':
+        condition = yield 0
+        self._match(RBRACKET)
+        if self._current_kind() == FLATTEN:
             right = ast.identity()
         else:
-            right = self._parse_projection_rhs(self.BINDING_POWER['filter'])
+            right = yield from self._parse_projection_rhs(
+                self.BINDING_POWER['filter'])
         return ast.filter_projection(left, right, condition)
 
     def _token_led_eq(self, left):
@@ -388,70 +585,93 @@ class Parser(object):
         return self._parse_arithmetic(left, 'plus')
 
     def _token_led_star(self, left):
-        return self._parse_arithmetic(left, 'multiply')
+        # The star token binds more tightly than the right operand of a
+        # multiplication, so a * b * c is a * (b * c).  The factors of
+        # such a chain are parsed in a loop, into a single node that is
+        # evaluated from right to left.
+        factors = [left]
+        while True:
+            right = yield self.BINDING_POWER['star']
+            if self._current_kind() != STAR:
+                break
+            factors.append(right)
+            self._advance()
+        # A flatten still ends the last operand, as in a * b[].
+        right = yield from self._parse_leds(right,
+                                            self.BINDING_POWER['multiply'])
+        factors.append(right)
+        return ast.Node(ast.ARITHMETIC, factors, 'multiply')
 
     def _token_led_flatten(self, left):
         left = ast.flatten(left)
-        right = self._parse_projection_rhs(
+        right = yield from self._parse_projection_rhs(
             self.BINDING_POWER['flatten'])
         return ast.projection(left, right)
 
     def _token_led_lbracket(self, left):
         token = self._lookahead_token(0)
-        if token['type'] in ['number', 'colon']:
+        if token.kind in _INDEX_START:
             right = self._parse_index_expression()
-            if left['type'] == 'index_expression':
+            if left.tag == ast.INDEX_EXPRESSION:
                 # Optimization: if the left node is an index expr,
                 # we can avoid creating another node and instead just add
                 # the right node as a child of the left.
-                left['children'].append(right)
+                left.children.append(right)
                 return left
             else:
                 return self._project_if_slice(left, right)
         else:
             # We have a projection
-            self._match('star')
-            self._match('rbracket')
-            right = self._parse_projection_rhs(self.BINDING_POWER['star'])
-            return ast.projection(left, right)
+            self._match(STAR)
+            self._match(RBRACKET)
+            return self._parse_projection(left)
     
     def _token_led_question(self, condition):
-        left = self._expression()
-        self._match('colon')
-        right = self._expression()
+        left = yield 0
+        self._match(COLON)
+        right = yield 0
         return ast.ternary_operator(condition, left, right)
 
     def _project_if_slice(self, left, right):
         index_expr = ast.index_expression([left, right])
-        if right['type'] == 'slice':
-            return ast.projection(
-                index_expr,
-                self._parse_projection_rhs(self.BINDING_POWER['star']))
+        if right.tag == ast.SLICE:
+            return self._parse_projection(index_expr)
         else:
             return index_expr
 
+    def _parse_projection(self, left):
+        right = yield from self._parse_projection_rhs(
+            self.BINDING_POWER['star'])
+        return ast.projection(left, right)
+
     def _parse_comparator(self, left, comparator):
-        right = self._expression(self.BINDING_POWER[comparator])
+        right = yield self.BINDING_POWER[comparator]
         return ast.comparator(comparator, left, right)
 
     def _parse_arithmetic_unary(self, token):
-        expression = self._expression(self.BINDING_POWER[token['type']])
-        return ast.arithmetic_unary(token['type'], expression)
+        expression = yield self.BINDING_POWER[token.type]
+        return ast.arithmetic_unary(token.type, expression)
 
     def _parse_arithmetic(self, left, operator):
-        right = self._expression(self.BINDING_POWER[operator])
+        right = yield self.BINDING_POWER[operator]
+        if left.tag == ast.ARITHMETIC and left.value == operator and \
+                operator in _ARITHMETIC_CHAINS:
+            # Like _chain(): a - b - c is a single node, evaluated from
+            # left to right.
+            left.children.append(right)
+            return left
         return ast.arithmetic(operator, left, right)
 
     def _parse_multi_select_list(self):
         expressions = []
         while True:
-            expression = self._expression()
+            expression = yield 0
             expressions.append(expression)
-            if self._current_token() == 'rbracket':
+            if self._current_kind() == RBRACKET:
                 break
             else:
-                self._match('comma')
-        self._match('rbracket')
+                self._match(COMMA)
+        self._match(RBRACKET)
         return ast.multi_select_list(expressions)
 
     def _parse_multi_select_hash(self):
@@ -460,32 +680,31 @@ class Parser(object):
             key_token = self._lookahead_token(0)
             # Before getting the token value, verify it's
             # an identifier.
-            self._match_multiple_tokens(
-                token_types=['quoted_identifier', 'unquoted_identifier'])
-            key_name = key_token['value']
-            self._match('colon')
-            value = self._expression(0)
+            self._match_multiple_tokens(_IDENTIFIERS)
+            key_name = key_token.value
+            self._match(COLON)
+            value = yield 0
             node = ast.key_val_pair(key_name=key_name, node=value)
             pairs.append(node)
-            if self._current_token() == 'comma':
-                self._match('comma')
-            elif self._current_token() == 'rbrace':
-                self._match('rbrace')
+            if self._current_kind() == COMMA:
+                self._match(COMMA)
+            elif self._current_kind() == RBRACE:
+                self._match(RBRACE)
                 break
         return ast.multi_select_dict(nodes=pairs)
 
     def _parse_projection_rhs(self, binding_power):
         # Parse the right hand side of the projection.
-        if self.BINDING_POWER[self._current_token()] < self._PROJECTION_STOP:
+        if self._BINDING_POWERS[self._current_kind()] < self._PROJECTION_STOP:
             # BP of 10 are all the tokens that stop a projection.
             right = ast.identity()
-        elif self._current_token() == 'lbracket':
-            right = self._expression(binding_power)
-        elif self._current_token() == 'filter':
-            right = self._expression(binding_power)
-        elif self._current_token() == 'dot':
-            self._match('dot')
-            right = self._parse_dot_rhs(binding_power)
+        elif self._current_kind() == LBRACKET:
+            right = yield binding_power
+        elif self._current_kind() == FILTER:
+            right = yield binding_power
+        elif self._current_kind() == DOT:
+            self._match(DOT)
+            right = yield from self._parse_dot_rhs(binding_power)
         else:
             self._raise_parse_error_for_token(self._lookahead_token(0),
                                               'syntax error')
@@ -500,73 +719,72 @@ class Parser(object):
         #                  *
         # In terms of tokens that means that after a '.',
         # you can have:
-        lookahead = self._current_token()
+        lookahead = self._current_kind()
         # Common case "foo.bar", so first check for an identifier.
-        if lookahead in ['quoted_identifier', 'unquoted_identifier', 'star']:
-            return self._expression(binding_power)
-        elif lookahead == 'lbracket':
-            self._match('lbracket')
-            return self._parse_multi_select_list()
-        elif lookahead == 'lbrace':
-            self._match('lbrace')
-            return self._parse_multi_select_hash()
+        if lookahead in _DOT_EXPRESSION_START:
+            return (yield binding_power)
+        elif lookahead == LBRACKET:
+            self._match(LBRACKET)
+            return (yield from self._parse_multi_select_list())
+        elif lookahead == LBRACE:
+            self._match(LBRACE)
+            return (yield from self._parse_multi_select_hash())
         else:
             t = self._lookahead_token(0)
             allowed = ['quoted_identifier', 'unquoted_identifier',
                        'lbracket', 'lbrace']
             msg = (
-                "Expecting: %s, got: %s" % (allowed, t['type'])
+                "Expecting: %s, got: %s" % (allowed, t.type)
             )
             self._raise_parse_error_for_token(t, msg)
 
     def _error_nud_token(self, token):
-        if token['type'] == 'eof':
+        if token.kind == EOF:
             raise exceptions.IncompleteExpressionError(
-                token['start'], token['value'], token['type'])
+                token.start, token.value, token.type)
         self._raise_parse_error_for_token(token, 'invalid token')
 
     def _error_led_token(self, token):
         self._raise_parse_error_for_token(token, 'invalid token')
 
-    def _match(self, token_type=None):
-        # inline'd self._current_token()
-        if self._current_token() == token_type:
-            # inline'd self._advance()
-            self._advance()
+    def _match(self, kind):
+        token = self._tokens[self._index]
+        if token.kind == kind:
+            self._index += 1
         else:
-            self._raise_parse_error_maybe_eof(
-                token_type, self._lookahead_token(0))
+            self._raise_parse_error_maybe_eof(TOKEN_TYPES[kind], token)
 
-    def _match_multiple_tokens(self, token_types):
-        if self._current_token() not in token_types:
+    def _match_multiple_tokens(self, kinds):
+        token = self._tokens[self._index]
+        if token.kind not in kinds:
             self._raise_parse_error_maybe_eof(
-                token_types, self._lookahead_token(0))
-        self._advance()
+                [TOKEN_TYPES[kind] for kind in kinds], token)
+        self._index += 1
 
     def _advance(self):
         self._index += 1
 
-    def _current_token(self):
-        return self._tokens[self._index]['type']
+    def _current_kind(self):
+        return self._tokens[self._index].kind
 
     def _lookahead(self, number):
-        return self._tokens[self._index + number]['type']
+        return self._tokens[self._index + number].kind
 
     def _lookahead_token(self, number):
         return self._tokens[self._index + number]
 
     def _raise_parse_error_for_token(self, token, reason):
-        lex_position = token['start']
-        actual_value = token['value']
-        actual_type = token['type']
+        lex_position = token.start
+        actual_value = token.value
+        actual_type = token.type
         raise exceptions.ParseError(lex_position, actual_value,
                                     actual_type, reason)
 
     def _raise_parse_error_maybe_eof(self, expected_type, token):
-        lex_position = token['start']
-        actual_value = token['value']
-        actual_type = token['type']
-        if actual_type == 'eof':
+        lex_position = token.start
+        actual_value = token.value
+        actual_type = token.type
+        if token.kind == EOF:
             raise exceptions.IncompleteExpressionError(
                 lex_position, actual_value, actual_type)
         message = 'Expecting: %s, got: %s' % (expected_type,
@@ -574,15 +792,73 @@ class Parser(object):
         raise exceptions.ParseError(
             lex_position, actual_value, actual_type, message)
 
-    def _free_cache_entries(self):
-        keys = list(self._CACHE.keys())
+    def _canonicalize(self, parsed_result):
+        # Spellings of the same expression, such as a.b and "a" . b,
+        # share the AST of the first one parsed.
+        canonical = parsed_result.canonical
+        entry = self._CANONICAL.get(canonical)
+        if entry is None:
+            self._CANONICAL[canonical] = [parsed_result,
+                                          set([parsed_result.expression])]
+            if len(self._CANONICAL) > self._MAX_SIZE:
+                self._free_cache_entries(self._CANONICAL)
+            return parsed_result
+        shared, spellings = entry
+        spellings.add(parsed_result.expression)
+        if shared.expression == parsed_result.expression:
+            return shared
+        parsed_result = ParsedResult(parsed_result.expression, shared.parsed)
+        parsed_result._canonical = canonical
+        return parsed_result
+
+    def _free_cache_entries(self, cache=None):
+        import random
+        if cache is None:
+            cache = self._CACHE
+        keys = list(cache.keys())
         for key in random.sample(keys, min(len(keys), int(self._MAX_SIZE / 2))):
-            self._CACHE.pop(key, None)
+            cache.pop(key, None)
+
+    @classmethod
+    def canonical_stats(cls):
+        """Return how many spellings of each cached expression were parsed.
+
+        The keys are canonical expressions, and the values the number of
+        distinct expression strings parsed to each of them.
+
+        """
+        return dict((canonical, len(entry[1]))
+                    for canonical, entry in cls._CANONICAL.items())
+
+    @classmethod
+    def template_stats(cls):
+        """Return how often auto parameterized expressions shared an AST.
+
+        Expressions compiled with ``Options(auto_parameterize=True)``
+        that have parameters are looked up by template, and hit when an
+        expression differing only by the literals compared was compiled
+        before.
+
+        """
+        stats = cls._TEMPLATE_STATS
+        lookups = stats['hits'] + stats['misses']
+        return {
+            'hits': stats['hits'],
+            'misses': stats['misses'],
+            'size': len(cls._TEMPLATES),
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+        }
 
     @classmethod
     def purge(cls):
         """Clear the expression compilation cache."""
         cls._CACHE.clear()
+        cls._CANONICAL.clear()
+        cls._TEMPLATES.clear()
+        cls._TEMPLATE_STATS.update(hits=0, misses=0)
+
+
+Parser._build_dispatch_tables()
 
 
 @with_repr_method
@@ -590,10 +866,92 @@ class ParsedResult(object):
     def __init__(self, expression, parsed):
         self.expression = expression
         self.parsed = parsed
+        self._canonical = None
+        self._free_variables = None
+        self._cost_estimates = {}
 
-    def search(self, value, options=None):
-        evaluator = visitor.TreeInterpreter(options)
-        return evaluator.evaluate(self.parsed, value)
+    @property
+    def canonical(self):
+        """The canonical form of the expression.
+
+        Expressions that parse to the same AST have the same canonical
+        form.  See ``jmespath.unparser``.
+
+        """
+        if self._canonical is None:
+            self._canonical = unparser.unparse(self.parsed)
+        return self._canonical
+
+    @property
+    def free_variables(self):
+        """The names of the variables to bind when searching.
+
+        These are the variables the expression uses without binding
+        them with ``let``, such as ``owner`` in ``items[?owner == $owner]``.
+
+        """
+        if self._free_variables is None:
+            self._free_variables = scope.free_variables(self.parsed)
+        return self._free_variables
+
+    def check_variables(self, names):
+        """Raise ``UndefinedVariable`` unless ``names`` binds every
+        free variable of the expression."""
+        free_variables = self.free_variables
+        if free_variables:
+            missing = free_variables.difference(names)
+            if missing:
+                raise exceptions.UndefinedVariable(sorted(missing)[0])
+
+    def search(self, value, options=None, variables=None):
+        """Evaluate the expression against ``value``.
+
+        ``variables`` maps the names of the free variables of the
+        expression, without their ``$``, to their values, so that one
+        compiled expression serves every value of its parameters::
+
+            compile('items[?owner == $owner]').search(
+                data, variables={'owner': 'alice'})
+
+        """
+        if variables is not None:
+            self.check_variables(variables)
+        variables = self._bind(variables)
+        if options is not None and options.result_cache is not None:
+            return options.result_cache.search(self, value, options,
+                                               variables)
+        return self._search(value, options, variables)
+
+    def _bind(self, variables):
+        # The variables to evaluate with, once those of the caller are
+        # checked.
+        return variables
+
+    def _search(self, value, options=None, variables=None):
+        if options is not None and options.profiler is not None:
+            return options.profiler.search(self, value, options, variables)
+        return self._evaluate(value, options, variables)
+
+    def _evaluate(self, value, options, variables=None):
+        evaluator = visitor.create_interpreter(options)
+        return evaluator.evaluate(self.parsed, value, variables)
+
+    def cost(self, cardinality_hints=None, default_cardinality=100):
+        """Statically estimate the cost of evaluating this expression.
+
+        Returns a ``jmespath.cost.CostEstimate``, which is computed once
+        per set of hints since compiled expressions are cached.
+
+        """
+        key = (default_cardinality,
+               tuple(sorted((cardinality_hints or {}).items())))
+        estimate = self._cost_estimates.get(key)
+        if estimate is None:
+            from jmespath.cost import estimate_cost
+            estimate = estimate_cost(self, cardinality_hints,
+                                     default_cardinality)
+            self._cost_estimates[key] = estimate
+        return estimate
 
     def _render_dot_file(self):
         """Render the parsed AST as a dot file.
@@ -610,4 +968,42 @@ class ParsedResult(object):
         return contents
 
     def __repr__(self):
-        return repr(self.parsed)
\ No newline at end of file
+        return repr(self.parsed)
+
+
+class ParameterizedResult(ParsedResult):
+    """An expression compiled with ``Options(auto_parameterize=True)``.
+
+    Its AST is the one of ``template``, shared by the expressions that
+    differ only by the literals they compare, with variables in place of
+    these literals.  ``parameters`` maps the names of these variables to
+    the literals of this expression.
+
+    """
+    def __init__(self, expression, template, parameters):
+        super(ParameterizedResult, self).__init__(expression,
+                                                  template.parsed)
+        self.template = template
+        self.parameters = parameters
+
+    @property
+    def canonical(self):
+        if self._canonical is None:
+            self._canonical = unparser.unparse(self.parsed,
+                                               self.parameters)
+        return self._canonical
+
+    @property
+    def free_variables(self):
+        if self._free_variables is None:
+            self._free_variables = \
+                self.template.free_variables.difference(self.parameters)
+        return self._free_variables
+
+    def _bind(self, variables):
+        # The parameters are bound after checking the variables of the
+        # caller, so that free variables the caller leaves unbound fail
+        # only when evaluated, as without auto parameterization.
+        if variables is None:
+            return self.parameters
+        return dict(variables, **self.parameters)
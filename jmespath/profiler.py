@@ -0,0 +1,205 @@
+"""Per node evaluation profiler.
+
+Profiling is enabled by passing a ``Profiler`` in the ``Options`` used
+to search.  Every AST node evaluated is timed, and the profiler
+accumulates, per node:
+
+* the number of times the node was evaluated,
+* the cumulative time spent in the node, including its children,
+* the time spent in the node itself,
+* the total cardinality of its output (the length of lists and
+  objects, 1 for any other non null value, 0 for null).
+
+Results can be rendered as a Graphviz dot file annotated with these
+numbers, or as collapsed stacks that can be fed to flamegraph tools::
+
+    profiler = Profiler()
+    options = jmespath.Options(profiler=profiler)
+    parsed = jmespath.compile('foo[*].bar')
+    parsed.search(data, options=options)
+    print(profiler.render_dot(parsed))
+    print(profiler.collapsed_stacks())
+    print(profiler.stats(parsed, (0,)).calls)
+
+When no profiler is given, searches don't pay anything for this
+feature.
+
+Structurally identical subtrees are the same nodes, even within an
+expression (see ``jmespath.ast.share``).  The profiler evaluates a copy
+of the tree made by ``jmespath.ast.unshare`` instead, so that each
+occurrence of a subtree has numbers of its own.  Nodes are designated
+by their path from the root of the expression.
+
+"""
+import time
+
+from jmespath.ast import unshare
+from jmespath.visitor import GraphvizVisitor, LimitedTreeInterpreter
+
+
+def _label(node):
+    return '%s(%s)' % (node.type, node.get('value', ''))
+
+
+def _cardinality(value):
+    if value is None:
+        return 0
+    elif isinstance(value, (list, dict)):
+        return len(value)
+    return 1
+
+
+class NodeStats(object):
+    def __init__(self, node):
+        self.node = node
+        self.calls = 0
+        self.total_time = 0.0
+        self.self_time = 0.0
+        self.cardinality = 0
+
+    def as_dict(self):
+        return {
+            'type': self.node.type,
+            'calls': self.calls,
+            'total_time': self.total_time,
+            'self_time': self.self_time,
+            'cardinality': self.cardinality,
+        }
+
+
+class Profiler(object):
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        # The original and the profiled tree of each expression, by id
+        # of the original.
+        self._trees = {}
+        self._nodes = {}
+        self._stacks = {}
+
+    def search(self, parsed, value, options=None, variables=None):
+        interpreter = ProfilingTreeInterpreter(self, options)
+        return interpreter.evaluate(self._tree(parsed), value, variables)
+
+    def stats(self, parsed, path=()):
+        """Return the ``NodeStats`` recorded for a node, or None.
+
+        The node is designated by its path in the AST of ``parsed``:
+        the index of the child to descend into at each level, so that
+        ``()`` is the root and ``(0, 1)`` the second child of its first
+        child.
+
+        """
+        entry = self._trees.get(id(parsed.parsed))
+        if entry is None:
+            return None
+        node = entry[1]
+        for index in path:
+            node = node.children[index]
+        return self._nodes.get(id(node))
+
+    def reset(self):
+        self._trees.clear()
+        self._nodes.clear()
+        self._stacks.clear()
+
+    def render_dot(self, parsed):
+        """Render the AST of ``parsed`` annotated with the profile."""
+        return _ProfileGraphvizVisitor(self).visit(self._tree(parsed))
+
+    def collapsed_stacks(self):
+        """Render the self time per call stack, in microseconds.
+
+        Each line is a semicolon separated stack of nodes followed by
+        the time spent in the innermost one, which is the format
+        expected by ``flamegraph.pl`` and compatible tools.
+
+        """
+        lines = []
+        for stack, elapsed in sorted(self._stacks.items()):
+            lines.append('%s %d' % (';'.join(stack), round(elapsed * 1e6)))
+        return '\n'.join(lines)
+
+    def _tree(self, parsed):
+        # The original is kept alive so that its id isn't reused.
+        root = parsed.parsed
+        entry = self._trees.get(id(root))
+        if entry is None:
+            entry = self._trees[id(root)] = (root, unshare(root))
+        return entry[1]
+
+    def _record(self, node, stack, total_time, self_time, cardinality):
+        stats = self._nodes.get(id(node))
+        if stats is None:
+            stats = self._nodes[id(node)] = NodeStats(node)
+        stats.calls += 1
+        stats.total_time += total_time
+        stats.self_time += self_time
+        stats.cardinality += cardinality
+        self._stacks[stack] = self._stacks.get(stack, 0.0) + self_time
+
+
+class ProfilingTreeInterpreter(LimitedTreeInterpreter):
+    # Evaluation limits are honored while profiling.  Their overhead is
+    # negligible compared to the cost of profiling itself.
+    def __init__(self, profiler, options=None):
+        super(ProfilingTreeInterpreter, self).__init__(options)
+        self._profiler = profiler
+        self._timer = profiler._clock
+        # One [label, time spent in children] pair per node being
+        # evaluated, innermost last.
+        self._profile_frames = []
+
+    def visit(self, node, *args, **kwargs):
+        frame, stack = self._enter(node)
+        cardinality = 0
+        start = self._timer()
+        try:
+            result = super(ProfilingTreeInterpreter, self).visit(
+                node, *args, **kwargs)
+            cardinality = _cardinality(result)
+            return result
+        finally:
+            self._exit(node, frame, stack, start, cardinality)
+
+    def _deep_generator(self, node, value):
+        # Like visit(), for the nodes of deep trees.
+        frame, stack = self._enter(node)
+        cardinality = 0
+        start = self._timer()
+        try:
+            result = yield from super(
+                ProfilingTreeInterpreter, self)._deep_generator(node, value)
+            cardinality = _cardinality(result)
+            return result
+        finally:
+            self._exit(node, frame, stack, start, cardinality)
+
+    def _enter(self, node):
+        frames = self._profile_frames
+        frame = [_label(node), 0.0]
+        frames.append(frame)
+        return frame, tuple(f[0] for f in frames)
+
+    def _exit(self, node, frame, stack, start, cardinality):
+        elapsed = self._timer() - start
+        frames = self._profile_frames
+        frames.pop()
+        if frames:
+            frames[-1][1] += elapsed
+        self._profiler._record(
+            node, stack, elapsed, elapsed - frame[1], cardinality)
+
+
+class _ProfileGraphvizVisitor(GraphvizVisitor):
+    def __init__(self, profiler):
+        super(_ProfileGraphvizVisitor, self).__init__()
+        self._profiler = profiler
+
+    def _label(self, node):
+        label = super(_ProfileGraphvizVisitor, self)._label(node)
+        stats = self._profiler._nodes.get(id(node))
+        if stats is None:
+            return label
+        return '%s\\ncalls=%d total=%.3fms self=%.3fms rows=%d' % (
+            label, stats.calls, stats.total_time * 1e3,
+            stats.self_time * 1e3, stats.cardinality)
@@ -1,5 +1,7 @@
 from collections import deque
 
+from jmespath import ast
+
 
 class ScopedChainDict:
     """Dictionary that can delegate lookups to multiple dicts.
@@ -38,3 +40,35 @@ class ScopedChainDict:
 
     def pop_scope(self):
         self._scopes.popleft()
+
+
+def free_variables(node):
+    """Return the names of the variables ``node`` uses without binding.
+
+    These are the variables that must be bound from outside, with the
+    ``variables`` of ``search()``.  Trees of any depth are walked
+    without recursing.
+
+    """
+    names = set()
+    # The nodes left to walk, with the names bound where they are.
+    stack = [(node, frozenset())]
+    while stack:
+        node, bound = stack.pop()
+        tag = node.tag
+        if tag == ast.VARIABLE_REF:
+            if node.value not in bound:
+                names.add(node.value)
+        elif tag == ast.LET_EXPRESSION:
+            # The bindings are evaluated in the enclosing scope, and
+            # only the body sees them.
+            bindings = node.children[:-1]
+            for assign in bindings:
+                stack.append((assign.children[0], bound))
+            stack.append((node.children[-1], bound.union(
+                assign.value for assign in bindings)))
+        else:
+            for child in node.children:
+                if isinstance(child, ast.Node):
+                    stack.append((child, bound))
+    return frozenset(names)
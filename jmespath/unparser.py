@@ -0,0 +1,332 @@
+"""Render ASTs back to expressions.
+
+``unparse`` returns the canonical form of an AST: the same expression
+with normalized whitespace and quoting, and with only the parentheses
+it needs.  Expressions that parse to the same AST have the same
+canonical form, whatever the way they were written::
+
+    >>> unparse(jmespath.compile(' "foo" . bar[?a==`1`] ').parsed)
+    'foo.bar[?a == `1`]'
+
+Parsing the canonical form of an AST gives an equal AST.
+
+The precedence of each construct mirrors the binding powers of the
+parser.  Each node is rendered with two numbers:
+
+* how tightly its leftmost operator binds: the node can be the operand
+  on the right of an operator of binding power ``p`` only if this is
+  greater than ``p``,
+* the lowest binding power at its right end: a token that binds more
+  tightly than this, written right after the node, would be parsed as
+  part of it.  Projections take in every token of binding power 10 or
+  more, and ``let``, ``&`` and the ternary operator every token.
+
+"""
+from jmespath import ast
+from jmespath.visitor import IterativeVisitor
+
+
+# The binding powers of the parser that matter here.
+_PIPE = 1
+_TERNARY = 2
+_OR = 3
+_AND = 4
+_COMPARATOR = 5
+_FLATTEN = 9
+_PROJECTED = 9
+_STAR = 20
+_FILTER = 21
+_DOT = 40
+_NOT = 45
+_BRACKET = 55
+# The precedence of nodes without operators, such as fields.
+_CLOSED = 1000
+
+_COMPARATORS = {
+    'eq': '==', 'ne': '!=', 'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>=',
+}
+# The symbol, the binding power of the token and the binding power of
+# the right operand of arithmetic operators.  '*' is the star token,
+# which binds more tightly than the right operand of a multiplication.
+_ARITHMETIC = {
+    'plus': ('+', 6, 6),
+    'minus': ('-', 6, 6),
+    'multiply': ('*', _STAR, 7),
+    'divide': ('/', 7, 7),
+    'div': ('//', 7, 7),
+    'modulo': ('%', 7, 7),
+}
+_UNARY = {'plus': '+', 'minus': '-'}
+_MULTI_SELECTS = frozenset([ast.MULTI_SELECT_LIST, ast.MULTI_SELECT_DICT])
+
+
+def unparse(node, parameters=None):
+    """Return the canonical expression of the AST ``node``.
+
+    The variables named in ``parameters`` are rendered as the literals
+    they map to.
+
+    """
+    return Unparser(parameters).visit(node)[0]
+
+
+def _dumps(value):
+    import json
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def identifier(name):
+    """Return the identifier ``name``, quoted only if needed."""
+    if name.isascii() and name.isidentifier():
+        return name
+    return _dumps(name)
+
+
+def literal(value):
+    """Return the literal ``value``: a raw string, or JSON."""
+    if isinstance(value, str):
+        return "'%s'" % value.replace('\\', '\\\\').replace("'", "\\'")
+    return '`%s`' % _dumps(value).replace('`', '\\`')
+
+
+class Unparser(IterativeVisitor):
+    # Every visit method returns the text of the node, the precedence of
+    # its leftmost operator and the lowest binding power at its right
+    # end.  The visit methods of nodes with children are generators,
+    # see IterativeVisitor.
+
+    def __init__(self, parameters=None):
+        super(Unparser, self).__init__()
+        self._parameters = parameters or {}
+
+    def default_visit(self, node):
+        raise NotImplementedError(node.type)
+
+    def _operand(self, node, precedence):
+        # ``node`` as the operand on the right of an operator.
+        text, left, right = yield node
+        if left > precedence:
+            return text, right
+        return '(%s)' % text, _CLOSED
+
+    def _left_operand(self, node, binding_power):
+        # ``node`` followed by a token of ``binding_power``.  Returns
+        # its text and the precedence of the whole, which is that of
+        # the token unless nothing precedes it.
+        if node.tag == ast.IDENTITY:
+            return '', _CLOSED
+        text, left, right = yield node
+        if right < binding_power:
+            return '(%s)' % text, binding_power
+        return text, min(left, binding_power)
+
+    def _projected(self, node, binding_power):
+        # The right hand side of a projection, whose first token is '.',
+        # '[' or '[?', and which is parsed with ``binding_power``.  A
+        # projection without one takes in any token that could start
+        # one, or fails on any other token of binding power 10 or more.
+        if node.tag == ast.IDENTITY:
+            return '', _PROJECTED
+        text, _, right = yield node
+        if node.tag == ast.MULTI_SELECT_LIST or not text.startswith('['):
+            # Without the dot, a multi-select list would take in the
+            # tokens that follow it.
+            text = '.' + text
+        return text, self._after_dot(node, right, binding_power)
+
+    def _after_dot(self, node, right, binding_power):
+        # The lowest binding power at the right end of ``node``, parsed
+        # with ``binding_power`` after a '.'.  Multi-selects after a dot
+        # are parsed on their own, without the tokens that follow them.
+        if node.tag in _MULTI_SELECTS:
+            return right
+        return min(right, binding_power)
+
+    def _infix(self, node, symbol, binding_power, operand_power=None):
+        if operand_power is None:
+            operand_power = binding_power
+        children = node.children
+        text, left = yield from self._left_operand(children[0],
+                                                   binding_power)
+        parts = [text]
+        last = len(children) - 1
+        for i, child in enumerate(children[1:], 1):
+            precedence = operand_power
+            if node.tag == child.tag == ast.ARITHMETIC and \
+                    node.value == child.value == 'multiply':
+                # A chain of multiplications is a single node, so one
+                # that is a factor of another is in parentheses.
+                precedence = _CLOSED
+            text, right = yield from self._operand(child, precedence)
+            if i < last and right < binding_power:
+                text, right = '(%s)' % text, _CLOSED
+            parts.append(text)
+        return symbol.join(parts), left, min(right, operand_power)
+
+    def visit_field(self, node):
+        return identifier(node.value), _CLOSED, _CLOSED
+
+    def visit_literal(self, node):
+        return literal(node.value), _CLOSED, _CLOSED
+
+    def visit_current(self, node):
+        return '@', _CLOSED, _CLOSED
+
+    def visit_root(self, node):
+        return '$', _CLOSED, _CLOSED
+
+    def visit_identity(self, node):
+        return '', _CLOSED, _CLOSED
+
+    def visit_variable_ref(self, node):
+        if node.value in self._parameters:
+            return literal(self._parameters[node.value]), _CLOSED, _CLOSED
+        return '$' + node.value, _CLOSED, _CLOSED
+
+    def _texts(self, children):
+        texts = []
+        for child in children:
+            texts.append((yield child)[0])
+        return texts
+
+    def visit_function_expression(self, node):
+        args = ', '.join((yield from self._texts(node.children)))
+        return '%s(%s)' % (node.value, args), _CLOSED, _CLOSED
+
+    def visit_multi_select_list(self, node):
+        elements = yield from self._texts(node.children)
+        if elements == ['*']:
+            # [*] would be a projection.
+            elements = ['(*)']
+        return '[%s]' % ', '.join(elements), _CLOSED, _CLOSED
+
+    def visit_multi_select_dict(self, node):
+        pairs = ', '.join((yield from self._texts(node.children)))
+        return '{%s}' % pairs, _CLOSED, _CLOSED
+
+    def visit_key_val_pair(self, node):
+        text = (yield node.children[0])[0]
+        return '%s: %s' % (identifier(node.value), text), _CLOSED, _CLOSED
+
+    def visit_expref(self, node):
+        text = (yield node.children[0])[0]
+        if text.startswith('&'):
+            # && is the and operator.
+            text = ' ' + text
+        return '&' + text, _CLOSED, 0
+
+    def visit_let_expression(self, node):
+        bindings = ', '.join((yield from self._texts(node.children[:-1])))
+        body = (yield node.children[-1])[0]
+        return 'let %s in %s' % (bindings, body), _CLOSED, 0
+
+    def visit_assign(self, node):
+        text = (yield node.children[0])[0]
+        return '$%s = %s' % (node.value, text), _CLOSED, 0
+
+    def visit_not_expression(self, node):
+        text, right = yield from self._operand(node.children[0], _NOT)
+        return '!' + text, _CLOSED, min(right, _NOT)
+
+    def visit_arithmetic_unary(self, node):
+        operand_power = _ARITHMETIC[node.value][2]
+        text, right = yield from self._operand(node.children[0],
+                                               operand_power)
+        return _UNARY[node.value] + text, _CLOSED, min(right, operand_power)
+
+    def visit_arithmetic(self, node):
+        symbol, binding_power, operand_power = _ARITHMETIC[node.value]
+        return (yield from self._infix(node, ' %s ' % symbol,
+                                       binding_power, operand_power))
+
+    def visit_comparator(self, node):
+        return (yield from self._infix(
+            node, ' %s ' % _COMPARATORS[node.value], _COMPARATOR))
+
+    def visit_or_expression(self, node):
+        return (yield from self._infix(node, ' || ', _OR))
+
+    def visit_and_expression(self, node):
+        return (yield from self._infix(node, ' && ', _AND))
+
+    def visit_pipe(self, node):
+        return (yield from self._infix(node, ' | ', _PIPE))
+
+    def visit_ternary_operator(self, node):
+        condition, then, otherwise = node.children
+        text, left = yield from self._left_operand(condition, _TERNARY)
+        then = (yield then)[0]
+        otherwise = (yield otherwise)[0]
+        return '%s ? %s : %s' % (text, then, otherwise), left, 0
+
+    def visit_subexpression(self, node):
+        children = node.children
+        text, left = yield from self._left_operand(children[0], _DOT)
+        right = _CLOSED
+        for child in children[1:]:
+            if right < _DOT:
+                # A projection in the middle of the chain, as in
+                # (a.b[*]).c, must not take in the rest of it.
+                text = '(%s)' % text
+            child_text, _, right = yield child
+            # The child takes in the tokens binding more tightly than
+            # the dot, as in a.b[0].
+            right = self._after_dot(child, right, _DOT)
+            text = '%s.%s' % (text, child_text)
+        return text, left, right
+
+    def visit_index(self, node):
+        return '[%d]' % node.value, _CLOSED, _CLOSED
+
+    def visit_slice(self, node):
+        start, stop, step = ['' if part is None else str(part)
+                             for part in node.children]
+        if step:
+            return '[%s:%s:%s]' % (start, stop, step), _CLOSED, _CLOSED
+        return '[%s:%s]' % (start, stop), _CLOSED, _CLOSED
+
+    def visit_index_expression(self, node):
+        children = node.children
+        text, left = yield from self._left_operand(children[0], _BRACKET)
+        indices = ''.join((yield from self._texts(children[1:])))
+        return text + indices, left, _CLOSED
+
+    def visit_projection(self, node):
+        left_node, right_node = node.children
+        if left_node.tag == ast.FLATTEN:
+            text, left = yield from self._left_operand(
+                left_node.children[0], _FLATTEN)
+            text += '[]'
+            binding_power = _FLATTEN
+        elif (left_node.tag == ast.INDEX_EXPRESSION and
+                len(left_node.children) == 2 and
+                left_node.children[1].tag == ast.SLICE):
+            # foo[1:2] projects the slice.
+            text, left, _ = yield left_node
+            binding_power = _STAR
+        else:
+            text, left = yield from self._left_operand(left_node, _BRACKET)
+            text += '[*]'
+            binding_power = _STAR
+        projected, right = yield from self._projected(right_node,
+                                                      binding_power)
+        return text + projected, left, right
+
+    def visit_value_projection(self, node):
+        left_node, right_node = node.children
+        if left_node.tag == ast.IDENTITY:
+            text, left, binding_power = '*', _CLOSED, _STAR
+        else:
+            text, left = yield from self._left_operand(left_node, _DOT)
+            text += '.*'
+            binding_power = _DOT
+        projected, right = yield from self._projected(right_node,
+                                                      binding_power)
+        return text + projected, left, right
+
+    def visit_filter_projection(self, node):
+        left_node, right_node, condition = node.children
+        text, left = yield from self._left_operand(left_node, _FILTER)
+        text = '%s[?%s]' % (text, (yield condition)[0])
+        projected, right = yield from self._projected(right_node, _FILTER)
+        return text + projected, left, right
@@ -1,7 +1,12 @@
 import operator
+import time
+from types import GeneratorType
 
 from jmespath import exceptions
 from jmespath import functions
+from jmespath.ast import (
+    NODE_TYPES, TAGS, EXPREF, INDEX_EXPRESSION, SLICE, Node, is_deep,
+)
 from jmespath.compat import string_type
 from jmespath.scope import ScopedChainDict
 from numbers import Number
@@ -62,7 +67,17 @@ class Options(object):
     """Options to control how a JMESPath function is evaluated."""
     def __init__(self, dict_cls=None,
         custom_functions=None,
-        enable_legacy_literals=False):
+        enable_legacy_literals=False,
+        result_cache=None,
+        profiler=None,
+        max_cost=None,
+        max_complexity=None,
+        cardinality_hints=None,
+        max_steps=None,
+        timeout=None,
+        max_result_size=None,
+        compiled_cache=None,
+        auto_parameterize=False):
 
         #: The class to use when creating a dict.  The interpreter
         #  may create dictionaries during the evaluation of a JMESPath
@@ -81,31 +96,140 @@ class Options(object):
         #  Setting this flag to `True` enables support for legacy syntax.
         self.enable_legacy_literals = enable_legacy_literals
 
+        #: An optional ``jmespath.cache.ResultCache`` that memoizes
+        #  search results by expression and document fingerprint.
+        self.result_cache = result_cache
+
+        #: An optional ``jmespath.profiler.Profiler`` that records
+        #  call counts, timings and output cardinality per AST node.
+        self.profiler = profiler
+
+        #: Budgets checked statically when an expression is compiled.
+        #  ``max_cost`` bounds the estimated number of node evaluations
+        #  and ``max_complexity`` the asymptotic complexity class, such
+        #  as ``'O(n log n)'``.  Expressions exceeding either budget
+        #  raise ``CostBudgetExceededError``.  ``cardinality_hints``
+        #  maps field names to the expected size of their collections.
+        #  See ``jmespath.cost`` for details.
+        self.max_cost = max_cost
+        self.max_complexity = max_complexity
+        self.cardinality_hints = cardinality_hints
+
+        #: Limits checked while an expression is evaluated.
+        #  ``max_steps`` bounds the number of AST nodes visited,
+        #  ``timeout`` the number of seconds a search may take, and
+        #  ``max_result_size`` the total number of elements of the
+        #  lists and objects built during the search.  Exceeding any
+        #  of them raises ``EvaluationLimitExceededError``.
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_result_size = max_result_size
+
+        #: An optional ``jmespath.diskcache.CompiledCache`` holding
+        #  expressions compiled ahead of time.  Expressions missing from
+        #  the compile cache are looked up there before being parsed.
+        self.compiled_cache = compiled_cache
+
+        #: Whether literals compared with ``==``, ``<`` and the other
+        #  comparators are compiled as parameters, so that expressions
+        #  differing only by these literals, such as ``a[?id == `1`]``
+        #  and ``a[?id == `2`]``, share their AST.
+        #  ``Parser.template_stats()`` reports how often they do.
+        self.auto_parameterize = auto_parameterize
+
+    def has_limits(self):
+        return (self.max_steps is not None or self.timeout is not None or
+                self.max_result_size is not None)
+
 
 class _Expression(object):
-    def __init__(self, expression, interpreter):
+    def __init__(self, expression, interpreter, frames=None):
         self.expression = expression
         self.interpreter = interpreter
+        #: The let frames where the expression was referenced, or None
+        #  outside of any let expression.
+        self.frames = frames
+        self._visit = interpreter.visit
+        if is_deep(expression):
+            self._visit = interpreter._visit_deep
 
     def visit(self, node, *args, **kwargs):
-        return self.interpreter.visit(node, *args, **kwargs)
+        interpreter = self.interpreter
+        visit = self._visit if node is self.expression else interpreter.visit
+        if self.frames is None:
+            return visit(node, *args, **kwargs)
+        # The variables of the expression are the ones bound where it
+        # was referenced, even once these let expressions are done.
+        frames = interpreter._frames
+        interpreter._frames = self.frames
+        try:
+            return visit(node, *args, **kwargs)
+        finally:
+            interpreter._frames = frames
 
 class Visitor(object):
     def __init__(self):
-        self._method_cache = {}
+        # The visit method of each node type, indexed by node tag.
+        self._method_cache = [None] * len(NODE_TYPES)
 
     def visit(self, node, *args, **kwargs):
-        node_type = node['type']
-        method = self._method_cache.get(node_type)
+        method = self._method_cache[node.tag]
         if method is None:
             method = getattr(
-                self, 'visit_%s' % node['type'], self.default_visit)
-            self._method_cache[node_type] = method
+                self, 'visit_%s' % node.type, self.default_visit)
+            self._method_cache[node.tag] = method
         return method(node, *args, **kwargs)
 
     def default_visit(self, node, *args, **kwargs):
         raise NotImplementedError("default_visit")
 
+
+class IterativeVisitor(Visitor):
+    """Visitor whose visit methods may be generators.
+
+    Such a visit method yields each child to visit and is sent the
+    result, so that trees of any depth are visited on an explicit stack
+    rather than by recursion.  The visit methods of leaves can return
+    their result directly.
+
+    """
+    def visit(self, node, *args, **kwargs):
+        result = Visitor.visit(self, node, *args, **kwargs)
+        if type(result) is not GeneratorType:
+            return result
+        stack = []
+        generator = result
+        result = None
+        error = None
+        while True:
+            try:
+                if error is None:
+                    child = generator.send(result)
+                else:
+                    child = generator.throw(error)
+                    error = None
+            except StopIteration as e:
+                if not stack:
+                    return e.value
+                result = e.value
+                generator = stack.pop()
+                continue
+            except Exception as e:
+                if not stack:
+                    raise
+                error = e
+                generator = stack.pop()
+                continue
+            try:
+                result = Visitor.visit(self, child)
+            except Exception as e:
+                error = e
+                continue
+            if type(result) is GeneratorType:
+                stack.append(generator)
+                generator = result
+                result = None
+
 class TreeInterpreter(Visitor):
     COMPARATOR_FUNC = {
         'eq': _equals,
@@ -143,18 +267,31 @@ class TreeInterpreter(Visitor):
         else:
             self._functions = functions.Functions()
         self._root = None
+        # The variables bound from outside of the expression.
         self._scope = ScopedChainDict()
+        # The values bound by each let expression being evaluated,
+        # innermost last, by slot.
+        self._frames = []
+
+    @property
+    def dict_cls(self):
+        """The class of the objects the interpreter builds."""
+        return self._dict_cls
 
     def default_visit(self, node, *args, **kwargs):
-        raise NotImplementedError(node['type'])
+        raise NotImplementedError(node.type)
 
-    def evaluate(self, ast, root):
+    def evaluate(self, ast, root, variables=None):
         self._root = root
+        if variables is not None:
+            self._scope = ScopedChainDict(variables)
+        if is_deep(ast):
+            return self._visit_deep(ast, root)
         return self.visit(ast, root)
 
     def visit_subexpression(self, node, value):
         result = value
-        for node in node['children']:
+        for node in node.children:
             result = self.visit(node, result)
             if (result is None):
                 return None
@@ -162,24 +299,24 @@ class TreeInterpreter(Visitor):
 
     def visit_field(self, node, value, *args, **kwargs):
         try:
-           return value.get(node['value']) 
+           return value.get(node.value) 
         except AttributeError:
             return None
 
     def visit_comparator(self, node, value):
         # Common case: comparator is == or !=
-        comparator_func = self.COMPARATOR_FUNC[node['value']]
-        if node['value'] in self._EQUALITY_OPS:
+        comparator_func = self.COMPARATOR_FUNC[node.value]
+        if node.value in self._EQUALITY_OPS:
             return comparator_func(
-                self.visit(node['children'][0], value),
-                self.visit(node['children'][1], value)
+                self.visit(node.children[0], value),
+                self.visit(node.children[1], value)
             )
         else:
             # Ordering operators are only valid for numbers.
             # Evaluating any other type with a comparison operator
             # will yield a None value.
-            left = self.visit(node['children'][0], value)
-            right = self.visit(node['children'][1], value)
+            left = self.visit(node.children[0], value)
+            right = self.visit(node.children[1], value)
             num_types = (int, float)
             if not (_is_comparable(left) and
                     _is_comparable(right)):
@@ -187,17 +324,32 @@ class TreeInterpreter(Visitor):
             return comparator_func(left, right)
 
     def visit_arithmetic_unary(self, node, value):
-        operation = self._ARITHMETIC_UNARY_FUNC[node['value']]
+        operation = self._ARITHMETIC_UNARY_FUNC[node.value]
         return operation(
-            self.visit(node['children'][0], value)
+            self.visit(node.children[0], value)
         )
 
     def visit_arithmetic(self, node, value):
-        operation = self._ARITHMETIC_FUNC[node['value']]
-        return operation(
-            self.visit(node['children'][0], value),
-            self.visit(node['children'][1], value)
-        )
+        if node.value == 'multiply':
+            return self._multiply(
+                [self.visit(child, value) for child in node.children])
+        operation = self._ARITHMETIC_FUNC[node.value]
+        # Chains of a left associative operator, such as a - b - c, are
+        # a single node.
+        children = iter(node.children)
+        result = self.visit(next(children), value)
+        for child in children:
+            result = operation(result, self.visit(child, value))
+        return result
+
+    def _multiply(self, factors):
+        # Chains of multiplications are a single node as well, but
+        # a * b * c is a * (b * c): every factor is evaluated, then they
+        # are multiplied from the right.
+        result = factors[-1]
+        for i in range(len(factors) - 2, -1, -1):
+            result = factors[i] * result
+        return result
 
     def visit_current(self, node, value):
         return value
@@ -206,30 +358,34 @@ class TreeInterpreter(Visitor):
         return self._root
 
     def visit_expref(self, node, value):
-        return _Expression(node['children'][0], self)
+        frames = self._frames
+        return _Expression(node.children[0], self,
+                           frames[:] if frames else None)
 
     def visit_function_expression(self, node, value, *args, **kwargs):
         resolved_args = []
-        for child in node['children']:
+        for child in node.children:
             current = self.visit(child, value)
             resolved_args.append(current)
-        return self._functions.call_function(node['value'], resolved_args, scopes = kwargs.get('scopes'))
+        return self._functions.call_function(node.value, resolved_args, scopes = kwargs.get('scopes'))
 
     def visit_filter_projection(self, node, value):
-        base = self.visit(node['children'][0], value)
+        base = self.visit(node.children[0], value)
         if not isinstance(base, list):
             return None
-        comparator_node = node['children'][2]
+        comparator_node = node.children[2]
         collected = []
         for element in base:
             if self._is_true(self.visit(comparator_node, element)):
-                current = self.visit(node['children'][1], element)
+                current = self.visit(node.children[1], element)
                 if current is not None:
                     collected.append(current)
         return collected
 
     def visit_flatten(self, node, value):
-        base = self.visit(node['children'][0], value)
+        return self._flatten(self.visit(node.children[0], value))
+
+    def _flatten(self, base):
         if not isinstance(base, list):
             # Can't flatten the object if it's not a list.
             return None
@@ -250,60 +406,63 @@ class TreeInterpreter(Visitor):
         if not isinstance(value, list):
             return None
         try:
-            return value[node['value']]
+            return value[node.value]
         except IndexError:
             return None
 
     def visit_index_expression(self, node, value):
         result = value
-        for node in node['children']:
+        for node in node.children:
             result = self.visit(node, result)
         return result
 
     def visit_slice(self, node, value):
         if isinstance(value, string_type):
-            start = node['children'][0]
-            end = node['children'][1]
-            step = node['children'][2]
+            start = node.children[0]
+            end = node.children[1]
+            step = node.children[2]
             return value[start:end:step]
 
         if not isinstance(value, list):
             return None
-        s = slice(*node['children'])
+        s = slice(*node.children)
         return value[s]
 
     def visit_key_val_pair(self, node, value):
-        return self.visit(node['children'][0], value)
+        return self.visit(node.children[0], value)
 
     def visit_literal(self, node, value):
-        return node['value']
+        return node.value
 
     def visit_multi_select_dict(self, node, value):
         collected = self._dict_cls()
-        for child in node['children']:
-            collected[child['value']] = self.visit(child, value)
+        for child in node.children:
+            collected[child.value] = self.visit(child, value)
         return collected
 
     def visit_multi_select_list(self, node, value):
         collected = []
-        for child in node['children']:
+        for child in node.children:
             collected.append(self.visit(child, value))
         return collected
 
     def visit_or_expression(self, node, value):
-        matched = self.visit(node['children'][0], value)
-        if self._is_false(matched):
-            matched = self.visit(node['children'][1], value)
+        # Chains of ors are a single node with every operand as a child.
+        for child in node.children:
+            matched = self.visit(child, value)
+            if not self._is_false(matched):
+                return matched
         return matched
 
     def visit_and_expression(self, node, value):
-        matched = self.visit(node['children'][0], value)
-        if self._is_false(matched):
-            return matched
-        return self.visit(node['children'][1], value)
+        for child in node.children:
+            matched = self.visit(child, value)
+            if self._is_false(matched):
+                return matched
+        return matched
 
     def visit_not_expression(self, node, value):
-        original_result = self.visit(node['children'][0], value)
+        original_result = self.visit(node.children[0], value)
         if _is_actual_number(original_result) and original_result == 0:
             # Special case for 0, !0 should be false, not true.
             # 0 is not a special cased integer in jmespath.
@@ -312,75 +471,76 @@ class TreeInterpreter(Visitor):
 
     def visit_pipe(self, node, value):
         result = value
-        for node in node['children']:
+        for node in node.children:
             result = self.visit(node, result)
         return result
 
     def visit_projection(self, node, value):
-        base = self.visit(node['children'][0], value)
+        base = self.visit(node.children[0], value)
 
         allow_string = False
-        first_child = node['children'][0]
-        if first_child['type'] == 'index_expression':
-            nested_children = first_child['children']
-            if len(nested_children) > 1 and nested_children[1]['type'] == 'slice':
+        first_child = node.children[0]
+        if first_child.tag == INDEX_EXPRESSION:
+            nested_children = first_child.children
+            if len(nested_children) > 1 and nested_children[1].tag == SLICE:
                 allow_string = True
 
         if isinstance(base, string_type) and allow_string:
             ## projections are really sub-expressions in disguise
             ## evaluate the rhs when lhs is a sliced string
-            return self.visit(node['children'][1], base)
+            return self.visit(node.children[1], base)
 
         if not isinstance(base, list):
             return None
         collected = []
         for element in base:
-            current = self.visit(node['children'][1], element)
+            current = self.visit(node.children[1], element)
             if current is not None:
                 collected.append(current)
         return collected
 
     def visit_let_expression(self, node, value):
-        *bindings, expr = node['children']
-        scope = {}
-        for assign in bindings:
-            scope.update(self.visit(assign, value))
-        self._scope.push_scope(scope)
-        result = self.visit(expr, value)
-        self._scope.pop_scope()
+        children = node.children
+        frame = [self.visit(assign, value) for assign in children[:-1]]
+        frames = self._frames
+        frames.append(frame)
+        result = self.visit(children[-1], value)
+        frames.pop()
         return result
 
     def visit_assign(self, node, value):
-        name = node['value']
-        value = self.visit(node['children'][0], value)
-        return {name: value}
+        return self.visit(node.children[0], value)
 
     def visit_variable_ref(self, node, value):
+        resolved = node.children
+        if resolved:
+            depth, slot = resolved
+            return self._frames[-1 - depth][slot]
         try:
-            return self._scope[node['value']]
+            return self._scope[node.value]
         except KeyError:
-            raise exceptions.UndefinedVariable(node['value'])
+            raise exceptions.UndefinedVariable(node.value)
 
     def visit_ternary_operator(self, node, value):
-        condition = node['children'][0]
+        condition = node.children[0]
         evaluation = self.visit(condition, value)
 
         if self._is_false(evaluation):
-            falsyNode = node['children'][2]
+            falsyNode = node.children[2]
             return self.visit(falsyNode, value)
         else:
-            truthyNode = node['children'][1]
+            truthyNode = node.children[1]
             return self.visit(truthyNode, value)
 
     def visit_value_projection(self, node, value):
-        base = self.visit(node['children'][0], value)
+        base = self.visit(node.children[0], value)
         try:
             base = base.values()
         except AttributeError:
             return None
         collected = []
         for element in base:
-            current = self.visit(node['children'][1], element)
+            current = self.visit(node.children[1], element)
             if current is not None:
                 collected.append(current)
         return collected
@@ -395,6 +555,306 @@ class TreeInterpreter(Visitor):
     def _is_true(self, value):
         return not self._is_false(value)
 
+    # Trees higher than ast.RECURSIVE_HEIGHT are evaluated by
+    # _visit_deep(), with a generator per node being evaluated on an
+    # explicit stack.  The generator of a node yields each child to
+    # evaluate along with its value, and is sent the result.  Children
+    # that aren't deep are evaluated by visit(), which recurses at most
+    # RECURSIVE_HEIGHT levels.
+
+    def _visit_deep(self, node, value):
+        stack = []
+        generator = self._deep_generator(node, value)
+        result = None
+        error = None
+        while True:
+            try:
+                if error is None:
+                    child, value = generator.send(result)
+                else:
+                    child, value = generator.throw(error)
+                    error = None
+            except StopIteration as e:
+                if not stack:
+                    return e.value
+                result = e.value
+                generator = stack.pop()
+                continue
+            except Exception as e:
+                if not stack:
+                    raise
+                error = e
+                generator = stack.pop()
+                continue
+            # An expression reference is not evaluated where it appears,
+            # so it is visited like a leaf, however deep its expression.
+            if is_deep(child) and child.tag != EXPREF:
+                stack.append(generator)
+                generator = self._deep_generator(child, value)
+                result = None
+                continue
+            try:
+                result = self.visit(child, value)
+            except Exception as e:
+                error = e
+
+    def _deep_generator(self, node, value):
+        return getattr(self, '_deep_%s' % node.type)(node, value)
+
+    def _deep_subexpression(self, node, value):
+        result = value
+        for child in node.children:
+            result = yield child, result
+            if result is None:
+                return None
+        return result
+
+    def _deep_comparator(self, node, value):
+        comparator_func = self.COMPARATOR_FUNC[node.value]
+        left = yield node.children[0], value
+        right = yield node.children[1], value
+        if node.value not in self._EQUALITY_OPS and \
+                not (_is_comparable(left) and _is_comparable(right)):
+            return None
+        return comparator_func(left, right)
+
+    def _deep_arithmetic_unary(self, node, value):
+        operation = self._ARITHMETIC_UNARY_FUNC[node.value]
+        return operation((yield node.children[0], value))
+
+    def _deep_arithmetic(self, node, value):
+        if node.value == 'multiply':
+            factors = []
+            for child in node.children:
+                factors.append((yield child, value))
+            return self._multiply(factors)
+        operation = self._ARITHMETIC_FUNC[node.value]
+        children = iter(node.children)
+        result = yield next(children), value
+        for child in children:
+            result = operation(result, (yield child, value))
+        return result
+
+    def _deep_function_expression(self, node, value):
+        resolved_args = []
+        for child in node.children:
+            resolved_args.append((yield child, value))
+        return self._functions.call_function(node.value, resolved_args)
+
+    def _deep_filter_projection(self, node, value):
+        base = yield node.children[0], value
+        if not isinstance(base, list):
+            return None
+        comparator_node = node.children[2]
+        collected = []
+        for element in base:
+            if self._is_true((yield comparator_node, element)):
+                current = yield node.children[1], element
+                if current is not None:
+                    collected.append(current)
+        return collected
+
+    def _deep_flatten(self, node, value):
+        return self._flatten((yield node.children[0], value))
+
+    def _deep_index_expression(self, node, value):
+        result = value
+        for child in node.children:
+            result = yield child, result
+        return result
+
+    def _deep_key_val_pair(self, node, value):
+        return (yield node.children[0], value)
+
+    def _deep_multi_select_dict(self, node, value):
+        collected = self._dict_cls()
+        for child in node.children:
+            collected[child.value] = yield child, value
+        return collected
+
+    def _deep_multi_select_list(self, node, value):
+        collected = []
+        for child in node.children:
+            collected.append((yield child, value))
+        return collected
+
+    def _deep_or_expression(self, node, value):
+        for child in node.children:
+            matched = yield child, value
+            if not self._is_false(matched):
+                return matched
+        return matched
+
+    def _deep_and_expression(self, node, value):
+        for child in node.children:
+            matched = yield child, value
+            if self._is_false(matched):
+                return matched
+        return matched
+
+    def _deep_not_expression(self, node, value):
+        original_result = yield node.children[0], value
+        if _is_actual_number(original_result) and original_result == 0:
+            return False
+        return not original_result
+
+    def _deep_pipe(self, node, value):
+        result = value
+        for child in node.children:
+            result = yield child, result
+        return result
+
+    def _deep_projection(self, node, value):
+        base = yield node.children[0], value
+        allow_string = False
+        first_child = node.children[0]
+        if first_child.tag == INDEX_EXPRESSION:
+            nested_children = first_child.children
+            if len(nested_children) > 1 and nested_children[1].tag == SLICE:
+                allow_string = True
+        if isinstance(base, string_type) and allow_string:
+            return (yield node.children[1], base)
+        if not isinstance(base, list):
+            return None
+        collected = []
+        for element in base:
+            current = yield node.children[1], element
+            if current is not None:
+                collected.append(current)
+        return collected
+
+    def _deep_let_expression(self, node, value):
+        children = node.children
+        frame = []
+        for assign in children[:-1]:
+            frame.append((yield assign, value))
+        frames = self._frames
+        frames.append(frame)
+        result = yield children[-1], value
+        frames.pop()
+        return result
+
+    def _deep_assign(self, node, value):
+        return (yield node.children[0], value)
+
+    def _deep_ternary_operator(self, node, value):
+        evaluation = yield node.children[0], value
+        if self._is_false(evaluation):
+            return (yield node.children[2], value)
+        return (yield node.children[1], value)
+
+    def _deep_value_projection(self, node, value):
+        base = yield node.children[0], value
+        try:
+            base = base.values()
+        except AttributeError:
+            return None
+        collected = []
+        for element in base:
+            current = yield node.children[1], element
+            if current is not None:
+                collected.append(current)
+        return collected
+
+
+class LimitedTreeInterpreter(TreeInterpreter):
+    """Interpreter that enforces the evaluation limits of ``Options``."""
+    # How many nodes are visited between two checks of the clock.
+    _CLOCK_INTERVAL = 1024
+    # The nodes that build new lists or objects, as opposed to
+    # returning values found in the document.
+    _BUILDERS = frozenset(TAGS[name] for name in [
+        'projection', 'value_projection', 'filter_projection', 'flatten',
+        'multi_select_list', 'multi_select_dict', 'function_expression',
+        'slice',
+    ])
+
+    def __init__(self, options=None, clock=time.monotonic):
+        super(LimitedTreeInterpreter, self).__init__(options)
+        options = self._options
+        infinity = float('inf')
+        self._max_steps = infinity
+        if options.max_steps is not None:
+            self._max_steps = options.max_steps
+        self._max_result_size = infinity
+        if options.max_result_size is not None:
+            self._max_result_size = options.max_result_size
+        self._clock = clock
+        self._start = clock()
+        self._deadline = infinity
+        if options.timeout is not None:
+            self._deadline = self._start + options.timeout
+        self._steps = 0
+        self._elements = 0
+
+    def visit(self, node, *args, **kwargs):
+        self._step()
+        result = super(LimitedTreeInterpreter, self).visit(
+            node, *args, **kwargs)
+        if node.tag in self._BUILDERS:
+            self._count_elements(result)
+        return result
+
+    def _deep_generator(self, node, value):
+        self._step()
+        result = yield from super(LimitedTreeInterpreter,
+                                  self)._deep_generator(node, value)
+        if node.tag in self._BUILDERS:
+            self._count_elements(result)
+        return result
+
+    def _step(self):
+        self._steps += 1
+        if self._steps > self._max_steps:
+            self._limit_exceeded('max_steps', self._max_steps)
+        if not self._steps % self._CLOCK_INTERVAL and \
+                self._clock() > self._deadline:
+            self._limit_exceeded('timeout', self._options.timeout)
+
+    def _count_elements(self, result):
+        if isinstance(result, (list, dict)):
+            self._elements += len(result)
+            if self._elements > self._max_result_size:
+                self._limit_exceeded('max_result_size',
+                                     self._max_result_size)
+
+    def _flatten(self, base):
+        # Flattening doesn't visit any node per element, so the size of
+        # the result is checked while it is being built.
+        if not isinstance(base, list):
+            return None
+        merged_list = []
+        remaining = self._max_result_size - self._elements
+        for element in base:
+            if isinstance(element, list):
+                merged_list.extend(element)
+            else:
+                merged_list.append(element)
+            if len(merged_list) > remaining:
+                self._elements += len(merged_list)
+                self._limit_exceeded('max_result_size',
+                                     self._max_result_size)
+        return merged_list
+
+    @property
+    def stats(self):
+        return {
+            'steps': self._steps,
+            'elapsed': self._clock() - self._start,
+            'elements': self._elements,
+        }
+
+    def _limit_exceeded(self, limit, value):
+        raise exceptions.EvaluationLimitExceededError(limit, value,
+                                                      self.stats)
+
+
+def create_interpreter(options=None):
+    """Create the interpreter to use for ``options``."""
+    if options is not None and options.has_limits():
+        return LimitedTreeInterpreter(options)
+    return TreeInterpreter(options)
+
 
 class GraphvizVisitor(Visitor):
     def __init__(self):
@@ -404,17 +864,33 @@ class GraphvizVisitor(Visitor):
 
     def visit(self, node, *args, **kwargs):
         self._lines.append('digraph AST {')
-        current = '%s%s' % (node['type'], self._count)
+        current = '%s%s' % (node.type, self._count)
         self._count += 1
         self._visit(node, current)
         self._lines.append('}')
         return '\n'.join(self._lines)
 
     def _visit(self, node, current):
-        self._lines.append('%s [label="%s(%s)"]' % (
-            current, node['type'], node.get('value', '')))
-        for child in node.get('children', []):
-            child_name = '%s%s' % (child['type'], self._count)
+        # Depth first, with a stack of the children left to visit rather
+        # than by recursion, so that trees of any depth are rendered.
+        self._lines.append('%s [label="%s"]' % (current, self._label(node)))
+        stack = [(current, iter(node.children))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                # Slice bounds, and the depth and slot of resolved
+                # variables, aren't nodes.
+                if isinstance(child, Node):
+                    break
+            else:
+                stack.pop()
+                continue
+            child_name = '%s%s' % (child.type, self._count)
             self._count += 1
             self._lines.append('  %s -> %s' % (current, child_name))
-            self._visit(child, child_name)
+            self._lines.append(
+                '%s [label="%s"]' % (child_name, self._label(child)))
+            stack.append((child_name, iter(child.children)))
+
+    def _label(self, node):
+        return '%s(%s)' % (node.type, node.get('value', ''))
@@ -0,0 +1,148 @@
+import gc
+import sys
+import weakref
+from tests import unittest
+
+import jmespath
+from jmespath import ast
+from jmespath import lexer
+from jmespath import parser
+
+
+class TestNode(unittest.TestCase):
+    def test_reads_like_a_dict(self):
+        node = ast.field('foo')
+        self.assertEqual(node.tag, ast.FIELD)
+        self.assertEqual(node['type'], 'field')
+        self.assertEqual(node['value'], 'foo')
+        self.assertEqual(node['children'], [])
+        self.assertEqual(node.get('value'), 'foo')
+        self.assertEqual(sorted(node.keys()), ['children', 'type', 'value'])
+        self.assertIn('value', node)
+        with self.assertRaises(KeyError):
+            node['start']
+
+    def test_nodes_without_value(self):
+        node = ast.current_node()
+        self.assertNotIn('value', node)
+        self.assertEqual(node.get('value', ''), '')
+        with self.assertRaises(KeyError):
+            node['value']
+        self.assertEqual(node, {'type': 'current', 'children': []})
+        self.assertNotEqual(node, {'type': 'current', 'children': [],
+                                   'value': None})
+
+    def test_compares_with_nested_dicts(self):
+        parsed = jmespath.compile('foo[0]').parsed
+        expected = {'type': 'index_expression', 'children': [
+            {'type': 'field', 'children': [], 'value': 'foo'},
+            {'type': 'index', 'children': [], 'value': 0}]}
+        self.assertEqual(parsed, expected)
+        self.assertEqual(expected, parsed)
+        self.assertEqual(parsed.as_dict(), expected)
+        self.assertIs(type(parsed.as_dict()['children'][0]), dict)
+        self.assertEqual(parsed, jmespath.compile('foo[0]').parsed)
+        self.assertNotEqual(parsed, jmespath.compile('foo[1]').parsed)
+
+    def test_repr_is_the_dict_repr(self):
+        node = ast.field('foo')
+        self.assertEqual(eval(repr(node)), node.as_dict())
+
+    def test_slice_children_are_not_nodes(self):
+        node = ast.slice(None, 2, None)
+        self.assertEqual(node.as_dict(), {'type': 'slice',
+                                          'children': [None, 2, None]})
+
+    def test_uses_slots(self):
+        self.assertFalse(hasattr(ast.field('foo'), '__dict__'))
+
+
+class TestShare(unittest.TestCase):
+    def parse(self, expression):
+        return parser.Parser()._do_parse(expression).parsed
+
+    def test_identical_subtrees_are_shared(self):
+        first = self.parse('metadata.name || foo[?a == `1`]')
+        second = self.parse('foo[?a == `1`] && metadata.name')
+        self.assertIs(first.children[0], second.children[1])
+        self.assertIs(first.children[1], second.children[0])
+        self.assertIsInstance(first.children, tuple)
+        self.assertEqual(first, {
+            'type': 'or_expression',
+            'children': [second.children[1].as_dict(),
+                         second.children[0].as_dict()]})
+
+    def test_strings_are_interned(self):
+        name = ''.join(['some', '_field'])
+        node = ast.share(ast.field(name))
+        self.assertIs(node.value, sys.intern('some_field'))
+
+    def test_equal_values_of_other_types_are_not_shared(self):
+        one, one_float, true = [self.parse(e).children[1] for e in
+                                ('a == `1`', 'a == `1.0`', 'a == `true`')]
+        self.assertIs(type(one.value), int)
+        self.assertIs(type(one_float.value), float)
+        self.assertIs(type(true.value), bool)
+
+    def test_mutable_literals_are_not_shared(self):
+        first = self.parse('a || `[1, 2]`')
+        second = self.parse('a || `[1, 2]`')
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.children[1], second.children[1])
+        self.assertIs(first.children[0], second.children[0])
+
+    def test_slices(self):
+        self.assertIs(self.parse('foo[1:2]'), self.parse('foo[1:2]'))
+        self.assertIsNot(self.parse('foo[1:2]'), self.parse('foo[1:3]'))
+        self.assertIsNot(self.parse('foo[:2]'), self.parse('foo[0:2]'))
+
+    def test_unused_subtrees_are_released(self):
+        ref = weakref.ref(self.parse('released_field_name'))
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_candidates_are_bounded(self):
+        candidates = ast._CANDIDATES
+        limit = ast.MAX_CANDIDATES
+        ast.MAX_CANDIDATES = 2
+        try:
+            first = self.parse('candidate.a')
+            for i in range(3):
+                self.parse('candidate.b%d' % i)
+            self.assertLessEqual(len(candidates), 2)
+            # Seen too long ago to be shared, but its leaves are.
+            second = self.parse('candidate.a')
+            self.assertIsNot(first, second)
+            self.assertIs(first.children[0], second.children[0])
+            self.assertIs(self.parse('candidate.a'), second)
+        finally:
+            ast.MAX_CANDIDATES = limit
+
+    def test_deeply_nested_trees(self):
+        # Deeper than the recursion limit, with fewer subtrees than
+        # MAX_CANDIDATES.
+        expression = '(a || ' * 2000 + 'b' + ')' * 2000
+        self.assertIs(self.parse(expression), self.parse(expression))
+
+    def test_unshare(self):
+        shared = self.parse('[a.b, c || a.b]')
+        self.assertIs(shared.children[0], shared.children[1].children[1])
+        copy = ast.unshare(shared)
+        self.assertEqual(copy, shared)
+        self.assertIsNot(copy.children[0], copy.children[1].children[1])
+        self.assertIsNot(copy.children[0].children[0],
+                         copy.children[1].children[1].children[0])
+        expression = '(a || ' * 2000 + 'b' + ')' * 2000
+        copy = ast.unshare(self.parse(expression))
+        self.assertTrue(ast.is_deep(copy))
+        self.assertFalse(ast.is_deep(copy.children[0]))
+
+
+class TestToken(unittest.TestCase):
+    def test_reads_like_a_dict(self):
+        token = list(lexer.Lexer().tokenize('foo'))[0]
+        self.assertEqual(token.type, 'unquoted_identifier')
+        self.assertEqual(token['value'], 'foo')
+        self.assertEqual(token, {'type': 'unquoted_identifier',
+                                 'value': 'foo', 'start': 0, 'end': 3})
+        self.assertFalse(hasattr(token, '__dict__'))
@@ -0,0 +1,221 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from tests import unittest
+
+import jmespath
+from jmespath import parser
+
+from benchmarks import compliance
+from benchmarks import fork
+from benchmarks import join
+from benchmarks import memory
+from benchmarks import parsing
+from benchmarks import report
+from benchmarks import scaling
+from benchmarks import timing
+from benchmarks.__main__ import main
+
+
+BENCH_FILE = [
+    {
+        'given': {'a': {'b': [1, 2, 3]}},
+        'cases': [
+            {'expression': 'a.b', 'bench': 'parse'},
+            {'expression': 'a.b[*]', 'bench': 'interpret'},
+            {'expression': 'a', 'result': {'b': [1, 2, 3]}},
+            {'expression': 'a.b[0]', 'bench': 'full'},
+        ],
+    },
+]
+
+
+class TestComplianceBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tempdir, 'compliance')
+        os.mkdir(self.directory)
+        with open(os.path.join(self.directory, 'benchmarks.json'), 'w') as f:
+            json.dump(BENCH_FILE, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_collects_only_bench_cases(self):
+        cases = compliance.collect([self.directory])
+        self.assertEqual([case.name for case in cases], [
+            'compliance/benchmarks.json,0,0 parse',
+            'compliance/benchmarks.json,0,1 interpret',
+            'compliance/benchmarks.json,0,3 full',
+        ])
+        self.assertEqual(cases[1].function()(), [1, 2, 3])
+        self.assertEqual(cases[2].function()(), 1)
+
+    def test_run_and_compare(self):
+        first = os.path.join(self.tempdir, 'first.json')
+        second = os.path.join(self.tempdir, 'second.json')
+        for output in (first, second):
+            self.assertEqual(main([
+                'run', '-d', self.directory, '--min-time', '0.001',
+                '--repeat', '2', '--format', 'json', '-o', output]), 0)
+        results = report.load(first)
+        self.assertEqual(len(results), 3)
+        self.assertGreater(results[0]['value'], 0)
+        self.assertEqual(len(results[0]['samples']), 2)
+        self.assertEqual(main(['compare', first, second,
+                               '--threshold', '1000']), 0)
+
+
+class TestReport(unittest.TestCase):
+    def test_compare_flags_regressions(self):
+        baseline = [report.ops_per_sec('a', [100.0]),
+                    report.ops_per_sec('b', [100.0]),
+                    report.result('c', 'peak_bytes', [100.0], 'B', False)]
+        current = [report.ops_per_sec('a', [90.0]),
+                   report.ops_per_sec('b', [98.0]),
+                   report.result('c', 'peak_bytes', [120.0], 'B', False),
+                   report.ops_per_sec('d', [1.0])]
+        comparisons = report.compare(baseline, current, threshold=0.05)
+        self.assertEqual([(c[0], c[-1]) for c in comparisons],
+                         [('a', True), ('b', False), ('c', True)])
+        self.assertAlmostEqual(comparisons[0][4], -0.1)
+        self.assertAlmostEqual(comparisons[2][4], -0.2)
+        self.assertIn('REGRESSION', report.format_comparisons(comparisons))
+
+    def test_round_trip(self):
+        stream = io.StringIO()
+        report.dump([report.ops_per_sec('a', [1.0, 3.0])], stream)
+        loaded = json.loads(stream.getvalue())
+        self.assertEqual(loaded['version'], report.FORMAT_VERSION)
+        self.assertEqual(loaded['results'][0]['value'], 2.0)
+        self.assertIn('python', loaded['metadata'])
+
+
+class TestTiming(unittest.TestCase):
+    def test_measure_is_calibrated(self):
+        samples = timing.measure(lambda: None, min_time=0.001, repeat=3)
+        self.assertEqual(len(samples), 3)
+        self.assertTrue(all(s > 0 for s in samples))
+
+    def test_stdev(self):
+        self.assertEqual(timing.stdev([1.0]), 0.0)
+        self.assertAlmostEqual(timing.stdev([1.0, 3.0]), 2 ** 0.5)
+
+
+class TestScaling(unittest.TestCase):
+    def test_generators_are_seeded(self):
+        for generator in scaling.GENERATORS.values():
+            self.assertEqual(generator(100, seed=1), generator(100, seed=1))
+        self.assertNotEqual(scaling.long_document(100, seed=1),
+                            scaling.long_document(100, seed=2))
+        self.assertEqual(len(scaling.long_document(100)), 100)
+        self.assertEqual(len(scaling.wide_document(100)), 100)
+        deep = scaling.deep_document(1000)
+        self.assertEqual(sum(len(inner) for outer in deep
+                             for inner in outer), 1000)
+
+    def test_fit_exponent(self):
+        sizes = [10, 100, 1000]
+        self.assertAlmostEqual(scaling.fit_exponent(
+            sizes, [3.0 * n for n in sizes]), 1.0)
+        self.assertAlmostEqual(scaling.fit_exponent(
+            sizes, [0.5 * n * n for n in sizes]), 2.0)
+
+    def test_run_case(self):
+        case = scaling.ScalingCase('projection', 'long', '[*].value',
+                                   'quadratic')
+        results, passed = scaling.run_case(case, sizes=[10, 100, 1000],
+                                           min_time=0.001, repeat=1)
+        self.assertTrue(passed)
+        self.assertEqual([r['name'] for r in results], [
+            'scaling/projection/10', 'scaling/projection/100',
+            'scaling/projection/1000', 'scaling/projection'])
+        self.assertEqual(results[-1]['metric'], 'growth_exponent')
+        self.assertFalse(results[-1]['higher_is_better'])
+
+
+class TestParsing(unittest.TestCase):
+    def test_generated_expressions_parse(self):
+        for name, generator in parsing.GENERATORS.items():
+            expression = generator(50, seed=1)
+            self.assertEqual(expression, generator(50, seed=1))
+            self.assertGreater(len(expression), 50)
+            parsed = parser.Parser()._do_parse(expression)
+            if name in parsing.SEARCHED:
+                self.assertIsNotNone(parsed.search(parsing.DOCUMENT))
+
+    def test_run_case(self):
+        results, passed = parsing.run_case('field_chain', sizes=[10, 100],
+                                           min_time=0.001, repeat=1)
+        self.assertEqual([(r['name'], r['metric']) for r in results], [
+            ('parse/field_chain/10', 'tokens_per_sec'),
+            ('parse/field_chain/100', 'tokens_per_sec'),
+            ('parse/field_chain', 'growth_exponent')])
+        # Ten fields, nine dots and the end of the expression.
+        self.assertEqual(results[0]['tokens'], 20)
+        self.assertTrue(results[0]['higher_is_better'])
+
+
+class TestFork(unittest.TestCase):
+    def test_expressions_are_distinct(self):
+        expressions = fork.expressions(50, seed=1)
+        self.assertEqual(len(set(expressions)), 50)
+        self.assertEqual(expressions, fork.expressions(50, seed=1))
+
+    @unittest.skipUnless(fork.supported(), 'needs fork and smaps_rollup')
+    def test_run(self):
+        results = fork.run(size=50, workers=1, workloads=['hot'])
+        self.assertEqual([r['name'] for r in results], [
+            'fork/hot/plain', 'fork/hot/frozen', 'fork/catalog/frozen',
+            'fork/catalog/plain'])
+
+
+class TestJoin(unittest.TestCase):
+    def test_document_is_seeded(self):
+        self.assertEqual(join.document(100, seed=1),
+                         join.document(100, seed=1))
+        self.assertEqual(len(join.document(100)['customers']), 10)
+
+    def test_run(self):
+        results = join.run(sizes=[20, 50], nested_max_size=20,
+                           min_time=0.001, repeat=1)
+        self.assertEqual([r['name'] for r in results], [
+            'join/hash_join/20', 'join/nested_filter/20',
+            'join/hash_join/50'])
+
+
+class TestMemory(unittest.TestCase):
+    def test_deep_sizeof_counts_owned_objects(self):
+        inner = list(range(100))
+        self.assertGreater(memory.deep_sizeof({'a': inner}),
+                           memory.deep_sizeof(inner))
+        # Shared objects are only counted once.
+        self.assertEqual(memory.deep_sizeof([inner, inner]),
+                         memory.deep_sizeof([inner]) + 8)
+
+    def test_trace(self):
+        value, peak, net = memory.trace(lambda: [0] * 10000)
+        self.assertEqual(len(value), 10000)
+        self.assertGreaterEqual(peak, net)
+        self.assertGreaterEqual(net, 10000 * 8)
+
+    def test_measure_case(self):
+        case = memory.MemoryCase('case', 'a[*].b', {'a': [{'b': 1}]})
+        results = memory.measure_case(case, repeat=2)
+        self.assertEqual([(r['name'], r['metric']) for r in results], [
+            ('case parse', 'peak_bytes'), ('case parse', 'net_bytes'),
+            ('case resident', 'resident_bytes'),
+            ('case search', 'peak_bytes'), ('case search', 'net_bytes')])
+        self.assertTrue(all(not r['higher_is_better'] for r in results))
+        self.assertEqual(len(results[0]['samples']), 2)
+
+    def test_compile_cache_is_restored(self):
+        jmespath.compile('memory.restored')
+        cache = memory.measure_compile_cache([
+            memory.MemoryCase('case', 'foo.bar', {})])
+        self.assertEqual(cache['entries'], 1)
+        self.assertGreater(cache['value'], 0)
+        self.assertIn(('memory.restored', (False, False)),
+                      parser.Parser._CACHE)
@@ -0,0 +1,164 @@
+from datetime import datetime
+from tests import unittest
+
+import jmespath
+from jmespath import exceptions
+from jmespath.cache import ResultCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResultCache(max_size=2, ttl=10, clock=self.clock)
+        self.options = jmespath.Options(result_cache=self.cache)
+
+    def search(self, expression, data):
+        return jmespath.search(expression, data, options=self.options)
+
+    def test_identical_payloads_share_results(self):
+        first = self.cache.loads('{"foo": {"bar": [1, 2]}}')
+        second = self.cache.loads('{"foo": {"bar": [1, 2]}}')
+        self.assertEqual(self.search('foo.bar', first), [1, 2])
+        self.assertEqual(self.search('foo.bar', second), [1, 2])
+        self.assertEqual(self.cache.stats['hits'], 1)
+        self.assertEqual(self.cache.stats['misses'], 1)
+        self.assertEqual(self.cache.stats['hit_rate'], 0.5)
+
+    def test_registered_documents_are_keyed_by_identity(self):
+        first = self.cache.register({'foo': 'bar'})
+        second = self.cache.register({'foo': 'bar'})
+        self.search('foo', first)
+        self.search('foo', first)
+        self.search('foo', second)
+        self.assertEqual(self.cache.stats['hits'], 1)
+        self.assertEqual(self.cache.stats['misses'], 2)
+
+    def test_unregistered_documents_are_hashed_by_content(self):
+        self.search('foo', {'foo': 'bar', 'baz': 1})
+        self.search('foo', {'baz': 1, 'foo': 'bar'})
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_different_content_misses(self):
+        self.assertEqual(self.search('foo', {'foo': 1}), 1)
+        self.assertEqual(self.search('foo', {'foo': 2}), 2)
+        self.assertEqual(self.cache.stats['hits'], 0)
+
+    def test_variables_are_part_of_the_key(self):
+        data = self.cache.register({'a': 1, 'b': 2})
+        for name in ['a', 'b', 'a']:
+            result = jmespath.search('[$name, a]', data, options=self.options,
+                                     variables={'name': name})
+            self.assertEqual(result, [name, 1])
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_options_are_part_of_the_key(self):
+        from collections import OrderedDict
+        from jmespath import functions
+
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['string']})
+            def _func_length(self, s):
+                return -1
+
+        data = self.cache.register({'a': 'xyz'})
+        plain = self.options
+        ordered = jmespath.Options(result_cache=self.cache,
+                                   dict_cls=OrderedDict)
+        custom = jmespath.Options(result_cache=self.cache,
+                                  custom_functions=CustomFunctions())
+        self.assertEqual(
+            jmespath.search('length(a)', data, options=plain), 3)
+        self.assertEqual(
+            jmespath.search('length(a)', data, options=custom), -1)
+        self.assertIs(
+            type(jmespath.search('{a: a}', data, options=ordered)),
+            OrderedDict)
+        self.assertIs(
+            type(jmespath.search('{a: a}', data, options=plain)), dict)
+        self.assertEqual(self.cache.stats['hits'], 0)
+
+    def test_unregistered_documents_can_bypass_the_cache(self):
+        cache = ResultCache(hash_unregistered=False)
+        options = jmespath.Options(result_cache=cache)
+        for _ in range(2):
+            jmespath.search('foo', {'foo': 'bar'}, options=options)
+        self.assertEqual(cache.stats['size'], 0)
+        data = cache.register({'foo': 'bar'})
+        for _ in range(2):
+            jmespath.search('[foo, $x]', data, options=options,
+                            variables={'x': 1})
+        self.assertEqual(cache.stats['hits'], 1)
+
+    def test_results_are_copied(self):
+        data = self.cache.loads('{"foo": [1, 2]}')
+        result = self.search('foo', data)
+        result.append(3)
+        self.assertEqual(self.search('foo', data), [1, 2])
+        self.search('foo', data).append(4)
+        self.assertEqual(self.search('foo', data), [1, 2])
+
+    def test_least_recently_used_results_are_evicted(self):
+        data = self.cache.register({'a': 1, 'b': 2, 'c': 3})
+        self.search('a', data)
+        self.search('b', data)
+        self.search('a', data)
+        self.search('c', data)
+        self.assertEqual(self.cache.stats['evictions'], 1)
+        self.search('a', data)
+        self.assertEqual(self.cache.stats['hits'], 2)
+        self.search('b', data)
+        self.assertEqual(self.cache.stats['hits'], 2)
+
+    def test_results_expire(self):
+        data = self.cache.register({'foo': 'bar'})
+        self.search('foo', data)
+        self.clock.now = 5
+        self.search('foo', data)
+        self.clock.now = 20
+        self.search('foo', data)
+        stats = self.cache.stats
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['expired'], 1)
+
+    def test_unserializable_documents_are_not_cached(self):
+        data = {'foo': datetime(2020, 1, 1)}
+        self.assertEqual(self.search('foo', data), datetime(2020, 1, 1))
+        self.search('foo', data)
+        self.assertEqual(self.cache.stats['size'], 0)
+        self.assertEqual(self.cache.stats['misses'], 2)
+
+    def test_documents_that_are_not_plain_json_are_not_cached(self):
+        # json.dumps() writes both of these as {"1": "a"}.
+        self.assertEqual(self.search('keys(@)', {1: 'a'}), [1])
+        self.assertEqual(self.search('keys(@)', {'1': 'a'}), ['1'])
+        self.assertEqual(self.search('[0]', ('a',)), None)
+        self.assertEqual(self.search('[0]', ['a']), 'a')
+        self.assertEqual(self.search('a[0]', {'a': (1,)}), None)
+        self.assertEqual(self.search('a[0]', {'a': [1]}), 1)
+        self.assertEqual(self.cache.stats['hits'], 0)
+        self.assertIsNone(self.cache.fingerprint({1: 'a'}))
+        self.assertIsNone(self.cache.fingerprint({'a': (1,)}))
+        self.assertIsNotNone(self.cache.fingerprint({'a': [1, None]}))
+
+    def test_limits_are_part_of_the_key(self):
+        data = {'foo': [1, 2, 3]}
+        self.assertEqual(self.search('foo[*]', data), [1, 2, 3])
+        options = jmespath.Options(result_cache=self.cache, max_steps=2)
+        with self.assertRaises(exceptions.EvaluationLimitExceededError):
+            jmespath.search('foo[*]', data, options=options)
+        self.assertEqual(self.cache.stats['hits'], 0)
+
+    def test_clear(self):
+        data = self.cache.register({'foo': 'bar'})
+        self.search('foo', data)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats['size'], 0)
@@ -0,0 +1,75 @@
+import gc
+from tests import unittest
+
+import jmespath
+from jmespath import ast
+from jmespath import parser
+from jmespath.catalog import Catalog
+
+
+class TestCatalog(unittest.TestCase):
+    def test_add_get_and_search(self):
+        catalog = Catalog(['foo.bar', 'foo[0]'])
+        self.assertEqual(len(catalog), 2)
+        self.assertIn('foo.bar', catalog)
+        self.assertEqual(sorted(catalog), ['foo.bar', 'foo[0]'])
+        parsed = catalog.get('foo.bar')
+        self.assertEqual(parsed.expression, 'foo.bar')
+        self.assertIs(catalog.add('foo.bar'), parsed)
+        self.assertIsNone(catalog.get('baz'))
+        self.assertEqual(catalog.search('foo.bar', {'foo': {'bar': 1}}), 1)
+        self.assertEqual(catalog.search('baz', {'baz': 2}), 2)
+        self.assertIn('baz', catalog)
+
+    def test_options_must_match(self):
+        legacy = jmespath.Options(enable_legacy_literals=True)
+        catalog = Catalog(['`foo`'], legacy)
+        self.assertIsNone(catalog.get('`foo`'))
+        self.assertEqual(catalog.get('`foo`', legacy).search({}), 'foo')
+        self.assertEqual(catalog.search('`foo`', {}), 'foo')
+
+    def test_freeze_compacts_the_asts(self):
+        expression = 'foo[?a > `1`].{b: b, c: c[1:2]} || bar'
+        catalog = Catalog([expression])
+        self.assertFalse(catalog.frozen)
+        original = parser.Parser()._do_parse(expression).parsed
+        catalog.freeze()
+        self.assertTrue(catalog.frozen)
+        frozen = catalog.get(expression).parsed
+        stack = [frozen]
+        while stack:
+            node = stack.pop()
+            self.assertIsInstance(node.children, tuple)
+            stack.extend(c for c in node.children if isinstance(c, ast.Node))
+        self.assertEqual(frozen, original)
+        self.assertEqual(frozen, original.as_dict())
+        data = {'foo': [{'a': 2, 'b': 3, 'c': [4, 5, 6]}, {'a': 0}]}
+        self.assertEqual(catalog.search(expression, data),
+                         [{'b': 3, 'c': [5]}])
+        catalog.add('baz')
+        self.assertFalse(catalog.frozen)
+
+    def test_gc_freeze(self):
+        if not hasattr(gc, 'freeze'):
+            self.skipTest('gc.freeze() needs Python 3.7 or later')
+        catalog = Catalog(['foo'])
+        try:
+            # Only when asked for.
+            catalog.freeze()
+            self.assertEqual(gc.get_freeze_count(), 0)
+            catalog.freeze(gc_freeze=True)
+            self.assertGreater(gc.get_freeze_count(), 0)
+        finally:
+            gc.unfreeze()
+        self.assertEqual(catalog.search('foo', {'foo': 1}), 1)
+
+    def test_compile_uses_the_catalog(self):
+        catalog = Catalog(['foo.bar'])
+        options = jmespath.Options(compiled_cache=catalog)
+        parser.Parser.purge()
+        try:
+            self.assertIs(jmespath.compile('foo.bar', options),
+                          catalog.get('foo.bar'))
+            self.assertEqual(jmespath.search('foo', {'foo': 2}, options), 2)
+        finally:
+            parser.Parser.purge()
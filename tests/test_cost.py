@@ -0,0 +1,134 @@
+from tests import unittest
+
+import jmespath
+from jmespath import cost
+from jmespath import exceptions
+
+
+class TestComplexityNotation(unittest.TestCase):
+    def test_round_trip(self):
+        for text in ['O(1)', 'O(n)', 'O(log n)', 'O(n log n)', 'O(n^2)',
+                     'O(n^3 log^2 n)']:
+            self.assertEqual(
+                cost.format_complexity(cost.parse_complexity(text)), text)
+
+    def test_invalid_notation(self):
+        with self.assertRaises(ValueError):
+            cost.parse_complexity('O()')
+        with self.assertRaises(ValueError):
+            cost.parse_complexity('quadratic')
+
+
+class TestCostEstimator(unittest.TestCase):
+    def assert_complexity(self, expression, expected):
+        estimate = jmespath.compile(expression).cost()
+        self.assertEqual(estimate.complexity, expected,
+                         '%s: %s' % (expression, estimate))
+
+    def test_constant(self):
+        self.assert_complexity('foo.bar[0]', 'O(1)')
+        self.assert_complexity('length(foo)', 'O(1)')
+
+    def test_projections_are_linear(self):
+        self.assert_complexity('foo[*].bar', 'O(n)')
+        self.assert_complexity('foo[?a > `1`].b', 'O(n)')
+        self.assert_complexity('*.foo', 'O(n)')
+        self.assert_complexity('foo[]', 'O(n)')
+
+    def test_nested_projections_over_parts_are_linear(self):
+        self.assert_complexity('a[*].b[*].c', 'O(n)')
+        self.assert_complexity('a[*].b[]', 'O(n)')
+
+    def test_sorting(self):
+        self.assert_complexity('sort(foo)', 'O(n log n)')
+        self.assert_complexity('sort_by(foo, &bar)', 'O(n log n)')
+        self.assert_complexity('a[*].sort_by(b, &c)', 'O(n log n)')
+
+    def test_root_reference_inside_projection_is_quadratic(self):
+        self.assert_complexity(
+            'orders[*].{o: @, c: $.customers[?id == @.customer_id] | [0]}',
+            'O(n^2)')
+        self.assert_complexity('a[*].sort_by($.b, &c)', 'O(n^2 log n)')
+
+    def test_variable_inside_projection_is_quadratic(self):
+        self.assert_complexity('let $x = a in b[*].[$x[?c]]', 'O(n^2)')
+
+    def test_group_by(self):
+        self.assert_complexity('group_by(foo, &bar)', 'O(n)')
+        self.assert_complexity('count_by(foo, &bar)', 'O(n)')
+        self.assert_complexity('avg_by(foo, &bar, &baz)', 'O(n)')
+
+    def test_hash_join(self):
+        self.assert_complexity('hash_join(a, b, &c, &d)', 'O(n)')
+
+    def test_let_bindings_do_not_leak_out_of_projections(self):
+        bound = jmespath.compile(
+            '[b[*].[let $x = `[1]` in $x], $x[*].a]').cost()
+        unbound = jmespath.compile(
+            '[$x[*].a, b[*].[let $x = `[1]` in $x]]').cost()
+        self.assertEqual(bound.cost, unbound.cost)
+
+    def test_estimates_are_computed_once(self):
+        parsed = jmespath.compile('foo[*].bar')
+        self.assertIs(parsed.cost(), parsed.cost())
+        self.assertIs(parsed.cost({'foo': 10}), parsed.cost({'foo': 10}))
+        self.assertIsNot(parsed.cost(), parsed.cost({'foo': 10}))
+        self.assertIsNot(parsed.cost(), parsed.cost(default_cardinality=10))
+
+    def test_cardinality_hints(self):
+        parsed = jmespath.compile('a[*].b[*].c')
+        small = parsed.cost({'a': 10, 'b': 5})
+        large = parsed.cost({'a': 1000, 'b': 5})
+        self.assertEqual(small.complexity, large.complexity)
+        self.assertGreater(large.cost, 50 * small.cost)
+        self.assertGreater(small.cost, 50)
+
+    def test_function_class_ignores_the_order_of_arguments(self):
+        for expression in ['a[?contains($.ids, id)]',
+                           'a[?contains(id, $.ids)]',
+                           'a[*].contains($.ids, id)',
+                           'a[*].contains(id, $.ids)']:
+            parsed = jmespath.compile(expression)
+            for hints in [None, {'ids': 10}, {'id': 1000},
+                          {'$': 5, 'a': 1000}]:
+                self.assertEqual(parsed.cost(hints).complexity, 'O(n^2)',
+                                 '%s %s' % (expression, hints))
+
+    def test_default_cardinality(self):
+        parsed = jmespath.compile('foo[*].bar')
+        self.assertLess(parsed.cost(default_cardinality=10).cost,
+                        parsed.cost(default_cardinality=1000).cost)
+
+
+class TestCompileTimeBudget(unittest.TestCase):
+    def test_expression_over_complexity_budget_is_rejected(self):
+        options = jmespath.Options(max_complexity='O(n log n)')
+        self.assertEqual(
+            jmespath.compile('sort_by(foo, &bar)', options).expression,
+            'sort_by(foo, &bar)')
+        with self.assertRaises(exceptions.CostBudgetExceededError) as e:
+            jmespath.compile('foo[*].[$.bar[?a == @.b]]', options)
+        self.assertEqual(e.exception.estimate.complexity, 'O(n^2)')
+        self.assertIn('O(n^2)', str(e.exception))
+
+    def test_expression_over_cost_budget_is_rejected(self):
+        options = jmespath.Options(max_cost=500,
+                                   cardinality_hints={'foo': 1000})
+        with self.assertRaises(exceptions.CostBudgetExceededError):
+            jmespath.search('foo[*].bar', {}, options)
+        self.assertIsNone(jmespath.search('bar[*].baz', {}, options))
+
+    def test_budget_is_estimated_once_per_expression(self):
+        options = jmespath.Options(max_cost=10)
+        estimates = []
+        for _ in range(2):
+            with self.assertRaises(exceptions.CostBudgetExceededError) as e:
+                jmespath.compile('foo[*].bar', options)
+            estimates.append(e.exception.estimate)
+        self.assertIs(estimates[0], estimates[1])
+
+    def test_budget_applies_to_cached_expressions(self):
+        jmespath.compile('foo[*].[$.bar[?a == @.b]]')
+        with self.assertRaises(exceptions.CostBudgetExceededError):
+            jmespath.compile('foo[*].[$.bar[?a == @.b]]',
+                             jmespath.Options(max_complexity='O(n)'))
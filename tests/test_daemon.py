@@ -0,0 +1,144 @@
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+from tests import unittest
+
+import jmespath
+from jmespath import daemon
+from jmespath import functions
+
+
+class FailingFunctions(functions.Functions):
+    @functions.signature({'types': ['number']})
+    def _func_explode(self, n):
+        return 1 / n
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'jp.sock')
+        self.server = daemon.Server(self.path, cache_size=2)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.tempdir)
+
+    def test_search(self):
+        with daemon.connect(self.path) as client:
+            response = client.request('foo.bar', b'{"foo": {"bar": [1]}}')
+            self.assertEqual(response, {'ok': True, 'output': '[\n    1\n]'})
+            response = client.request('foo', u'{"foo": "é"}')
+            self.assertEqual(response['output'], u'"é"')
+
+    def test_errors(self):
+        with daemon.connect(self.path) as client:
+            response = client.request('foo[', b'{}')
+            self.assertFalse(response['ok'])
+            self.assertEqual(response['error'], 'syntax-error')
+            self.assertEqual(client.request('length(@, @)', b'[]')['error'],
+                             'invalid-arity')
+            self.assertEqual(client.request('abs(@)', b'"a"')['error'],
+                             'invalid-type')
+            self.assertEqual(client.request('foo', b'{')['error'],
+                             'invalid-request')
+        self.assertEqual(self.server.stats['errors'], 4)
+
+    def test_unexpected_errors_are_reported(self):
+        self.server.options = jmespath.Options(
+            custom_functions=FailingFunctions())
+        with daemon.connect(self.path) as client:
+            response = client.request('explode(@)', b'0')
+            self.assertFalse(response['ok'])
+            self.assertEqual(response['error'], 'error')
+            # The connection is still usable.
+            self.assertEqual(client.request('explode(@)', b'4')['output'],
+                             '0.25')
+
+    def test_compiled_expressions_are_cached(self):
+        with daemon.connect(self.path) as client:
+            for expression in ['a', 'a', 'b', 'c', 'a']:
+                client.request(expression, b'{}')
+        self.assertEqual(self.server.stats['requests'], 5)
+        self.assertEqual(self.server.stats['hits'], 1)
+        self.assertEqual(self.server.stats['misses'], 4)
+
+    def test_rejects_oversized_frames(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        try:
+            sock.sendall(b'\xff\xff\xff\xff')
+            self.assertEqual(sock.recv(1), b'')
+        finally:
+            sock.close()
+
+    def test_connect_without_server(self):
+        self.assertIsNone(daemon.connect(
+            os.path.join(self.tempdir, 'missing.sock')))
+
+    def test_refuses_to_replace_a_live_server(self):
+        with self.assertRaises(OSError):
+            daemon.Server(self.path)
+
+    def test_socket_is_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_refuses_to_remove_other_files(self):
+        path = os.path.join(self.tempdir, 'other')
+        with open(path, 'w') as f:
+            f.write('data')
+        with self.assertRaises(OSError):
+            daemon.Server(path)
+        self.assertTrue(os.path.isfile(path))
+
+
+class TestDefaultSocketPath(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ.pop('JP_SOCKET', None)
+        os.environ.pop('XDG_RUNTIME_DIR', None)
+        self.gettempdir = tempfile.tempdir
+        tempfile.tempdir = self.tempdir
+
+    def tearDown(self):
+        tempfile.tempdir = self.gettempdir
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tempdir)
+
+    def test_environment(self):
+        os.environ['XDG_RUNTIME_DIR'] = self.tempdir
+        self.assertEqual(daemon.default_socket_path(), os.path.join(
+            self.tempdir, 'jp-%d.sock' % os.getuid()))
+        os.environ['JP_SOCKET'] = 'jp.sock'
+        self.assertEqual(daemon.default_socket_path(), 'jp.sock')
+
+    def test_private_directory_of_the_temporary_directory(self):
+        directory = os.path.join(self.tempdir, 'jp-%d' % os.getuid())
+        self.assertEqual(daemon.default_socket_path(),
+                         os.path.join(directory, 'jp.sock'))
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+        # Reused as long as it stays private.
+        self.assertEqual(daemon.default_socket_path(),
+                         os.path.join(directory, 'jp.sock'))
+        os.chmod(directory, 0o777)
+        with self.assertRaises(OSError):
+            daemon.default_socket_path()
+        self.assertIsNone(daemon.connect())
+
+    def test_refuses_a_symlink(self):
+        target = os.path.join(self.tempdir, 'target')
+        os.mkdir(target, 0o700)
+        os.symlink(target, os.path.join(self.tempdir,
+                                        'jp-%d' % os.getuid()))
+        with self.assertRaises(OSError):
+            daemon.default_socket_path()
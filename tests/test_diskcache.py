@@ -0,0 +1,160 @@
+import io
+import os
+import shutil
+import tempfile
+from tests import unittest
+
+import jmespath
+from jmespath import diskcache
+from jmespath import parser
+
+
+EXPRESSIONS = [
+    'foo.bar',
+    'people[?age > `30`].name | [0]',
+    'foo[1:-1:2].bar[::-1]',
+    '{a: a, "b c": `[1, {"d": null}]`, e: \'raw\'}',
+    '`1.5` + `123456789012345678901234567890` - `-3`',
+    '`true` && `false` || `null`',
+    'let $x = foo in $x.bar',
+    'sort_by(items, &price)[-1] == $.max',
+    u'"café".length(@)',
+    'a ? b : c',
+    '![*].a[].b',
+]
+
+
+class TestCompiledCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'cache.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_round_trip(self):
+        compiled = diskcache.precompile(EXPRESSIONS, self.path)
+        with diskcache.CompiledCache(self.path) as cache:
+            self.assertEqual(len(cache), len(EXPRESSIONS))
+            self.assertEqual(cache.parser_version,
+                             diskcache.parser_version())
+            for parsed in compiled:
+                loaded = cache.get(parsed.expression)
+                self.assertEqual(loaded.expression, parsed.expression)
+                self.assertEqual(loaded.parsed, parsed.parsed)
+            self.assertIsNone(cache.get('not.there'))
+            self.assertEqual(cache.stats, {
+                'hits': len(EXPRESSIONS), 'misses': 1,
+                'decoded': len(EXPRESSIONS)})
+
+    def test_deeply_nested_expressions(self):
+        expression = '(a || ' * 5000 + 'b' + ')' * 5000
+        diskcache.precompile([expression], self.path)
+        with diskcache.CompiledCache(self.path) as cache:
+            loaded = cache.get(expression)
+        self.assertEqual(loaded.search({'b': 1}), 1)
+
+    def test_compile_uses_the_cache(self):
+        diskcache.precompile(['foo.bar'], self.path)
+        cache = diskcache.CompiledCache(self.path)
+        options = jmespath.Options(compiled_cache=cache)
+        parser.Parser.purge()
+        try:
+            self.assertEqual(
+                jmespath.search('foo.bar', {'foo': {'bar': 1}}, options), 1)
+            self.assertEqual(jmespath.search('foo', {'foo': 2}, options), 2)
+        finally:
+            parser.Parser.purge()
+            cache.close()
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 1)
+
+    def test_load_all(self):
+        diskcache.precompile(EXPRESSIONS + EXPRESSIONS[:2], self.path)
+        with diskcache.CompiledCache(self.path) as cache:
+            self.assertEqual(cache.load_all(), len(EXPRESSIONS))
+            cache.get('foo.bar')
+            self.assertEqual(cache.stats['decoded'], len(EXPRESSIONS))
+
+    def test_options_must_match(self):
+        legacy = jmespath.Options(enable_legacy_literals=True)
+        diskcache.precompile(['`foo`'], self.path, legacy)
+        with diskcache.CompiledCache(self.path) as cache:
+            self.assertIsNone(cache.get('`foo`'))
+            self.assertEqual(cache.get('`foo`', legacy).search({}), 'foo')
+
+    def test_other_parsers_are_stale(self):
+        f = io.BytesIO()
+        diskcache.dump([jmespath.compile('foo')], f)
+        data = f.getvalue()
+        version = diskcache.parser_version().encode('utf-8')
+        with open(self.path, 'wb') as out:
+            out.write(data.replace(version, b'0' * len(version), 1))
+        with diskcache.CompiledCache(self.path) as cache:
+            self.assertTrue(cache.stale)
+            self.assertIsNone(cache.get('foo'))
+
+    def test_parser_version_covers_the_parser_code(self):
+        version = diskcache.parser_version()
+        self.assertNotIn(jmespath.__version__, version)
+        original = diskcache._PARSER_VERSION
+        diskcache._PARSER_VERSION = None
+        try:
+            self.assertEqual(diskcache.parser_version(), version)
+            node_types = diskcache.ast.NODE_TYPES
+            diskcache.ast.NODE_TYPES = node_types + ('new_node',)
+            diskcache._PARSER_VERSION = None
+            try:
+                self.assertNotEqual(diskcache.parser_version(), version)
+            finally:
+                diskcache.ast.NODE_TYPES = node_types
+        finally:
+            diskcache._PARSER_VERSION = original
+
+    def test_auto_parameterize_is_part_of_the_options(self):
+        options = jmespath.Options(auto_parameterize=True)
+        self.assertNotEqual(diskcache.options_key(options),
+                            diskcache.options_key())
+
+    def test_corrupted_entries_are_misses(self):
+        expressions = ['foo.bar', 'a || b', 'c[0]', 'd']
+        diskcache.precompile(expressions, self.path)
+        with diskcache.CompiledCache(self.path) as cache:
+            entries = [cache._index[expression] for expression in expressions]
+        with open(self.path, 'rb+') as f:
+            # An unknown tag, a value as the root, a string that isn't
+            # utf-8 and a truncated string.
+            for (offset, size), data in zip(entries[:3], [
+                    b'\xfe', b'\xff', b'\x00\x01\x00\x00\x00\x00s'
+                                    b'\x01\x00\x00\x00\xff']):
+                f.seek(offset)
+                f.write(data)
+            f.seek(entries[3][0] + entries[3][1] - 1)
+            f.write(b'\x00')
+            f.truncate(entries[3][0] + entries[3][1] - 1)
+        with diskcache.CompiledCache(self.path) as cache:
+            for expression in expressions:
+                self.assertIsNone(cache.get(expression))
+            self.assertEqual(cache.stats, {
+                'hits': 0, 'misses': len(expressions), 'decoded': 0})
+            options = jmespath.Options(compiled_cache=cache)
+            parser.Parser.purge()
+            self.assertEqual(
+                jmespath.compile('foo.bar', options).search(
+                    {'foo': {'bar': 1}}), 1)
+        data = diskcache.encode(parser.Parser().parse('a').parsed)
+        self.assertEqual(diskcache.decode(data, size=len(data)),
+                         {'type': 'field', 'children': [], 'value': 'a'})
+        with self.assertRaises(diskcache.CacheFormatError):
+            diskcache.decode(data + b'\x00', size=len(data) + 1)
+
+    def test_invalid_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a cache file')
+        with self.assertRaises(diskcache.CacheFormatError):
+            diskcache.CompiledCache(self.path)
+        diskcache.precompile(EXPRESSIONS, self.path)
+        with open(self.path, 'rb+') as f:
+            f.truncate(30)
+        with self.assertRaises(diskcache.CacheFormatError):
+            diskcache.CompiledCache(self.path)
@@ -5,6 +5,7 @@ import json
 
 import jmespath
 from jmespath import exceptions
+from jmespath import functions
 
 
 class TestFunctions(unittest.TestCase):
@@ -32,6 +33,12 @@ class TestFunctions(unittest.TestCase):
         # 4. Mention the actual type.
         self.assertIn('received: "number"', str(exception))
 
+    def test_value_error_message(self):
+        exception = exceptions.JMESPathValueError('f', 'x', 'y or z')
+        self.assertEqual(
+            str(exception),
+            'In function f(), invalid value: "x", expected: "y or z"')
+
     def test_singular_in_error_message(self):
         with self.assertRaises(exceptions.ArityError) as e:
             jmespath.search('length(@, @)', [0, 1])
@@ -55,3 +62,100 @@ class TestFunctions(unittest.TestCase):
         self.assertEqual(
             str(exception),
             'Expected at least 1 argument for function not_null(), received 0')
+
+
+class TestGroupBy(unittest.TestCase):
+    DATA = [{'k': 'a', 'v': 1}, {'k': 'b', 'v': 2}, {'k': None, 'v': 4},
+            {'k': 'a', 'v': 6}]
+
+    def test_group_by(self):
+        result = jmespath.search('group_by(@, &k)', self.DATA)
+        self.assertEqual(list(result.items()), [
+            ('a', [self.DATA[0], self.DATA[3]]), ('b', [self.DATA[1]])])
+
+    def test_evaluates_each_key_once(self):
+        calls = []
+
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': []})
+            def _func_key(self, item):
+                calls.append(item)
+                return item['k']
+
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        jmespath.search('group_by(@, &key(@))', self.DATA, options)
+        self.assertEqual(calls, self.DATA)
+
+    def test_aggregations(self):
+        self.assertEqual(jmespath.search('count_by(@, &k)', self.DATA),
+                         {'a': 2, 'b': 1})
+        self.assertEqual(jmespath.search('sum_by(@, &k, &v)', self.DATA),
+                         {'a': 7, 'b': 2})
+        self.assertEqual(jmespath.search('avg_by(@, &k, &v)', self.DATA),
+                         {'a': 3.5, 'b': 2.0})
+
+    def test_aggregations_keep_the_order_of_the_keys(self):
+        result = jmespath.search('sum_by(@, &k, &v)', self.DATA[::-1])
+        self.assertEqual(list(result), ['a', 'b'])
+        result = jmespath.search('count_by(@, &k)', self.DATA[1:])
+        self.assertEqual(list(result), ['b', 'a'])
+
+    def test_empty_arrays(self):
+        for expression in ['group_by(@, &k)', 'count_by(@, &k)',
+                           'sum_by(@, &k, &v)', 'avg_by(@, &k, &v)']:
+            self.assertIsNone(jmespath.search(expression, []))
+
+    def test_invalid_types(self):
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('count_by(@, &v)', self.DATA)
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('sum_by(@, &k, &k)', self.DATA)
+
+
+class TestHashJoin(unittest.TestCase):
+    DATA = {
+        'orders': [{'id': 1, 'c': 10}, {'id': 2, 'c': 20},
+                   {'id': 3, 'c': 10}, {'id': 4, 'c': None}],
+        'customers': [{'id': 10.0, 'n': 'a'}, {'id': 30, 'n': 'b'},
+                      {'id': 10, 'n': 'c'}, {'id': None, 'n': 'd'}],
+    }
+
+    def join(self, mode=None):
+        expression = 'hash_join(orders, customers, &c, &id)'
+        if mode is not None:
+            expression = expression[:-1] + ", '%s')" % mode
+        result = jmespath.search(expression, self.DATA)
+        return [(pair['left'] and pair['left']['id'],
+                 pair['right'] and pair['right']['n']) for pair in result]
+
+    def test_inner(self):
+        self.assertEqual(self.join(), [(1, 'a'), (1, 'c'), (3, 'a'),
+                                       (3, 'c')])
+        self.assertEqual(self.join('inner'), self.join())
+
+    def test_left(self):
+        self.assertEqual(self.join('left'), [
+            (1, 'a'), (1, 'c'), (2, None), (3, 'a'), (3, 'c'), (4, None)])
+
+    def test_empty_arrays(self):
+        self.assertEqual(
+            jmespath.search('hash_join(`[]`, @, &a, &a)', [{'a': 1}]), [])
+
+    def test_pairs_use_the_dict_cls(self):
+        from collections import OrderedDict
+        options = jmespath.Options(dict_cls=OrderedDict)
+        result = jmespath.search("hash_join(orders, customers, &c, &id, "
+                                 "'left')", self.DATA, options)
+        self.assertEqual(len(result), 6)
+        for pair in result:
+            self.assertIs(type(pair), OrderedDict)
+            self.assertEqual(list(pair), ['left', 'right'])
+
+    def test_invalid_mode(self):
+        with self.assertRaises(exceptions.JMESPathValueError) as e:
+            jmespath.search("hash_join(@, @, &a, &a, 'outer')", [])
+        self.assertIn('expected: "inner or left"', str(e.exception))
+
+    def test_invalid_key_type(self):
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('hash_join(@, @, &a, &a)', [{'a': [1]}])
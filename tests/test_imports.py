@@ -0,0 +1,39 @@
+from tests import unittest
+
+from jmespath import functions
+from benchmarks import importtime
+
+
+class TestImports(unittest.TestCase):
+    def test_import_does_not_load_lazy_dependencies(self):
+        _, modules = importtime.import_once('jmespath')
+        self.assertIn('jmespath.parser', modules)
+        for name in importtime.FORBIDDEN_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     jmespath.ast\n'
+            'import time:      1999 |      30408 | jmespath\n')
+        self.assertEqual(importtime.parse_importtime(output), {
+            'jmespath.ast': (120, 120),
+            'jmespath': (1999, 30408),
+        })
+
+
+class TestLazyFunctionTable(unittest.TestCase):
+    def test_table_is_built_on_first_lookup(self):
+        class Lazy(functions.Functions):
+            @functions.signature({'types': ['number']})
+            def _func_double(self, value):
+                return value * 2
+
+        self.assertIsInstance(Lazy.__dict__['FUNCTION_TABLE'],
+                              functions._LazyFunctionTable)
+        table = Lazy().FUNCTION_TABLE
+        self.assertIs(Lazy.__dict__['FUNCTION_TABLE'], table)
+        self.assertIn('double', table)
+        self.assertIn('length', table)
+        self.assertNotIn('double', functions.Functions.FUNCTION_TABLE)
+        self.assertEqual(Lazy().call_function('double', [2]), 4)
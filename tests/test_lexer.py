@@ -259,5 +259,32 @@ class TestRegexLexer(LexerUtils):
         with self.assertRaises(LexerError) as e:
             tokens = list(self.lexer.tokenize(u'`0\u2028`'))
 
+    def test_error_positions(self):
+        for expression, position, value in [
+                ('foo[0^]', 5, '^'),
+                ('a.`[1`', 2, '`[1`'),
+                ('a.`[1', 2, '`[1'),
+                ("a || 'b", 5, "'b"),
+                ('"foo\\z"', 0, '"foo\\z"')]:
+            with self.assertRaises(LexerError) as e:
+                list(self.lexer.tokenize(expression))
+            self.assertEqual(e.exception.lex_position, position)
+            self.assertEqual(e.exception.token_value, value)
+
+    def test_delimited_token_positions(self):
+        tokens = list(self.lexer.tokenize('`1` || "a" && \'b\''))
+        self.assertEqual(
+            [(t['type'], t['start'], t['end']) for t in tokens],
+            [('literal', 0, 3), ('or', 4, 5), ('quoted_identifier', 7, 3),
+             ('and', 11, 12), ('literal', 14, 2), ('eof', 17, 17)])
+
+    def test_long_tokens(self):
+        identifier = 'a' * 100000
+        tokens = list(self.lexer.tokenize('%s.`"%s"`' % (identifier,
+                                                         identifier)))
+        self.assertEqual(tokens[0]['value'], identifier)
+        self.assertEqual(tokens[0]['end'], 100000)
+        self.assertEqual(tokens[2]['value'], identifier)
+
 if __name__ == '__main__':
     unittest.main()
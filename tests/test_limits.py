@@ -0,0 +1,67 @@
+from tests import unittest
+
+import jmespath
+from jmespath import exceptions
+from jmespath import visitor
+
+
+class TestEvaluationLimits(unittest.TestCase):
+    def setUp(self):
+        self.data = {'foo': [{'bar': i} for i in range(100)]}
+
+    def test_no_limits_use_plain_interpreter(self):
+        interpreter = visitor.create_interpreter(jmespath.Options())
+        self.assertIs(type(interpreter), visitor.TreeInterpreter)
+        interpreter = visitor.create_interpreter(
+            jmespath.Options(max_steps=10))
+        self.assertIsInstance(interpreter, visitor.LimitedTreeInterpreter)
+
+    def test_within_limits(self):
+        options = jmespath.Options(max_steps=1000, timeout=10,
+                                   max_result_size=1000)
+        self.assertEqual(len(jmespath.search('foo[*].bar', self.data,
+                                             options)), 100)
+
+    def test_max_steps(self):
+        options = jmespath.Options(max_steps=50)
+        with self.assertRaises(exceptions.EvaluationLimitExceededError) as e:
+            jmespath.search('foo[*].bar', self.data, options)
+        self.assertEqual(e.exception.limit, 'max_steps')
+        self.assertEqual(e.exception.stats['steps'], 51)
+        self.assertIn('max_steps=50', str(e.exception))
+
+    def test_timeout(self):
+        class Clock(object):
+            now = 0.0
+
+            def __call__(self):
+                self.now += 1.0
+                return self.now
+
+        interpreter = visitor.LimitedTreeInterpreter(
+            jmespath.Options(timeout=0.5), clock=Clock())
+        parsed = jmespath.compile('foo[*].bar')
+        data = {'foo': [{'bar': i} for i in range(2000)]}
+        with self.assertRaises(exceptions.EvaluationLimitExceededError) as e:
+            interpreter.evaluate(parsed.parsed, data)
+        self.assertEqual(e.exception.limit, 'timeout')
+        self.assertEqual(e.exception.stats['steps'], 1024)
+
+    def test_max_result_size(self):
+        options = jmespath.Options(max_result_size=150)
+        self.assertEqual(
+            len(jmespath.search('foo[*].bar', self.data, options)), 100)
+        with self.assertRaises(exceptions.EvaluationLimitExceededError) as e:
+            jmespath.search('[foo[*].bar, foo[*].bar]', self.data, options)
+        self.assertEqual(e.exception.limit, 'max_result_size')
+
+    def test_values_from_the_document_are_not_counted(self):
+        options = jmespath.Options(max_result_size=10)
+        self.assertEqual(len(jmespath.search('foo', self.data, options)), 100)
+
+    def test_max_result_size_while_flattening(self):
+        data = [list(range(100)) for _ in range(100)]
+        options = jmespath.Options(max_result_size=1000)
+        with self.assertRaises(exceptions.EvaluationLimitExceededError) as e:
+            jmespath.search('[]', data, options)
+        self.assertLessEqual(e.exception.stats['elements'], 1100)
@@ -0,0 +1,151 @@
+import copy
+from tests import unittest
+
+import jmespath
+from jmespath import exceptions
+from jmespath.materialize import MaterializedExpression
+from jmespath.materialize import apply_operation, read_paths
+
+
+class TestReadPaths(unittest.TestCase):
+    def paths(self, expression):
+        return read_paths(jmespath.compile(expression).parsed)
+
+    def test_field_chain(self):
+        self.assertEqual(self.paths('foo.bar[0].baz'),
+                         [('foo', 'bar', 0, 'baz')])
+
+    def test_multiple_branches(self):
+        self.assertEqual(self.paths('a || b.c'), [('a',), ('b', 'c')])
+
+    def test_functions_depend_on_their_whole_arguments(self):
+        self.assertEqual(self.paths('sort_by(foo, &bar)'), [('foo',)])
+
+    def test_root_reference_inside_projection(self):
+        paths = self.paths('foo[*].{a: a, r: $.z}')
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(paths[0][0], 'foo')
+        self.assertEqual(paths[0][2], 'a')
+        self.assertEqual(paths[1], ('z',))
+
+
+class TestApplyOperation(unittest.TestCase):
+    def apply(self, document, operation):
+        return apply_operation(document, operation)[0]
+
+    def test_add_replace_remove(self):
+        document = {'foo': [1, 2]}
+        self.apply(document, {'op': 'add', 'path': '/foo/1', 'value': 5})
+        self.apply(document, {'op': 'add', 'path': '/foo/-', 'value': 6})
+        self.apply(document, {'op': 'replace', 'path': '/foo/0', 'value': 0})
+        self.apply(document, {'op': 'remove', 'path': '/foo/2'})
+        self.assertEqual(document, {'foo': [0, 5, 6]})
+
+    def test_move_and_copy(self):
+        document = {'a': {'b': 1}, 'c': {}}
+        self.apply(document, {'op': 'copy', 'from': '/a', 'path': '/c/d'})
+        self.apply(document, {'op': 'move', 'from': '/a/b', 'path': '/e'})
+        self.assertEqual(document, {'a': {}, 'c': {'d': {'b': 1}}, 'e': 1})
+
+    def test_escaped_pointer(self):
+        document = {'a/b': {'c~d': 1}}
+        self.apply(document,
+                   {'op': 'replace', 'path': '/a~1b/c~0d', 'value': 2})
+        self.assertEqual(document, {'a/b': {'c~d': 2}})
+
+    def test_replace_root(self):
+        self.assertEqual(
+            self.apply({'a': 1}, {'op': 'replace', 'path': '', 'value': 2}),
+            2)
+
+    def test_failed_test_operation(self):
+        with self.assertRaises(exceptions.JSONPatchError):
+            self.apply({'a': 1}, {'op': 'test', 'path': '/a', 'value': 2})
+
+    def test_missing_path(self):
+        with self.assertRaises(exceptions.JSONPatchError):
+            self.apply({'a': 1}, {'op': 'remove', 'path': '/b'})
+        with self.assertRaises(exceptions.JSONPatchError):
+            self.apply([1], {'op': 'replace', 'path': '/1', 'value': 2})
+
+
+class TestMaterializedExpression(unittest.TestCase):
+    def setUp(self):
+        self.document = {
+            'orders': [{'id': i, 'total': i * 10} for i in range(10)],
+            'other': 'value',
+        }
+
+    def assert_up_to_date(self, view):
+        expected = jmespath.search(view.parsed.expression,
+                                   copy.deepcopy(view.document))
+        self.assertEqual(view.result, expected)
+
+    def test_initial_result(self):
+        view = MaterializedExpression('orders[*].id', self.document)
+        self.assertEqual(view.result, list(range(10)))
+        self.assertEqual(view.stats['full'], 1)
+
+    def test_unrelated_patch_is_skipped(self):
+        view = MaterializedExpression('orders[*].id', self.document)
+        view.apply_patch([{'op': 'replace', 'path': '/other', 'value': 1}])
+        view.apply_patch(
+            [{'op': 'replace', 'path': '/orders/3/total', 'value': 1}])
+        self.assertEqual(view.stats['skipped'], 2)
+        self.assertEqual(view.stats['full'], 1)
+        self.assert_up_to_date(view)
+
+    def test_filter_projection_is_updated_per_element(self):
+        view = MaterializedExpression('orders[?total > `50`].id',
+                                      self.document)
+        self.assertEqual(view.result, [6, 7, 8, 9])
+        view.apply_patch([
+            {'op': 'replace', 'path': '/orders/2/total', 'value': 100},
+            {'op': 'replace', 'path': '/orders/9', 'value': {'id': 9}},
+        ])
+        self.assertEqual(view.result, [2, 6, 7, 8])
+        self.assertEqual(view.stats['full'], 1)
+        self.assertEqual(view.stats['partial'], 1)
+        self.assertEqual(view.stats['elements'], 2)
+        self.assert_up_to_date(view)
+
+    def test_elements_can_be_added_and_removed(self):
+        view = MaterializedExpression('orders[*].id', self.document)
+        view.apply_patch([
+            {'op': 'remove', 'path': '/orders/0'},
+            {'op': 'add', 'path': '/orders/-', 'value': {'id': 10}},
+            {'op': 'add', 'path': '/orders/1', 'value': {'id': 11}},
+            {'op': 'move', 'from': '/orders/0', 'path': '/orders/4'},
+        ])
+        self.assertEqual(view.stats['full'], 1)
+        self.assert_up_to_date(view)
+
+    def test_replacing_the_projected_array_evaluates_again(self):
+        view = MaterializedExpression('orders[*].id', self.document)
+        view.apply_patch(
+            [{'op': 'replace', 'path': '/orders', 'value': [{'id': 'x'}]}])
+        self.assertEqual(view.result, ['x'])
+        self.assertEqual(view.stats['full'], 2)
+
+    def test_other_expressions_are_evaluated_again(self):
+        view = MaterializedExpression('length(orders)', self.document)
+        view.apply_patch([{'op': 'remove', 'path': '/orders/0'}])
+        self.assertEqual(view.result, 9)
+        self.assertEqual(view.stats['full'], 2)
+
+    def test_root_references_disable_incremental_updates(self):
+        view = MaterializedExpression('orders[*].[id, $.other]',
+                                      self.document)
+        view.apply_patch([{'op': 'replace', 'path': '/other', 'value': 1}])
+        self.assertEqual(view.result[0], [0, 1])
+        self.assertEqual(view.stats['full'], 2)
+
+    def test_failed_patch_keeps_result_consistent(self):
+        view = MaterializedExpression('orders[*].id', self.document)
+        with self.assertRaises(exceptions.JSONPatchError):
+            view.apply_patch([
+                {'op': 'replace', 'path': '/orders/0/id', 'value': 'a'},
+                {'op': 'remove', 'path': '/missing'},
+            ])
+        self.assertEqual(view.result[0], 'a')
+        self.assert_up_to_date(view)
@@ -2,14 +2,17 @@
 import re
 import random
 import string
+import sys
 import threading
 from jmespath.ast import arithmetic
 from tests import unittest, OrderedDict
 
+from jmespath import lexer
 from jmespath import parser
 from jmespath import visitor
 from jmespath import ast
 from jmespath import exceptions
+from jmespath.profiler import Profiler
 
 
 class TestParser(unittest.TestCase):
@@ -221,6 +224,25 @@ class TestErrorMessages(unittest.TestCase):
         self.assert_error_message('foo."bar', error_message,
                                   exception=exceptions.LexerError)
 
+    def test_expected_token_error_message(self):
+        error_message = (
+            'Expecting: colon, got: unquoted_identifier: '
+            'Parse error at column 5, token "baz" (UNQUOTED_IDENTIFIER), '
+            'for expression:\n'
+            '"{bar baz}"\n'
+            '      ^')
+        self.assert_error_message('{bar baz}', error_message)
+
+    def test_expected_tokens_error_message(self):
+        error_message = (
+            "Expecting: ['quoted_identifier', 'unquoted_identifier'], "
+            'got: literal: '
+            'Parse error at column 1, token "1" (LITERAL), '
+            'for expression:\n'
+            '"{`1`: a}"\n'
+            '  ^')
+        self.assert_error_message('{`1`: a}', error_message)
+
     def test_bad_unicode_string(self):
         # This error message is straight from the JSON parser
         # and pypy has a slightly different error message,
@@ -232,6 +254,169 @@ class TestErrorMessages(unittest.TestCase):
             self.parser.parse(r'"\uAZ12"')
 
 
+class TestChainsAndDeepNesting(unittest.TestCase):
+    def setUp(self):
+        self.parser = parser.Parser()
+
+    def test_chains_are_flattened(self):
+        fields = [ast.field(name) for name in 'abc']
+        self.assertEqual(self.parser.parse('a || b || c').parsed,
+                         ast.Node(ast.OR_EXPRESSION, fields))
+        self.assertEqual(self.parser.parse('a && b && c').parsed,
+                         ast.Node(ast.AND_EXPRESSION, fields))
+        self.assertEqual(self.parser.parse('a | b | c').parsed,
+                         ast.Node(ast.PIPE, fields))
+        # Operators of different precedence are not merged.
+        self.assertEqual(
+            self.parser.parse('a || b && c || a').parsed,
+            ast.Node(ast.OR_EXPRESSION, [
+                fields[0], ast.and_expression(fields[1], fields[2]),
+                fields[0]]))
+
+    def test_flattened_chains_short_circuit(self):
+        data = {'a': [], 'b': 0, 'c': 'c'}
+        self.assertEqual(self.parser.parse('a || b || c').search(data), 0)
+        self.assertEqual(self.parser.parse('x || a || y').search(data),
+                         None)
+        self.assertEqual(self.parser.parse('b && c && a').search(data), [])
+        self.assertEqual(self.parser.parse('b && c && x').search(data),
+                         None)
+        self.assertEqual(self.parser.parse('b && c && b').search(data), 0)
+
+    def test_long_chains(self):
+        expression = ' || '.join(['missing'] * 9999 + ['found'])
+        self.assertEqual(
+            self.parser.parse(expression).search({'found': 1}), 1)
+        expression = ' | '.join(['@'] * 10000)
+        self.assertEqual(self.parser.parse(expression).search([1]), [1])
+
+    def test_arithmetic_chains_are_flattened(self):
+        fields = [ast.field(name) for name in 'abc']
+        self.assertEqual(self.parser.parse('a - b - c').parsed,
+                         ast.Node(ast.ARITHMETIC, fields, 'minus'))
+        self.assertEqual(self.parser.parse('a - (b - c)').parsed,
+                         ast.arithmetic('minus', fields[0], ast.arithmetic(
+                             'minus', fields[1], fields[2])))
+        self.assertEqual(self.parser.parse('a - b + c').parsed,
+                         ast.arithmetic('plus', ast.arithmetic(
+                             'minus', fields[0], fields[1]), fields[2]))
+        data = {'a': 20, 'b': 4, 'c': 2}
+        self.assertEqual(self.parser.parse('a - b - c').search(data), 14)
+        self.assertEqual(self.parser.parse('a / b / c').search(data), 2.5)
+        self.assertEqual(self.parser.parse('a % b % c').search(data), 0)
+
+    def test_long_chains_and_runs_of_parentheses(self):
+        limit = sys.getrecursionlimit()
+        parsed = self.parser.parse('(' * 10000 + 'foo' + ')' * 10000)
+        self.assertEqual(parsed.parsed, ast.field('foo'))
+        parsed = self.parser.parse('(' * 10000 + 'a || foo' + ')' * 10000)
+        self.assertEqual(parsed.search({'foo': 2}), 2)
+        parsed = self.parser.parse(' + '.join(['foo'] * 10000))
+        self.assertEqual(parsed.search({'foo': 2}), 20000)
+        self.assertEqual(parsed.search(
+            {'foo': 2}, visitor.Options(max_steps=100000)), 20000)
+        self.assertEqual(sys.getrecursionlimit(), limit)
+
+    def test_multiplication_chains_are_flattened(self):
+        fields = [ast.field(name) for name in 'abcd']
+        self.assertEqual(self.parser.parse('a * b * c').parsed,
+                         ast.Node(ast.ARITHMETIC, fields[:3], 'multiply'))
+        self.assertEqual(self.parser.parse('a * (b * c)').parsed,
+                         ast.arithmetic('multiply', fields[0], ast.arithmetic(
+                             'multiply', fields[1], fields[2])))
+        self.assertEqual(self.parser.parse('a * b[]').parsed,
+                         ast.arithmetic('multiply', fields[0], ast.projection(
+                             ast.flatten(fields[1]), ast.identity())))
+        # Multiplied from the right, as when they were nested.
+        data = {'a': 0.1, 'b': 0.2, 'c': 0.3, 'd': 0.7}
+        self.assertEqual(self.parser.parse('a * b * c * d').search(data),
+                         0.1 * (0.2 * (0.3 * 0.7)))
+        self.assertEqual(self.parser.parse('(a * b) * c').search(data),
+                         (0.1 * 0.2) * 0.3)
+        for expression in ['a * (b * c) * d', '(a * b) * c', 'a * (b * c)']:
+            parsed = self.parser.parse(expression)
+            self.assertEqual(self.parser.parse(parsed.canonical).parsed,
+                             parsed.parsed)
+
+    def test_deeply_nested_expressions(self):
+        # Every pass over the AST walks trees deeper than the recursion
+        # limit without recursing.
+        depth = 2000
+        data = {'a': [1], 'b': 2}
+        shapes = [
+            ('!', 'b', '', True),
+            ('-', 'b', '', 2),
+            ('(b - ', 'b', ')', 2),
+            ('b * ', 'b', '', 2 ** (depth + 1)),
+            ('abs(', 'b', ')', 2),
+            ('length([', 'b', '])', 1),
+            ('length({a: ', 'b', '})', 1),
+            ('c.{b: ', 'b', '}', None),
+            ('a ? ', 'b', ' : a', 2),
+            ('(a || ', 'b', ')', [1]),
+            ('let $x = b in ', '$x', '', 2),
+            ('', 'a', '[]', [1]),
+            ('', 'a', '[*]', []),
+            ('', 'a', '[?a].b', []),
+            ('a[?', 'b', ']', []),
+            ('*.', 'a', '', []),
+        ]
+        limit = sys.getrecursionlimit()
+        for prefix, body, suffix, expected in shapes:
+            expression = prefix * depth + body + suffix * depth
+            parsed = parser.Parser()._do_parse(expression)
+            profiler = Profiler()
+            for options in (None, visitor.Options(max_steps=10 ** 9),
+                            visitor.Options(profiler=profiler)):
+                self.assertEqual(parsed.search(data, options), expected)
+            self.assertEqual(profiler.stats(parsed).calls, 1)
+            canonical = parsed.canonical
+            self.assertEqual(
+                parser.Parser()._do_parse(canonical).canonical, canonical)
+            self.assertEqual(parsed.free_variables, frozenset())
+            self.assertGreater(parsed.cost().cost, depth)
+            self.assertIn('digraph AST', parsed._render_dot_file())
+        self.assertEqual(sys.getrecursionlimit(), limit)
+
+    def test_errors_of_deeply_nested_expressions(self):
+        with self.assertRaises(exceptions.IncompleteExpressionError):
+            self.parser.parse('(' * 10000 + 'foo')
+        with self.assertRaises(exceptions.IncompleteExpressionError):
+            self.parser.parse('[' * 10000 + 'foo')
+        with self.assertRaises(exceptions.ParseError):
+            self.parser.parse('!' * 10000 + ')')
+        parsed = self.parser.parse('abs(' * 2000 + 'foo' + ')' * 2000)
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            parsed.search({'foo': 'bar'})
+        with self.assertRaises(exceptions.EvaluationLimitExceededError):
+            parsed.search({'foo': 1}, visitor.Options(max_steps=1000))
+        parsed = self.parser.parse(
+            ' + '.join(['foo'] * 10000) + ' + length(foo)')
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            parsed.search({'foo': 1})
+
+
+class TestDispatchTables(unittest.TestCase):
+    def test_tables_cover_every_token_kind(self):
+        self.assertEqual(len(parser.Parser._NUD), len(lexer.TOKEN_TYPES))
+        self.assertEqual(len(parser.Parser._LED), len(lexer.TOKEN_TYPES))
+        self.assertEqual(
+            parser.Parser._BINDING_POWERS[lexer.DOT],
+            parser.Parser.BINDING_POWER['dot'])
+
+    def test_subclasses_get_their_own_tables(self):
+        class UpperCaseFields(parser.Parser):
+            def _token_nud_unquoted_identifier(self, token):
+                return ast.field(token.value.upper())
+
+        parsed = UpperCaseFields()._do_parse('foo.bar').parsed
+        self.assertEqual(parsed, ast.subexpression(
+            [ast.field('FOO'), ast.field('BAR')]))
+        parsed = parser.Parser()._do_parse('foo.bar').parsed
+        self.assertEqual(parsed, ast.subexpression(
+            [ast.field('foo'), ast.field('bar')]))
+
+
 class TestParserWildcards(unittest.TestCase):
     def setUp(self):
         self.parser = parser.Parser()
@@ -431,6 +616,79 @@ class TestParserCaching(unittest.TestCase):
         self.assertEqual(errors, [])
 
 
+class TestAutoParameterize(unittest.TestCase):
+    def setUp(self):
+        parser.Parser.purge()
+        self.options = visitor.Options(auto_parameterize=True)
+        self.data = {'items': [{'id': 42, 'name': 'a'},
+                               {'id': 43, 'name': 'b'}]}
+
+    def tearDown(self):
+        parser.Parser.purge()
+
+    def parse(self, expression):
+        return parser.Parser().parse(expression, self.options)
+
+    def test_compared_literals_are_parameters(self):
+        first = self.parse('items[?id == `42`].name')
+        second = self.parse("items[?id == `43` || 'x' == name].name")
+        self.assertEqual(first.parameters, {'#0': 42})
+        self.assertEqual(second.parameters, {'#0': 43, '#1': 'x'})
+        self.assertEqual(first.search(self.data), ['a'])
+        self.assertEqual(second.search(self.data), ['b'])
+        self.assertEqual(first.canonical, 'items[?id == `42`].name')
+        self.assertEqual(first.free_variables, frozenset())
+
+    def test_expressions_share_their_template(self):
+        first = self.parse('items[?id == `42`].name')
+        second = self.parse('items[?id==`43`].name')
+        self.assertIs(first.parsed, second.parsed)
+        self.assertEqual(second.search(self.data), ['b'])
+        self.assertIsNot(self.parse('items[?id > `42`].name').parsed,
+                         first.parsed)
+        self.assertEqual(parser.Parser.template_stats(), {
+            'hits': 1, 'misses': 2, 'size': 2, 'hit_rate': 1 / 3})
+
+    def test_other_literals_are_kept(self):
+        first = self.parse('items[?id == `42`] || `[1]`')
+        second = self.parse('items[?id == `42`] || `[2]`')
+        self.assertIsNot(first.parsed, second.parsed)
+        self.assertEqual(second.search({}), [2])
+        parsed = self.parse('items[0]')
+        self.assertNotIsInstance(parsed, parser.ParameterizedResult)
+
+    def test_bound_variables(self):
+        parsed = self.parse('items[?id == $id && name != `"b"`].name')
+        self.assertEqual(parsed.free_variables, frozenset(['id']))
+        self.assertEqual(parsed.search(self.data, variables={'id': 42}),
+                         ['a'])
+        with self.assertRaises(exceptions.UndefinedVariable):
+            parsed.search(self.data)
+
+    def test_unbound_variables_fail_only_when_evaluated(self):
+        parsed = self.parse("name == 'x' || $missing")
+        self.assertIsInstance(parsed, parser.ParameterizedResult)
+        self.assertIs(parsed.search({'name': 'x'}), True)
+        with self.assertRaises(exceptions.UndefinedVariable):
+            parsed.search({'name': 'y'})
+        # Only the variables of the caller are checked before searching.
+        with self.assertRaises(exceptions.UndefinedVariable):
+            parsed.search({'name': 'x'}, variables={})
+
+    def test_cache_is_keyed_by_option(self):
+        plain = parser.Parser().parse('items[?id == `42`]')
+        parameterized = self.parse('items[?id == `42`]')
+        self.assertIsInstance(parameterized, parser.ParameterizedResult)
+        self.assertNotIsInstance(plain, parser.ParameterizedResult)
+        self.assertIs(self.parse('items[?id == `42`]'), parameterized)
+        self.assertIs(parser.Parser().parse('items[?id == `42`]'), plain)
+
+    def test_errors_report_the_expression(self):
+        with self.assertRaises(exceptions.ParseError) as cm:
+            self.parse('items[?id == `42`')
+        self.assertEqual(cm.exception.expression, 'items[?id == `42`')
+
+
 class TestParserAddsExpressionAttribute(unittest.TestCase):
     def test_expression_available_from_parser(self):
         p = parser.Parser()
@@ -471,6 +729,25 @@ class TestRenderGraphvizFile(unittest.TestCase):
             '  subexpression1 -> field3\n'
             'field3 [label="field(bar)"]\n}')
 
+    def test_dot_file_let_expression(self):
+        p = parser.Parser()
+        result = p.parse('let $x = a in $x[0]')
+        dot_contents = result._render_dot_file()
+        self.assertEqual(
+            dot_contents,
+            'digraph AST {\n'
+            'let_expression1 [label="let_expression()"]\n'
+            '  let_expression1 -> assign2\n'
+            'assign2 [label="assign(x)"]\n'
+            '  assign2 -> field3\n'
+            'field3 [label="field(a)"]\n'
+            '  let_expression1 -> index_expression4\n'
+            'index_expression4 [label="index_expression()"]\n'
+            '  index_expression4 -> variable_ref5\n'
+            'variable_ref5 [label="variable_ref(x)"]\n'
+            '  index_expression4 -> index6\n'
+            'index6 [label="index(0)"]\n}')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,98 @@
+from tests import unittest
+
+import jmespath
+from jmespath.profiler import Profiler
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        # Every reading advances the clock by one millisecond.
+        self.now += 0.001
+        return self.now
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = Profiler(clock=FakeClock())
+        self.options = jmespath.Options(profiler=self.profiler)
+        self.parsed = jmespath.compile('foo[*].bar')
+        self.data = {'foo': [{'bar': 1}, {'bar': 2}, {'baz': 3}]}
+
+    def test_search_result_is_unchanged(self):
+        self.assertEqual(self.parsed.search(self.data, self.options), [1, 2])
+
+    def test_records_calls_and_cardinality(self):
+        self.parsed.search(self.data, self.options)
+        self.parsed.search(self.data, self.options)
+        projection = self.profiler.stats(self.parsed)
+        left = self.profiler.stats(self.parsed, (0,))
+        right = self.profiler.stats(self.parsed, (1,))
+        self.assertEqual(projection.calls, 2)
+        self.assertEqual(projection.cardinality, 4)
+        self.assertEqual(left.cardinality, 6)
+        self.assertEqual(right.calls, 6)
+        self.assertEqual(right.cardinality, 4)
+        self.assertEqual(right.node, self.parsed.parsed['children'][1])
+
+    def test_identical_subtrees_are_profiled_separately(self):
+        parsed = jmespath.compile('[a.b, a.b, a]')
+        first, second = parsed.parsed['children'][:2]
+        self.assertIs(first, second)
+        parsed.search({'a': {'b': 1}}, self.options)
+        for path in [(0,), (1,), (0, 0), (1, 0), (2,)]:
+            self.assertEqual(self.profiler.stats(parsed, path).calls, 1)
+        # Within an expression reference too.
+        parsed = jmespath.compile('[a, sort_by(@, &a)]')
+        parsed.search([{'a': 2}, {'a': 1}], self.options)
+        self.assertEqual(self.profiler.stats(parsed, (0,)).calls, 1)
+        self.assertEqual(self.profiler.stats(parsed, (1, 1, 0)).calls, 3)
+        self.assertIsNone(self.profiler.stats(jmespath.compile('c')))
+
+    def test_self_time_excludes_children(self):
+        self.parsed.search(self.data, self.options)
+        projection = self.profiler.stats(self.parsed)
+        children = [self.profiler.stats(self.parsed, (index,))
+                    for index in range(2)]
+        self.assertAlmostEqual(
+            projection.total_time,
+            projection.self_time + sum(c.total_time for c in children))
+        self.assertGreater(projection.self_time, 0)
+
+    def test_collapsed_stacks(self):
+        self.parsed.search(self.data, self.options)
+        lines = self.profiler.collapsed_stacks().splitlines()
+        stacks = [line.rsplit(' ', 1)[0] for line in lines]
+        self.assertEqual(stacks, [
+            'projection()',
+            'projection();field(bar)',
+            'projection();field(foo)',
+        ])
+
+    def test_render_dot(self):
+        self.parsed.search(self.data, self.options)
+        dot = self.profiler.render_dot(self.parsed)
+        self.assertIn('field(bar)\\ncalls=3 ', dot)
+        self.assertIn('rows=2"]', dot)
+
+    def test_profiles_expression_references(self):
+        parsed = jmespath.compile('sort_by(@, &a)')
+        parsed.search([{'a': 2}, {'a': 1}], self.options)
+        self.assertEqual(self.profiler.stats(parsed, (1, 0)).calls, 3)
+
+    def test_profiles_let_expressions(self):
+        parsed = jmespath.compile('let $x = a in [$x, b]')
+        self.assertEqual(parsed.search({'a': 5, 'b': 6}, self.options),
+                         [5, 6])
+        let = self.profiler.stats(parsed)
+        self.assertEqual(let.calls, 1)
+        self.assertGreater(let.total_time, let.self_time)
+        self.assertIn('variable_ref(x)', self.profiler.render_dot(parsed))
+
+    def test_reset(self):
+        self.parsed.search(self.data, self.options)
+        self.profiler.reset()
+        self.assertIsNone(self.profiler.stats(self.parsed))
+        self.assertEqual(self.profiler.collapsed_stacks(), '')
@@ -14,6 +14,12 @@ class TestSearchOptions(unittest.TestCase):
             options=jmespath.Options(dict_cls=OrderedDict))
         self.assertEqual(result, ['a', 'b', 'c'])
 
+    def test_interpreter_exposes_dict_cls(self):
+        from jmespath.visitor import TreeInterpreter
+        self.assertIs(TreeInterpreter().dict_cls, dict)
+        options = jmespath.Options(dict_cls=OrderedDict)
+        self.assertIs(TreeInterpreter(options).dict_cls, OrderedDict)
+
     def test_can_provide_custom_functions(self):
         class CustomFunctions(jmespath.functions.Functions):
             @jmespath.functions.signature(
@@ -46,6 +52,83 @@ class TestSearchOptions(unittest.TestCase):
 
 
 
+class TestVariables(unittest.TestCase):
+    data = {'items': [{'owner': 'alice', 'id': 1},
+                      {'owner': 'bob', 'id': 2}]}
+
+    def test_bound_variables(self):
+        expression = jmespath.compile('items[?owner == $owner].id')
+        self.assertEqual(
+            expression.search(self.data, variables={'owner': 'alice'}), [1])
+        self.assertEqual(
+            expression.search(self.data, variables={'owner': 'bob'}), [2])
+        self.assertEqual(
+            jmespath.search('$owner', {}, variables={'owner': 'carol'}),
+            'carol')
+
+    def test_let_shadows_bound_variables(self):
+        self.assertEqual(
+            jmespath.search("let $owner = 'bob' in items[?owner == $owner].id",
+                            self.data, variables={'owner': 'alice'}),
+            [2])
+
+    def test_free_variables(self):
+        expression = jmespath.compile(
+            'let $a = $b in [$a, $c, items[?id > $min]]')
+        self.assertEqual(expression.free_variables,
+                         frozenset(['b', 'c', 'min']))
+        self.assertEqual(jmespath.compile('foo').free_variables, frozenset())
+
+    def test_compile_checks_declared_variables(self):
+        jmespath.compile('items[?owner == $owner]', variables=['owner'])
+        with self.assertRaises(jmespath.exceptions.UndefinedVariable) as cm:
+            jmespath.compile('items[?owner == $owner && id > $min]',
+                             variables=['owner'])
+        self.assertEqual(cm.exception.varname, 'min')
+
+    def test_search_checks_variables_before_evaluating(self):
+        # The missing variable would never be evaluated here.
+        with self.assertRaises(jmespath.exceptions.UndefinedVariable):
+            jmespath.search('`true` || $missing', {}, variables={})
+
+
+class TestLetExpressions(unittest.TestCase):
+    data = {'a': 1, 'b': {'c': 2}, 'items': [1, 2]}
+
+    def test_variables_are_resolved_to_slots(self):
+        parsed = jmespath.compile(
+            'let $x = a, $y = b in let $z = $x in [$y, $z, $x, $free]')
+        refs = parsed.parsed.children[-1].children[-1].children
+        self.assertEqual([ref.children for ref in refs],
+                         [(1, 1), (0, 0), (1, 0), ()])
+        self.assertEqual(parsed.search(self.data, variables={'free': 3}),
+                         [{'c': 2}, 1, 1, 3])
+
+    def test_scoping(self):
+        self.assertEqual(jmespath.search(
+            'let $x = a in let $x = $x.c || b.c in [$x, b.c]', self.data),
+            [2, 2])
+        self.assertEqual(jmespath.search(
+            'let $x = a, $x = b.c in $x', self.data), 2)
+        self.assertEqual(jmespath.search(
+            'let $x = a in [let $x = b in $x.c, $x]', self.data), [2, 1])
+
+    def test_references_at_other_depths_are_not_shared(self):
+        parsed = jmespath.compile('let $x = a in [$x, let $y = b in $x]')
+        first, second = parsed.parsed.children[-1].children
+        self.assertEqual(second.children[-1].children, (1, 0))
+        self.assertIsNot(first, second.children[-1])
+
+    def test_expression_references_keep_their_variables(self):
+        self.assertEqual(jmespath.search(
+            'map(let $x = a in &[@, $x], items)', self.data),
+            [[1, 1], [2, 1]])
+        self.assertEqual(jmespath.search(
+            'let $x = a in map(&(let $y = @ in [$x, $y]), items)',
+            self.data),
+            [[1, 1], [1, 2]])
+
+
 class TestPythonSpecificCases(unittest.TestCase):
     def test_can_compare_strings(self):
         # This is python specific behavior that's not in the official spec
@@ -0,0 +1,140 @@
+import random
+from tests import unittest
+
+import jmespath
+from jmespath import exceptions
+from jmespath import parser
+from jmespath.unparser import unparse
+
+
+def _parse(expression):
+    return parser.Parser()._do_parse(expression).parsed
+
+
+def _generate(rng, depth):
+    # A random expression, which may not be valid.
+    if depth <= 0:
+        return rng.choice(['a', 'b', '"c d"', '@', '$', '`1`', "'s'", '$x',
+                           '`[1]`', '`1.5`', '`true`'])
+    first, second, third = [_generate(rng, depth - 1) for _ in range(3)]
+    return rng.choice([
+        first + '.' + rng.choice(['a', '"q"', '[a, b]', '{k: a}',
+                                  'length(@)', '*']),
+        first + rng.choice(['[0]', '[-1]', '[*]', '[]', '[1:2]', '[::-1]',
+                            '[?' + second + ']']),
+        rng.choice(['[*]', '[]', '[0]', '[1:]', '*', '[?a]']) +
+        rng.choice(['', '.a', '[0]', '.b[*]', '[?b].c']),
+        first + rng.choice([' || ', ' && ', ' | ', ' == ', ' < ', ' + ',
+                            ' - ', ' * ', ' // ', ' % ']) + second,
+        '!' + first, '-' + first, '(' + first + ')', '&' + first,
+        '[' + first + ', ' + second + ']',
+        '{a: ' + first + ', "b c": ' + second + '}',
+        'sort_by(' + first + ', &' + second + ')',
+        first + ' ? ' + second + ' : ' + third,
+        'let $x = ' + first + ' in ' + second,
+    ])
+
+
+class TestUnparse(unittest.TestCase):
+    def assert_unparses(self, expression, expected):
+        parsed = _parse(expression)
+        self.assertEqual(unparse(parsed), expected)
+        self.assertEqual(_parse(expected), parsed)
+
+    def test_normalizes_spelling(self):
+        self.assert_unparses(' "foo" . bar[?a==`1`] ', 'foo.bar[?a == `1`]')
+        self.assert_unparses('"a b"."c"', '"a b".c')
+        self.assert_unparses(u'"café"', u'"café"')
+        self.assert_unparses('{"a": a,b:b}', '{a: a, b: b}')
+        self.assert_unparses('`"x"`', "'x'")
+
+    def test_literals(self):
+        self.assert_unparses("'it\\'s \\\\'", "'it\\'s \\\\'")
+        self.assert_unparses('`-0.0`', '`-0.0`')
+        self.assert_unparses('`{"a": [1, null]}`', '`{"a":[1,null]}`')
+        self.assert_unparses('`"\\`"`', "'`'")
+        self.assert_unparses('`["\\u0060"]`', '`["\\`"]`')
+
+    def test_drops_needless_parentheses(self):
+        self.assert_unparses('(a.b)', 'a.b')
+        self.assert_unparses('(a || b) || c', 'a || b || c')
+        self.assert_unparses('a || (b && c)', 'a || b && c')
+
+    def test_keeps_needed_parentheses(self):
+        self.assert_unparses('(a || b) && c', '(a || b) && c')
+        self.assert_unparses('(a[*]).b', '(a[*]).b')
+        self.assert_unparses('(a.b[*]).c', '(a.b[*]).c')
+        self.assert_unparses('(a[*] | b)[0]', '(a[*] | b)[0]')
+        self.assert_unparses('(a - b) - c', 'a - b - c')
+        self.assert_unparses('a - (b - c)', 'a - (b - c)')
+        self.assert_unparses('(a * b) * c', '(a * b) * c')
+        self.assert_unparses('a * b * c', 'a * b * c')
+        self.assert_unparses('!(a || b)', '!(a || b)')
+        self.assert_unparses('!(a.b)', '!(a.b)')
+        self.assert_unparses('(!a).b', '!a.b')
+        self.assert_unparses('(a ? b : c).d', '(a ? b : c).d')
+
+    def test_projections(self):
+        self.assert_unparses('a[*].b[0]', 'a[*].b[0]')
+        self.assert_unparses('a[].b[]', 'a[].b[]')
+        self.assert_unparses('a[1:2].b', 'a[1:2].b')
+        self.assert_unparses('*.b', '*.b')
+        self.assert_unparses('a.*.b', 'a.*.b')
+        self.assert_unparses('a[?b].c', 'a[?b].c')
+        self.assert_unparses('a[*].[b, c][0]', 'a[*].[b, c][0]')
+        self.assert_unparses('a[*][b, c][0]', 'a[*][b, c][0]')
+        self.assert_unparses('a.[*]', 'a.[(*)]')
+
+    def test_exprefs_and_let(self):
+        self.assert_unparses('sort_by(a, &b)', 'sort_by(a, &b)')
+        self.assert_unparses('& &a', '& &a')
+        self.assert_unparses('let $x = a, $y = b in $x',
+                             'let $x = a, $y = b in $x')
+        self.assert_unparses('(let $x = a in $x).b', '(let $x = a in $x).b')
+
+    def test_deeply_nested_expressions(self):
+        expression = '(a || ' * 2000 + 'b' + ')' * 2000
+        canonical = jmespath.compile(expression).canonical
+        self.assertEqual(canonical, expression[1:-1])
+
+    def test_generated_expressions_round_trip(self):
+        rng = random.Random(0)
+        checked = 0
+        while checked < 2000:
+            expression = _generate(rng, rng.randrange(1, 5))
+            try:
+                parsed = _parse(expression)
+            except exceptions.JMESPathError:
+                continue
+            checked += 1
+            canonical = unparse(parsed)
+            self.assertEqual(_parse(canonical), parsed,
+                             '%r -> %r' % (expression, canonical))
+            self.assertEqual(unparse(_parse(canonical)), canonical)
+
+
+class TestCanonicalCache(unittest.TestCase):
+    def setUp(self):
+        parser.Parser.purge()
+
+    def tearDown(self):
+        parser.Parser.purge()
+
+    def test_spellings_share_their_ast(self):
+        spellings = ['a.b', ' a . b ', '"a".b', '(a).b']
+        compiled = [jmespath.compile(spelling) for spelling in spellings]
+        for parsed, spelling in zip(compiled, spellings):
+            self.assertEqual(parsed.expression, spelling)
+            self.assertEqual(parsed.canonical, 'a.b')
+            self.assertIs(parsed.parsed, compiled[0].parsed)
+        self.assertEqual(parser.Parser.canonical_stats(), {'a.b': 4})
+
+    def test_stats(self):
+        jmespath.compile('a.b')
+        jmespath.compile('a.b')
+        jmespath.compile('a . b')
+        jmespath.compile('c')
+        self.assertEqual(parser.Parser.canonical_stats(),
+                         {'a.b': 2, 'c': 1})
+        parser.Parser.purge()
+        self.assertEqual(parser.Parser.canonical_stats(), {})